@@ -1,23 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
-import logging
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse, PlainTextResponse, FileResponse, Response
+from functools import partial
+from typing import Dict, Any, AsyncIterator, Optional
 from logs.logging import log
 
 # Import necessary services
-from service.qdrant_service import VectorDBService
-from src.retriever import DocumentRetriever
-from src.reranker import Reranker
-from src.perform_llm import PerformLLM
-from src.route import Route
-from db.s3_db import S3Handler
+from app.container import Container
+from app.batch import investigate_batch
+from app.pipeline import run_investigation, stream_investigation, sse_event, shape_result, encode_json
+from app.jobs import JobQueue, QueueFullError
+from app.request_context import RequestIdMiddleware
+from src.report_cache import report_cache
+from src.resilience import resilient_caller, CircuitOpenError
+from src.metrics import metrics
+from src.profiling import should_profile, start_profile, finish_profile, profile_path, profile_span
 from configs import config
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Builds the shared pipeline components at startup and releases their connections at shutdown.
+    """
+    container = Container()
+    await container.start()
+    if getattr(config, "warmup_on_startup", True):
+        # Runs before the server accepts connections, so the worker is only ready once warm
+        await container.warm_up()
+    job_queue = JobQueue(partial(run_investigation, container, endpoint="job"))
+    await job_queue.start()
+    app.state.container = container
+    app.state.job_queue = job_queue
+    yield
+    await job_queue.close()
+    await container.close()
+
+
+def get_container(request: Request) -> Container:
+    return request.app.state.container
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.job_queue
+
+
+def get_view(view: Optional[str] = Query(None, description="'full' (default) or 'compact'")) -> str:
+    view = view or getattr(config, "response_view", "full")
+    if view not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'compact'.")
+    return view
+
+
 # Initialize FastAPI
 app = FastAPI(
     title="RAG for Cryptocurrency",
     description="FastAPI demo for cryptocurrency crime investigation",
-    version="0.0.1"
+    version="0.0.1",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS
@@ -29,8 +72,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize S3 Handler
-s3_storage = S3Handler()
+class _ConfiguredGZipMiddleware:
+    """
+    Compresses large JSON and NDJSON responses when `response_gzip` is on; Starlette leaves event streams
+    uncompressed. Built with the middleware stack at startup, so importing the app does not load the config.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        if getattr(config, "response_gzip", True):
+            self.app = GZipMiddleware(app, minimum_size=getattr(config, "response_gzip_min_size", 1000))
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(_ConfiguredGZipMiddleware)
+
+# Outermost, so every log line of a request carries its ID
+app.add_middleware(RequestIdMiddleware)
 
 # Health Check Endpoint
 @app.get("/")
@@ -41,75 +101,302 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Exposes stage latencies, LLM calls, tokens, estimated cost and cache hits in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.delete("/cache/reports")
+async def invalidate_report_cache():
+    """
+    Drops all cached reports of this process. Re-ingestion needs no call: it bumps the ingestion generation in the cache key.
+    """
+    return {"invalidated": report_cache.invalidate()}
+
+@app.get("/reports/status")
+async def report_upload_status(file_path: str = Query(...), container: Container = Depends(get_container)):
+    """
+    Returns the background upload status of a report, including its presigned URL once uploaded.
+
+    Args:
+        file_path (str): The report key returned in the investigation response's `storage` field.
+    """
+    status = container.upload_queue.get_status(file_path)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown report: {file_path}")
+    return status
+
+@app.get("/reports")
+async def recent_reports(
+    limit: int = Query(10, ge=1, le=1000),
+    user_id: Optional[str] = None,
+    day: Optional[str] = None,
+    cursor: Optional[str] = None,
+    container: Container = Depends(get_container),
+):
+    """
+    Lists uploaded reports newest first, with presigned URLs.
+
+    Args:
+        limit (int): Page size.
+        user_id (Optional[str]): Only this user's reports.
+        day (Optional[str]): Only reports from this day, e.g. "2025-03-14".
+        cursor (Optional[str]): `next_cursor` from the previous page.
+    """
+    try:
+        result = await container.run_blocking(container.report_storage.get_recent_reports, limit, user_id, day, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result["success"]:
+        raise HTTPException(status_code=502, detail=result["error"])
+    return result
+
+@app.get("/reports/download")
+async def download_report(file_path: str = Query(...), container: Container = Depends(get_container)):
+    """
+    Returns a stored report as compressed JSON, with its Content-Encoding.
+    This is the report URL of the local storage backend; S3 reports can also be fetched here.
+
+    Args:
+        file_path (str): The report key.
+    """
+    if not file_path.startswith("reports/"):
+        raise HTTPException(status_code=404, detail=f"Unknown report: {file_path}")
+    stored = await container.run_blocking(container.report_storage.read_raw, file_path)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Unknown report: {file_path}")
+    body, content_encoding = stored
+    headers = {"Content-Encoding": content_encoding} if content_encoding else {}
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Investigation API Endpoint
 @app.post("/crypto_investigate")
-async def crypto_investigate(query: Dict[str, str]):
+async def crypto_investigate(
+    query: Dict[str, str],
+    container: Container = Depends(get_container),
+    view: str = Depends(get_view),
+    quality: Optional[str] = Query(None, description="Quality tier, e.g. 'fast', 'balanced' or 'thorough'"),
+    budget_ms: Optional[int] = Query(None, gt=0, description="End-to-end latency budget in milliseconds"),
+    x_profile: Optional[str] = Header(None),
+):
     """
-    Executes the full RAG pipeline for cryptocurrency crime investigation and uploads report to S3.
+    Executes the full RAG pipeline for cryptocurrency crime investigation and queues the report for upload to S3.
 
     Args:
         query (Dict[str, str]): {"query": "some query text", "user_id": "some_user_id"}
+        view (str): `?view=compact` returns only IDs, scores and snippets of the evidence, plus the report.
+        quality (Optional[str]): Quality tier; sets retrieval strategy and depth, rerank mode and depth, and report length.
+        budget_ms (Optional[int]): Latency budget; without `quality`, the planner picks the best tier expected to fit,
+            and stages are downgraded (e.g. LLM rerank skipped) when earlier ones overrun.
+        x_profile (Optional[str]): "1" to profile this request; the profile location is returned
+            in the X-Profile-Id and X-Profile-Url response headers.
 
     Returns:
-        JSON response with investigation results and S3 storage status.
+        JSON response with investigation results, the pending S3 upload (key and status URL), the executed plan
+        and per-stage metrics.
     """
+    try:
+        plan = container.planner.plan(quality, budget_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         query_text = query.get("query", "").strip()
         user_id = query.get("user_id", "unknown_user")  # Default if user_id is missing
-        log.info(f"Received investigation query: {query_text} from {user_id}")
-
-        # Initialize required components
-        route = Route()
-        retriever = DocumentRetriever()
-        reranker = Reranker()
-        report_generator = PerformLLM()
-
-        # Step 1: Validate the query
-        is_valid, reason = route.assess_query(query_text)
-        if not is_valid:
-            log.warning(f"Query rejected: {reason}")
-            return {
-                "query": query_text,
-                "error": True,
-                "message": "Query is not relevant to crypto crime investigation",
-                "reason": reason
-            }
-
-        log.info(f"Query is valid: {reason}")
-
-        # Step 2: Retrieve relevant documents from Qdrant
-        retrieval_result = retriever.retrieve(query_text)
-        if not retrieval_result["documents"]:
-            log.warning("No relevant documents found.")
-            return {
-                "query": query_text,
-                "retrieval": "No relevant documents found",
-                "error": True
-            }
-
-        log.info(f"Retrieved {len(retrieval_result['documents'])} documents.")
-
-        # Step 3: Rank the retrieved documents
-        ranked_docs = reranker.rank_evidence(query_text, retrieval_result["documents"])
-        retrieval_result["documents"] = ranked_docs
-        log.info(f"Top {len(ranked_docs)} ranked documents selected.")
-
-        # Step 4: Generate an investigation report using LLM
-        report_data = report_generator.generate_report(query_text, ranked_docs, retrieval_result)
-        report_data["user_id"] = user_id  # Attach user_id for tracking
-        log.info("Investigation report generated.")
-
-        # Step 5: Upload the report to S3
-        storage_result = s3_storage.upload_report(report_data)
-
-        # Step 6: Return the final response
-        return {
-            "query": query_text,
-            "retrieval": retrieval_result,
-            "report": report_data,
-            "storage": storage_result,
-        }
+        log.info(f"Received investigation query: {query_text} from {user_id} (tier {plan['tier']})")
+
+        if not should_profile(x_profile):
+            # Returning the response directly skips FastAPI's jsonable_encoder pass
+            return ORJSONResponse(shape_result(await run_investigation(container, query_text, user_id, plan=plan), view))
+        return await _profiled_investigation(container, query_text, user_id, view, plan)
+
+    except CircuitOpenError as e:
+        # An upstream without a degraded path (e.g. embeddings) is failing: answer at once
+        log.error(f"Investigation failed fast: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(resilient_caller.cooldown))})
 
     except Exception as e:
         log.error(f"Error processing investigation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Investigation failed: {str(e)}")
+
+
+async def _profiled_investigation(container: Container, query_text: str, user_id: str, view: str, plan: Dict[str, Any]) -> ORJSONResponse:
+    """
+    Runs one investigation under the profiler, including response serialization.
+    """
+    session = start_profile("crypto_investigate")
+    try:
+        result = await run_investigation(container, query_text, user_id, plan=plan)
+        with profile_span("serialize"):
+            response = ORJSONResponse(shape_result(result, view))
+    finally:
+        profile = finish_profile(session)
+
+    response.headers["X-Profile-Id"] = profile["profile_id"]
+    response.headers["X-Profile-Url"] = profile["url"]
+    return response
+
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Returns a saved request profile: the span tree of pipeline stages and the hottest Python functions.
+    """
+    path = profile_path(profile_id, "json")
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    return FileResponse(path, media_type="application/json")
+
+
+@app.get("/profiles/{profile_id}/pstats")
+async def download_profile(profile_id: str):
+    """
+    Downloads the raw cProfile stats of a request, e.g. for `snakeviz` or `python -m pstats`.
+    """
+    path = profile_path(profile_id, "prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@app.post("/crypto_investigate/stream")
+async def crypto_investigate_stream(query: Dict[str, str], container: Container = Depends(get_container)):
+    """
+    Streams the RAG pipeline as Server-Sent Events so clients can render the report progressively.
+
+    Args:
+        query (Dict[str, str]): {"query": "some query text", "user_id": "some_user_id"}
+
+    Returns:
+        StreamingResponse: A `text/event-stream` of stage events followed by report tokens.
+    """
+    query_text = query.get("query", "").strip()
+    user_id = query.get("user_id", "unknown_user")
+    log.info(f"Received streaming investigation query: {query_text} from {user_id}")
+
+    return StreamingResponse(
+        stream_investigation(container, query_text, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/crypto_investigate/batch")
+async def crypto_investigate_batch(body: Dict[str, Any], container: Container = Depends(get_container), view: str = Depends(get_view)):
+    """
+    Runs many investigations at once, sharing embedding, search and LLM capacity across the batch.
+
+    Args:
+        body (Dict[str, Any]): {"queries": ["query text", {"query": "...", "user_id": "..."}, ...],
+            "user_id": "default user id"}
+        view (str): `?view=compact` shortens each result's evidence to IDs, scores and snippets.
+
+    Returns:
+        StreamingResponse: `application/x-ndjson`, one JSON result per query in completion order,
+            each tagged with its `index` in `queries`.
+    """
+    default_user = body.get("user_id", "unknown_user")
+    queries = body.get("queries", [])
+    if not isinstance(queries, list):
+        raise HTTPException(status_code=400, detail="queries must be a list.")
+    if not isinstance(default_user, str):
+        raise HTTPException(status_code=400, detail="user_id must be a string.")
+
+    items = []
+    for idx, entry in enumerate(queries):
+        if isinstance(entry, str):
+            entry = {"query": entry}
+        if not (isinstance(entry, dict) and isinstance(entry.get("query", ""), str)
+                and isinstance(entry.get("user_id", default_user), str)):
+            raise HTTPException(
+                status_code=400,
+                detail=f"queries[{idx}] must be a string or an object with string 'query' and 'user_id'.",
+            )
+        items.append({"query": entry.get("query", ""), "user_id": entry.get("user_id", default_user)})
+
+    max_queries = getattr(config, "batch_max_queries", 500)
+    if not items or len(items) > max_queries:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {max_queries} queries.")
+
+    log.info(f"Received batch investigation of {len(items)} queries.")
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in investigate_batch(container, items):
+            yield encode_json(shape_result(result, view)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(query: Dict[str, str], job_queue: JobQueue = Depends(get_job_queue)):
+    """
+    Queues an investigation and returns immediately with a job ID to poll or stream.
+
+    Args:
+        query (Dict[str, str]): {"query": "some query text", "user_id": "some_user_id"}
+
+    Returns:
+        202 with the job ID and its status/stream URLs, or 429 with Retry-After when the queue is full.
+    """
+    query_text = query.get("query", "").strip()
+    user_id = query.get("user_id", "unknown_user")
+
+    try:
+        job = await job_queue.submit(query_text, user_id)
+    except QueueFullError as e:
+        log.warning(f"Job rejected for {user_id}: {e}")
+        return ORJSONResponse(
+            status_code=429,
+            content={"detail": str(e), "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    log.info(f"Queued job {job['job_id']} for {user_id} at position {job['position']}.")
+    return {
+        **job,
+        "status_url": f"/jobs/{job['job_id']}",
+        "stream_url": f"/jobs/{job['job_id']}/stream",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, job_queue: JobQueue = Depends(get_job_queue), view: str = Depends(get_view)):
+    """
+    Returns a job's status, and its investigation result once it has finished.
+    `?view=compact` shortens the result's evidence to IDs, scores and snippets.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if job.get("result"):
+        job["result"] = shape_result(job["result"], view)
+    return ORJSONResponse(job)
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    """
+    Streams a job's status as Server-Sent Events until it finishes, then sends the full record.
+
+    Returns:
+        StreamingResponse: `status` events while waiting, then a final `result` event.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    async def events() -> AsyncIterator[str]:
+        current = job
+        yield sse_event("status", {"job_id": job_id, "status": current["status"]})
+        while current["status"] in ("queued", "running"):
+            finished = await job_queue.wait(job_id, timeout=15)
+            current = await job_queue.get(job_id)
+            if current is None:
+                return
+            if not finished:
+                yield sse_event("status", {"job_id": job_id, "status": current["status"]})
+        yield sse_event("result", current)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
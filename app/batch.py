@@ -0,0 +1,116 @@
+import asyncio
+from typing import List, Dict, Any, AsyncIterator
+from configs import config
+from app.container import Container
+from src.metrics import start_request_metrics, finish_request_metrics
+from logs.logging import log
+
+
+async def investigate_batch(container: Container, items: List[Dict[str, str]], upload: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs the RAG pipeline for many queries, sharing upstream work across the batch:
+    one embeddings call for all original and expanded queries, one batched Qdrant search,
+    and a single concurrency limit for every guard, expansion and rerank LLM call.
+
+    Args:
+        container (Container): Shared pipeline components.
+        items (List[Dict[str, str]]): [{"query": "...", "user_id": "..."}, ...]
+        upload (bool): Whether to queue each report for upload to S3.
+
+    Yields:
+        Dict[str, Any]: One result per query as soon as it completes, tagged with its `index` in `items`.
+    """
+    llm_semaphore = asyncio.Semaphore(getattr(config, "batch_llm_concurrency", 32))
+    report_semaphore = asyncio.Semaphore(getattr(config, "batch_report_concurrency", 8))
+    queries = [item.get("query", "").strip() for item in items]
+
+    async def assess(query: str):
+        async with llm_semaphore:
+            return await container.route.assess_query(query)
+
+    # Step 1: Validate every query
+    verdicts = await asyncio.gather(*[assess(query) for query in queries])
+    valid_indices = [idx for idx, (is_valid, _) in enumerate(verdicts) if is_valid]
+
+    for idx, (is_valid, reason) in enumerate(verdicts):
+        if not is_valid:
+            yield {
+                "index": idx,
+                "query": queries[idx],
+                "error": True,
+                "message": "Query is not relevant to crypto crime investigation",
+                "reason": reason
+            }
+
+    # Step 2: Retrieve for all valid queries with shared embedding and search calls
+    try:
+        retrievals = await container.retriever.retrieve_batch([queries[idx] for idx in valid_indices], llm_semaphore)
+    except Exception as e:
+        # The shared call failed for every query, e.g. an open embedding circuit: report each one and end the stream
+        log.error(f"Batch retrieval failed for {len(valid_indices)} queries: {type(e).__name__}: {e}")
+        for idx in valid_indices:
+            yield {
+                "index": idx,
+                "query": queries[idx],
+                "error": True,
+                "message": f"Retrieval failed: {type(e).__name__}: {e}",
+            }
+        return
+    log.info(f"Batch retrieval done for {len(valid_indices)} of {len(queries)} queries.")
+
+    async def finish(idx: int, retrieval_result: Dict[str, Any]) -> Dict[str, Any]:
+        # Runs in its own task, so these metrics cover this query's rerank and report only
+        start_request_metrics()
+        query_text = queries[idx]
+        try:
+            if not retrieval_result["documents"]:
+                return {
+                    "index": idx,
+                    "query": query_text,
+                    "retrieval": "No relevant documents found",
+                    "error": True,
+                    "metrics": finish_request_metrics("batch", "no_documents"),
+                }
+
+            # Step 3: Rank, sharing the batch-wide LLM limit
+            ranked_docs = await container.reranker.rank_evidence(query_text, retrieval_result["documents"], llm_semaphore)
+            retrieval_result["documents"] = ranked_docs
+
+            # Step 4: Generate the report
+            async with report_semaphore:
+                report_data = await container.report_generator.generate_report(query_text, ranked_docs, retrieval_result)
+            report_data["user_id"] = items[idx].get("user_id", "unknown_user")
+
+            # Step 5: Queue the upload
+            storage_result = await container.upload_queue.enqueue(report_data) if upload else None
+
+            return {
+                "index": idx,
+                "query": query_text,
+                "retrieval": retrieval_result,
+                "report": report_data,
+                "storage": storage_result,
+                "metrics": finish_request_metrics("batch", "error" if report_data.get("error") else "ok"),
+            }
+
+        except Exception as e:
+            log.error(f"Error processing batch query {idx}: {str(e)}")
+            return {
+                "index": idx,
+                "query": query_text,
+                "error": True,
+                "message": f"Investigation failed: {str(e)}",
+                "metrics": finish_request_metrics("batch", "error"),
+            }
+
+    tasks = [
+        asyncio.create_task(finish(idx, retrieval_result))
+        for idx, retrieval_result in zip(valid_indices, retrievals)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer went away (e.g. client disconnected): stop outstanding work
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable
+from configs import config
+from app.upload_queue import ReportUploadQueue
+from src.route import Route
+from src.retriever import DocumentRetriever
+from src.reranker import Reranker
+from src.perform_llm import PerformLLM
+from src.planner import LatencyPlanner
+from logs.logging import log
+
+
+def _http_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=getattr(config, "http_max_connections", 100),
+        max_keepalive_connections=getattr(config, "http_max_keepalive_connections", 20),
+        keepalive_expiry=getattr(config, "http_keepalive_expiry", 30),
+    )
+
+
+def _http_timeout():
+    import httpx
+
+    return httpx.Timeout(
+        getattr(config, "http_read_timeout", 60),
+        connect=getattr(config, "http_connect_timeout", 5),
+    )
+
+
+class Container:
+    """
+    Builds the pipeline components once for the lifetime of the app.
+    Each upstream (OpenAI, Qdrant, S3) gets one pooled, keep-alive client shared by all requests.
+    OpenAI and Qdrant are called through async clients; boto3 has no async API, so S3 calls
+    run on a dedicated thread pool via `run_blocking`.
+    The client libraries are imported here rather than at module level, so importing the app stays cheap.
+    """
+
+    def __init__(self):
+        """
+        Creates the shared clients and components. Call `start` before serving requests.
+        """
+        import httpx
+        import openai
+        from qdrant_client import AsyncQdrantClient
+        from db.qdrant_db import AsyncQdrantDB
+        from db.report_storage import create_report_storage
+
+        self.http_client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+        # Retries, timeouts and hedging are applied per call type by `resilient_caller`
+        self.openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, http_client=self.http_client, max_retries=0)
+
+        qdrant_location = getattr(config, "qdrant_location", None)
+        if qdrant_location == ":memory:":
+            # Embedded in-process Qdrant, e.g. for benchmarks and offline runs
+            self.qdrant_client = AsyncQdrantClient(location=":memory:")
+        elif qdrant_location:
+            # Embedded Qdrant persisted to a local directory
+            self.qdrant_client = AsyncQdrantClient(path=qdrant_location)
+        else:
+            self.qdrant_client = AsyncQdrantClient(
+                host=config.qdrant_host,
+                port=config.qdrant_port,
+                timeout=getattr(config, "http_read_timeout", 60),
+                limits=_http_limits(),
+            )
+        self.qdrant_db = AsyncQdrantDB(client=self.qdrant_client)
+
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=getattr(config, "s3_max_pool_connections", 20),
+            thread_name_prefix="blocking-io",
+        )
+
+        # Local report storage needs no S3 client, nor boto3
+        self.s3_client = self._create_s3_client() if getattr(config, "report_storage", "s3") == "s3" else None
+        self.report_storage = create_report_storage(s3_client=self.s3_client)
+        self.upload_queue = ReportUploadQueue(self.report_storage, self.run_blocking)
+
+        self.route = Route(openai_client=self.openai_client)
+        self.retriever = DocumentRetriever(openai_client=self.openai_client, qdrant_db=self.qdrant_db)
+        self.reranker = Reranker(openai_client=self.openai_client)
+        self.report_generator = PerformLLM(openai_client=self.openai_client)
+        self.planner = LatencyPlanner(cross_encoder_available=self.reranker.cross_encoder is not None)
+
+    @staticmethod
+    def _create_s3_client():
+        import boto3
+        from botocore.config import Config as BotoConfig
+
+        return boto3.client(
+            "s3",
+            aws_access_key_id=config.aws_access_key_id,
+            aws_secret_access_key=config.aws_secret_access_key,
+            region_name=config.region,
+            endpoint_url=getattr(config, "s3_endpoint_url", None),
+            config=BotoConfig(
+                max_pool_connections=getattr(config, "s3_max_pool_connections", 20),
+                connect_timeout=getattr(config, "http_connect_timeout", 5),
+                read_timeout=getattr(config, "http_read_timeout", 60),
+                tcp_keepalive=True,
+                # The upload queue retries failed uploads itself
+                retries={"max_attempts": 1, "mode": "standard"},
+            ),
+        )
+
+    async def start(self):
+        """
+        Checks the Qdrant collection once, at startup.
+        """
+        await self.qdrant_db.initialize_collection()
+        self.upload_queue.start()
+        log.info("Pipeline components initialized.")
+
+    async def warm_up(self):
+        """
+        Loads the tokenizer and the query guard (and the cross-encoder, if used) and opens pooled connections
+        to OpenAI and the report storage, so the first request does not pay for them. Qdrant is already connected by `start`.
+        Failures are logged and do not stop the app from starting.
+        """
+        steps = {
+            "tokenizer": asyncio.to_thread(self.report_generator.context_packer.warm_up),
+            "query_guard": asyncio.to_thread(self.route.guard.warm_up),
+            "openai": self.openai_client.with_options(max_retries=0).models.list(),
+            "report_storage": self.run_blocking(self.report_storage.check),
+        }
+        if self.reranker.cross_encoder is not None:
+            steps["cross_encoder"] = asyncio.to_thread(lambda: self.reranker.cross_encoder.model)
+
+        async def timed(name: str, step: Awaitable[Any]):
+            started = time.perf_counter()
+            try:
+                await step
+                log.info(f"Warm-up {name} done in {time.perf_counter() - started:.3f} s.")
+            except Exception as e:
+                log.warning(f"Warm-up {name} failed after {time.perf_counter() - started:.3f} s: {e}")
+
+        await asyncio.gather(*[timed(name, step) for name, step in steps.items()])
+
+    async def run_blocking(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs a blocking call (e.g. boto3) on the I/O thread pool without blocking the event loop.
+
+        Args:
+            func (Callable[..., Any]): The blocking function.
+
+        Returns:
+            Any: The function's return value.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, partial(func, *args, **kwargs))
+
+    async def close(self):
+        """
+        Flushes pending report uploads, then releases pooled connections and the I/O thread pool.
+        """
+        await self.upload_queue.close()
+        await self.http_client.aclose()
+        await self.qdrant_client.close()
+        self.io_executor.shutdown(wait=False)
@@ -0,0 +1,382 @@
+import asyncio
+import json
+import math
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from configs import config
+from logs.logging import log
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job cannot be admitted; `retry_after` is the suggested wait in seconds.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobStore:
+    """
+    Persists jobs in a local SQLite file so queued work survives restarts.
+    All statements run on one dedicated thread, off the event loop.
+
+    Several processes (e.g. uvicorn workers) may share the file: a job only runs in the process that
+    claims it, which holds a lease on it until it finishes and renews the lease while it runs.
+    A running job whose lease has expired was left by a stopped or crashed process and can be claimed again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                query TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                owner TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        # Files created before leases were added
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def _insert(self, job: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT INTO jobs (job_id, user_id, query, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job["job_id"], job["user_id"], job["query"], job["status"], job["created_at"]),
+        )
+        self._conn.commit()
+
+    def _update(self, job_id: str, fields: Dict[str, Any]):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+        self._conn.commit()
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _claimable(self, now: float) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))"
+            " ORDER BY created_at",
+            (now,),
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def _claim(self, job_id: str, owner: str, now: float, lease_until: float) -> bool:
+        # One statement, so two processes cannot both claim the same job
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, started_at = ?"
+            " WHERE job_id = ? AND (status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))",
+            (owner, lease_until, now, job_id, now),
+        )
+        self._conn.commit()
+        return cursor.rowcount == 1
+
+    def _renew(self, owner: str, lease_until: float):
+        self._conn.execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'running'", (lease_until, owner))
+        self._conn.commit()
+
+    def _release(self, owner: str):
+        self._conn.execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, started_at = NULL"
+            " WHERE owner = ? AND status = 'running'",
+            (owner,),
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def insert(self, job: Dict[str, Any]):
+        await self._run(self._insert, job)
+
+    async def update(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        await self._run(self._update, job_id, fields)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, job_id)
+
+    async def claimable(self) -> List[Dict[str, Any]]:
+        """
+        Returns the queued jobs and the running jobs whose lease has expired, oldest first.
+        """
+        return await self._run(self._claimable, time.time())
+
+    async def claim(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Marks a job running under `owner` unless another process holds it.
+
+        Returns:
+            bool: Whether this owner got the job.
+        """
+        now = time.time()
+        return await self._run(self._claim, job_id, owner, now, now + lease_seconds)
+
+    async def renew(self, owner: str, lease_seconds: float):
+        """
+        Extends the lease on every job `owner` is running.
+        """
+        await self._run(self._renew, owner, time.time() + lease_seconds)
+
+    async def release(self, owner: str):
+        """
+        Puts the jobs `owner` is running back in the queue, e.g. on shutdown.
+        """
+        await self._run(self._release, owner)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+
+class JobQueue:
+    """
+    Runs investigations asynchronously on a fixed worker pool with a bounded queue.
+    Workers take jobs round-robin across users, so one investigator's batch cannot starve others.
+    """
+
+    def __init__(self, runner: Callable[[str, str], Awaitable[Dict[str, Any]]]):
+        """
+        Args:
+            runner (Callable[[str, str], Awaitable[Dict[str, Any]]]): Runs one investigation from (query, user_id).
+        """
+        self.runner = runner
+        self.store = JobStore(getattr(config, "jobs_db_path", "./jobs.sqlite3"))
+        self.num_workers = getattr(config, "jobs_workers", 4)
+        self.max_queued = getattr(config, "jobs_max_queued", 200)
+        self.max_queued_per_user = getattr(config, "jobs_max_queued_per_user", 20)
+        self.lease_seconds = getattr(config, "jobs_lease_seconds", 60.0)
+        self.poll_interval = getattr(config, "jobs_poll_interval", 1.0)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._pending: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued_count = 0
+        self._ready = asyncio.Semaphore(0)
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._avg_duration = getattr(config, "jobs_expected_duration", 20.0)
+        self._workers: List[asyncio.Task] = []
+        self._known: set = set()
+
+    async def start(self):
+        """
+        Opens the store, queues the jobs left queued, or running with an expired lease, by any process,
+        and starts the workers and the lease keeper.
+        """
+        await self.store.open()
+        recovered = await self._recover()
+        if recovered:
+            log.info(f"Recovered {recovered} unfinished jobs from {self.store.path}.")
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        self._workers.append(asyncio.create_task(self._keep_leases()))
+
+    async def close(self):
+        """
+        Stops the workers and puts the jobs they were running back in the queue for the next start,
+        or for another process sharing the store.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        try:
+            await self.store.release(self.owner)
+        except Exception as e:
+            log.error(f"Could not release running jobs: {e}")
+        await self.store.close()
+
+    async def _recover(self) -> int:
+        # Jobs another process holds are skipped by `claim`; queue each job here at most once
+        recovered = 0
+        for job in await self.store.claimable():
+            if job["job_id"] not in self._known:
+                self._push(job["job_id"], job["user_id"])
+                recovered += 1
+        return recovered
+
+    async def _keep_leases(self):
+        """
+        Renews this process's leases, and picks up jobs whose owner stopped renewing, e.g. a crashed worker.
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.store.renew(self.owner, self.lease_seconds)
+                recovered = await self._recover()
+                if recovered:
+                    log.info(f"Took over {recovered} jobs with expired leases.")
+            except Exception as e:
+                log.error(f"Job lease upkeep failed: {e}")
+
+    async def submit(self, query: str, user_id: str) -> Dict[str, Any]:
+        """
+        Admits a job or rejects it when the queue, or the user's share of it, is full.
+
+        Args:
+            query (str): The investigator's query.
+            user_id (str): The investigator's ID.
+
+        Returns:
+            Dict[str, Any]: The queued job record.
+
+        Raises:
+            QueueFullError: If the job cannot be admitted now.
+        """
+        if self._queued_count >= self.max_queued:
+            raise QueueFullError("Investigation queue is full.", self._retry_after(self._queued_count))
+
+        user_queued = len(self._pending.get(user_id, ()))
+        if user_queued >= self.max_queued_per_user:
+            raise QueueFullError(
+                f"Too many queued investigations for user {user_id}.",
+                self._retry_after(user_queued),
+            )
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "query": query,
+            "status": "queued",
+            "created_at": time.time(),
+        }
+        await self.store.insert(job)
+        self._push(job["job_id"], user_id)
+        return {**job, "position": self._queued_count}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the current job record, with `result` once it has finished.
+        """
+        return await self.store.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> bool:
+        """
+        Waits until the job finishes or `timeout` elapses. A job this process is not running, e.g. one
+        run by another process sharing the store, is polled every `jobs_poll_interval` seconds.
+
+        Returns:
+            bool: True if the job has finished.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            event = self._done_events.get(job_id)
+            if event is not None:
+                try:
+                    # Woken regularly, since the event is dropped if another process takes the job
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+                    return True
+                except asyncio.TimeoutError:
+                    continue
+            job = await self.store.get(job_id)
+            if job is None or job["status"] not in ("queued", "running"):
+                return True
+            await asyncio.sleep(min(remaining, self.poll_interval))
+
+    def _push(self, job_id: str, user_id: str):
+        self._known.add(job_id)
+        self._pending.setdefault(user_id, deque()).append(job_id)
+        self._done_events.setdefault(job_id, asyncio.Event())
+        self._queued_count += 1
+        self._ready.release()
+
+    def _pop_fair(self) -> str:
+        # Round-robin: take the oldest job of the user at the front, then move that user to the back
+        user_id, jobs = next(iter(self._pending.items()))
+        job_id = jobs.popleft()
+        if jobs:
+            self._pending.move_to_end(user_id)
+        else:
+            del self._pending[user_id]
+        self._queued_count -= 1
+        return job_id
+
+    def _retry_after(self, queued: int) -> int:
+        return max(1, math.ceil(queued / self.num_workers * self._avg_duration))
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            job_id = self._pop_fair()
+            await self._run_job(job_id)
+
+    async def _run_job(self, job_id: str):
+        started = time.time()
+        finished = False
+        try:
+            job = await self.store.get(job_id)
+            if job is None:
+                log.warning(f"Job {job_id} is no longer in the store, skipping it.")
+                return
+            if not await self.store.claim(job_id, self.owner, self.lease_seconds):
+                # Finished, or running in another process sharing the store
+                log.debug(f"Job {job_id} is held by another worker, skipping it.")
+                return
+
+            with log.contextualize(request_id=job_id):
+                result = await self.runner(job["query"], job["user_id"])
+            finished = True
+            await self.store.update(job_id, status="succeeded", finished_at=time.time(), result=result, lease_until=None)
+            # Exponentially weighted average keeps Retry-After estimates current
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.time() - started)
+        except asyncio.CancelledError:
+            # Shutdown: `close` puts the job back in the queue
+            raise
+        except Exception as e:
+            finished = True
+            log.error(f"Job {job_id} failed: {e}")
+            try:
+                await self.store.update(job_id, status="failed", finished_at=time.time(), error=str(e), lease_until=None)
+            except Exception as store_error:
+                log.error(f"Could not record the failure of job {job_id}: {store_error}")
+        finally:
+            self._known.discard(job_id)
+            # Only a job run here is signalled; waiters on a skipped one fall back to polling the store
+            event = self._done_events.pop(job_id, None)
+            if event is not None and finished:
+                event.set()
@@ -0,0 +1,346 @@
+import asyncio
+import time
+import orjson
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from configs import config
+from app.container import Container
+from src.metrics import start_request_metrics, finish_request_metrics
+from src.planner import Deadline
+from logs.logging import log
+
+
+def _discard(task: asyncio.Task):
+    """
+    Cancels a speculative task whose result is no longer needed, retrieving its outcome once it ends
+    so an error it already raised is not reported as "Task exception was never retrieved".
+    """
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def validate_and_retrieve(container: Container, query_text: str, retrieve_options: Optional[Dict[str, Any]] = None) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    """
+    Validates the query and retrieves evidence. With `speculative_retrieval` enabled the query's embedding
+    and first vector search run while the query is validated and are cancelled if it is rejected;
+    query expansion, an LLM call, waits for the verdict.
+
+    Args:
+        container (Container): Shared pipeline components.
+        query_text (str): The investigator's query.
+        retrieve_options (Optional[Dict[str, Any]]): Per-request `retrieve` arguments (strategy, top_k, expansion_timeout).
+
+    Returns:
+        Tuple[bool, str, Optional[Dict[str, Any]]]: (is_valid, reason, retrieval result or None if rejected)
+    """
+    retrieve_options = retrieve_options or {}
+    if not getattr(config, "speculative_retrieval", True):
+        is_valid, reason = await container.route.assess_query(query_text)
+        if not is_valid:
+            return is_valid, reason, None
+        return is_valid, reason, await container.retriever.retrieve(query_text, **retrieve_options)
+
+    search_task = asyncio.create_task(container.retriever.search(query_text, retrieve_options.get("top_k")))
+    try:
+        is_valid, reason = await container.route.assess_query(query_text)
+    except BaseException:
+        _discard(search_task)
+        raise
+
+    if not is_valid:
+        _discard(search_task)
+        return is_valid, reason, None
+    return is_valid, reason, await container.retriever.retrieve(query_text, initial_search=search_task, **retrieve_options)
+
+async def schedule_upload(container: Container, report_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Queues the report for background upload and returns its key and where to poll for the URL.
+    """
+    storage_result = await container.upload_queue.enqueue(report_data)
+    storage_result["status_url"] = f"/reports/status?file_path={storage_result['file_path']}"
+    return storage_result
+
+
+async def rank_within_budget(container: Container, query_text: str, documents: List[Dict[str, Any]],
+                             plan: Dict[str, Any], deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+    """
+    Reranks evidence as planned, downgrading the rerank mode when the remaining budget no longer
+    covers it and the report. An LLM rerank that overruns its share is abandoned for vector-score order.
+
+    Args:
+        container (Container): Shared pipeline components.
+        query_text (str): The investigator's query.
+        documents (List[Dict[str, Any]]): Retrieved evidence.
+        plan (Dict[str, Any]): The request's plan; downgrades are appended to its `degraded` list.
+        deadline (Optional[Deadline]): The request's budget, if any.
+
+    Returns:
+        List[Dict[str, Any]]: The ranked evidence.
+    """
+    planner = container.planner
+    mode, timeout = plan["rerank_mode"], None
+    if deadline is not None:
+        mode = planner.rerank_mode_within(plan, deadline.remaining())
+        timeout = planner.rerank_timeout(plan, mode, deadline.remaining())
+    if mode != plan["rerank_mode"]:
+        plan["degraded"].append(f"rerank:{plan['rerank_mode']}->{mode}")
+
+    started = time.perf_counter()
+    try:
+        ranked_docs = await asyncio.wait_for(
+            container.reranker.rank_evidence(query_text, documents, mode=mode, max_results=plan["top_rerank"]), timeout
+        )
+    except asyncio.TimeoutError:
+        log.warning(f"Rerank ({mode}) exceeded its {timeout:.2f} s budget, ordering by vector score instead.")
+        plan["degraded"].append(f"rerank:{mode}->vector")
+        planner.observe_timeout(f"rerank:{mode}", time.perf_counter() - started)
+        return await container.reranker.rank_evidence(query_text, documents, mode="vector", max_results=plan["top_rerank"])
+
+    planner.observe(f"rerank:{mode}", time.perf_counter() - started)
+    return ranked_docs
+
+
+async def run_investigation(container: Container, query_text: str, user_id: str, endpoint: str = "investigate",
+                            plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Executes the full RAG pipeline for cryptocurrency crime investigation and queues the report for upload to S3.
+
+    Args:
+        container (Container): Shared pipeline components.
+        query_text (str): The investigator's query.
+        user_id (str): The investigator's ID.
+        endpoint (str): Entry point label for the latency metrics.
+        plan (Optional[Dict[str, Any]]): Per-request settings from `LatencyPlanner.plan`; the default tier if omitted.
+            With a budget, later stages are downgraded when earlier ones overrun their share.
+
+    Returns:
+        Dict[str, Any]: Investigation results, the pending S3 upload (key and status URL),
+            the executed `plan` and per-stage `metrics` for this request.
+    """
+    planner = container.planner
+    report_generator = container.report_generator
+    plan = plan or planner.plan()
+    deadline = Deadline(plan["budget_ms"] / 1000) if plan["budget_ms"] else None
+    start_request_metrics()
+
+    try:
+        # Step 1 & 2: Validate the query and retrieve relevant documents from Qdrant
+        retrieve_options = {"strategy": plan["strategy"], "top_k": plan["top_k_retrieval"]}
+        if deadline is not None:
+            retrieve_options["expansion_timeout"] = planner.stage_share(plan, "retrieve")
+        started = time.perf_counter()
+        is_valid, reason, retrieval_result = await validate_and_retrieve(container, query_text, retrieve_options)
+        if not is_valid:
+            log.warning(f"Query rejected: {reason}")
+            return {
+                "query": query_text,
+                "error": True,
+                "message": "Query is not relevant to crypto crime investigation",
+                "reason": reason,
+                "metrics": finish_request_metrics(endpoint, "rejected")
+            }
+
+        log.debug(f"Query is valid: {reason}")
+        if retrieval_result["strategy"] == plan["strategy"]:
+            planner.observe(f"retrieve:{plan['strategy']}", time.perf_counter() - started)
+        else:
+            # The expansion was cut off, so the elapsed time understates a full multi-step retrieval
+            planner.observe_timeout(f"retrieve:{plan['strategy']}", time.perf_counter() - started)
+            plan["degraded"].append(f"retrieve:{plan['strategy']}->{retrieval_result['strategy']}")
+
+        if not retrieval_result["documents"]:
+            log.warning("No relevant documents found.")
+            return {
+                "query": query_text,
+                "retrieval": "No relevant documents found",
+                "error": True,
+                "metrics": finish_request_metrics(endpoint, "no_documents")
+            }
+
+        log.debug(f"Retrieved {len(retrieval_result['documents'])} documents.")
+
+        # Step 3: Rank the retrieved documents
+        ranked_docs = await rank_within_budget(container, query_text, retrieval_result["documents"], plan, deadline)
+        retrieval_result["documents"] = ranked_docs
+        log.debug(f"Top {len(ranked_docs)} ranked documents selected.")
+
+        # Step 4: Generate an investigation report using LLM, shorter if the budget is running out
+        max_tokens = planner.max_tokens_within(plan, deadline.remaining()) if deadline is not None else plan["max_tokens"]
+        if max_tokens != plan["max_tokens"]:
+            plan["degraded"].append(f"max_tokens:{plan['max_tokens']}->{max_tokens}")
+        started = time.perf_counter()
+        report_data = await report_generator.generate_report(query_text, ranked_docs, retrieval_result, max_tokens=max_tokens)
+        if not report_data.get("cache_hit") and not report_data.get("error"):
+            planner.observe(f"generate:{max_tokens}", time.perf_counter() - started)
+        report_data["user_id"] = user_id  # Attach user_id for tracking
+        log.debug("Investigation report generated.")
+
+        # Step 5: Upload the report to S3 in the background
+        storage_result = await schedule_upload(container, report_data)
+
+    except Exception:
+        finish_request_metrics(endpoint, "error")
+        raise
+
+    # Step 6: Return the final response
+    return {
+        "query": query_text,
+        "retrieval": retrieval_result,
+        "report": report_data,
+        "storage": storage_result,
+        "plan": plan,
+        "metrics": finish_request_metrics(endpoint, "error" if report_data.get("error") else "ok"),
+    }
+
+
+def compact_documents(documents: List[Dict[str, Any]], snippet_chars: int) -> List[Dict[str, Any]]:
+    """
+    Reduces ranked documents to IDs, scores and a text snippet, dropping the full text and payload.
+
+    Args:
+        documents (List[Dict[str, Any]]): Ranked documents from the reranker.
+        snippet_chars (int): Maximum snippet length.
+
+    Returns:
+        List[Dict[str, Any]]: The compact documents, in the same order.
+    """
+    compact = []
+    for doc in documents:
+        text = doc.get("text", "")
+        compact.append({
+            "id": doc.get("id"),
+            "file_name": doc.get("metadata", {}).get("file_name"),
+            "final_score": doc.get("final_score"),
+            "vector_score": doc.get("vector_score"),
+            "llm_score": doc.get("llm_score"),
+            "first_stage_score": doc.get("first_stage_score"),
+            "confidence_label": doc.get("confidence_label"),
+            "snippet": text if len(text) <= snippet_chars else text[:snippet_chars].rstrip() + "...",
+        })
+    return compact
+
+
+def shape_result(result: Dict[str, Any], view: str) -> Dict[str, Any]:
+    """
+    Applies the response view to an investigation result.
+
+    Args:
+        result (Dict[str, Any]): Output of `run_investigation`.
+        view (str): "full" returns the result unchanged; "compact" keeps only IDs, scores
+            and snippets of the evidence, plus the report.
+
+    Returns:
+        Dict[str, Any]: The shaped result.
+    """
+    retrieval = result.get("retrieval")
+    if view != "compact" or not isinstance(retrieval, dict):
+        return result
+
+    snippet_chars = getattr(config, "compact_snippet_chars", 240)
+    return {
+        **result,
+        "retrieval": {
+            "strategy": retrieval.get("strategy"),
+            "expanded_queries": retrieval.get("expanded_queries"),
+            "documents": compact_documents(retrieval.get("documents", []), snippet_chars),
+        },
+    }
+
+
+def encode_json(data: Any) -> str:
+    """
+    Serializes with orjson, falling back to str() for types it does not know.
+    """
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Formats one Server-Sent Event frame.
+
+    Args:
+        event (str): Event name.
+        data (Dict[str, Any]): JSON-serializable event payload.
+
+    Returns:
+        str: The encoded SSE frame.
+    """
+    return f"event: {event}\ndata: {encode_json(data)}\n\n"
+
+
+async def stream_investigation(container: Container, query_text: str, user_id: str) -> AsyncIterator[str]:
+    """
+    Runs the RAG pipeline, yielding a stage event after each step and report tokens as they arrive.
+
+    Args:
+        container (Container): Shared pipeline components.
+        query_text (str): The investigator's query.
+        user_id (str): The investigator's ID.
+
+    Yields:
+        str: SSE frames: validated, retrieved, reranked, token (repeated), report, stored, or error,
+            followed by a final metrics frame.
+    """
+    start_request_metrics()
+    state = {"outcome": "error"}
+    async for frame in _stream_stages(container, query_text, user_id, state):
+        yield frame
+    yield sse_event("metrics", finish_request_metrics("stream", state["outcome"]))
+
+
+async def _stream_stages(container: Container, query_text: str, user_id: str, state: Dict[str, str]) -> AsyncIterator[str]:
+    try:
+        reranker = container.reranker
+        report_generator = container.report_generator
+
+        # Step 1 & 2: Validate the query and retrieve relevant documents from Qdrant
+        is_valid, reason, retrieval_result = await validate_and_retrieve(container, query_text)
+        yield sse_event("validated", {"is_valid": is_valid, "reason": reason})
+        if not is_valid:
+            log.warning(f"Query rejected: {reason}")
+            state["outcome"] = "rejected"
+            return
+
+        yield sse_event("retrieved", {
+            "document_count": len(retrieval_result["documents"]),
+            "strategy": retrieval_result["strategy"],
+            "expanded_queries": retrieval_result["expanded_queries"],
+        })
+        if not retrieval_result["documents"]:
+            log.warning("No relevant documents found.")
+            state["outcome"] = "no_documents"
+            return
+
+        # Step 3: Rank the retrieved documents
+        ranked_docs = await reranker.rank_evidence(query_text, retrieval_result["documents"])
+        retrieval_result["documents"] = ranked_docs
+        yield sse_event("reranked", {"documents": ranked_docs})
+
+        # Step 4: Stream the investigation report
+        report_data = report_generator.get_cached_report(query_text, ranked_docs)
+        if report_data is not None:
+            yield sse_event("token", {"text": report_data["generated_report"]})
+        else:
+            report_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            report_parts = []
+            messages, context_stats = report_generator.build_messages(query_text, ranked_docs, retrieval_result)
+            async for token in report_generator.stream_report(messages):
+                report_parts.append(token)
+                yield sse_event("token", {"text": token})
+
+            report_data = report_generator.build_report(
+                query_text, "".join(report_parts), ranked_docs, retrieval_result, report_time,
+                context_stats=context_stats
+            )
+            report_generator.cache_report(query_text, ranked_docs, report_data)
+
+        report_data["user_id"] = user_id
+        yield sse_event("report", report_data)
+        log.debug("Investigation report streamed.")
+
+        # Step 5: Upload the report to S3 in the background
+        yield sse_event("stored", await schedule_upload(container, report_data))
+        state["outcome"] = "ok"
+
+    except Exception as e:
+        log.error(f"Error streaming investigation: {str(e)}")
+        yield sse_event("error", {"detail": f"Investigation failed: {str(e)}"})
@@ -0,0 +1,37 @@
+import re
+import uuid
+from logs.logging import log
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """
+    Tags every log line of a request with its ID: the caller's X-Request-ID if it looks sane,
+    otherwise a new one. The ID is echoed in the X-Request-ID response header.
+    A plain ASGI middleware, so streaming responses and child tasks keep the log context.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                request_id = candidate if _REQUEST_ID.match(candidate) else None
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with log.contextualize(request_id=request_id):
+            await self.app(scope, receive, send_with_request_id)
@@ -0,0 +1,128 @@
+import asyncio
+import random
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, TYPE_CHECKING
+from configs import config
+from src.metrics import stage_timer
+from logs.logging import log
+
+if TYPE_CHECKING:
+    from db.report_storage import ReportStorage
+
+
+class ReportUploadQueue:
+    """
+    Uploads reports to the report storage in the background with bounded concurrency and retries,
+    so the investigation response does not wait on S3.
+    """
+
+    def __init__(self, storage: "ReportStorage", run_blocking: Callable[..., Awaitable[Any]]):
+        """
+        Args:
+            storage (ReportStorage): Storage backend used for the uploads.
+            run_blocking (Callable[..., Awaitable[Any]]): Runs a blocking call off the event loop.
+        """
+        self.storage = storage
+        self.run_blocking = run_blocking
+        self.concurrency = getattr(config, "upload_concurrency", 4)
+        self.max_retries = getattr(config, "upload_max_retries", 3)
+        self.retry_base_delay = getattr(config, "upload_retry_base_delay", 0.5)
+        self.max_tracked = getattr(config, "upload_status_history", 10000)
+
+        self._queue: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=getattr(config, "upload_queue_size", 1000))
+        self._statuses: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._workers = []
+
+    def start(self):
+        """
+        Starts the upload workers. Must be called from within the running event loop.
+        """
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self, timeout: float = 10.0):
+        """
+        Waits up to `timeout` seconds for queued uploads to finish, then stops the workers.
+        """
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Shutting down with {self._queue.qsize()} report uploads still queued.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def enqueue(self, report_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Schedules a report for upload and returns immediately with its final storage key.
+
+        Args:
+            report_data (Dict[str, Any]): The report to store.
+
+        Returns:
+            Dict[str, Any]: The pending upload status, including `file_path`.
+        """
+        file_path = self.storage.build_report_key(report_data)
+        self._set_status(file_path, {
+            "status": "pending",
+            "file_path": file_path,
+            "user_id": report_data.get("user_id", "unknown_user"),
+            "attempts": 0,
+        })
+        await self._queue.put((file_path, report_data))
+        return self.get_status(file_path)
+
+    def get_status(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the upload status of a report, or None if it is unknown.
+
+        Args:
+            file_path (str): The storage key returned by `enqueue`.
+
+        Returns:
+            Optional[Dict[str, Any]]: Status (pending/uploading/uploaded/failed), attempts, and `url` once uploaded.
+        """
+        status = self._statuses.get(file_path)
+        return dict(status) if status is not None else None
+
+    def _set_status(self, file_path: str, status: Dict[str, Any]):
+        self._statuses[file_path] = status
+        self._statuses.move_to_end(file_path)
+        while len(self._statuses) > self.max_tracked:
+            self._statuses.popitem(last=False)
+
+    async def _worker(self):
+        while True:
+            file_path, report_data = await self._queue.get()
+            try:
+                await self._upload_with_retries(file_path, report_data)
+            except Exception as e:
+                log.error(f"Unexpected error uploading report {file_path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _upload_with_retries(self, file_path: str, report_data: Dict[str, Any]):
+        status = self._statuses.get(file_path) or {"file_path": file_path}
+
+        for attempt in range(1, self.max_retries + 2):
+            status.update({"status": "uploading", "attempts": attempt})
+            try:
+                with stage_timer("upload"):
+                    result = await self.run_blocking(self.storage.upload_report, report_data, file_path)
+            except Exception as e:
+                # e.g. a boto3 ClientError or an OSError raised by the backend: a failed attempt like any other
+                result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+
+            if result.get("success"):
+                status.update({"status": "uploaded", "url": result["url"], "timestamp": result["timestamp"]})
+                status.pop("error", None)
+                self._set_status(file_path, status)
+                return
+
+            status["error"] = result.get("error", "unknown error")
+            if attempt <= self.max_retries:
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, self.retry_base_delay * 2 ** (attempt - 1)))
+
+        status["status"] = "failed"
+        self._set_status(file_path, status)
+        log.error(f"Report upload failed after {status['attempts']} attempts: {file_path}: {status['error']}")
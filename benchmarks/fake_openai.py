@@ -0,0 +1,147 @@
+"""
+Local stand-in for the OpenAI API used by benchmarks.
+
+Embeddings are deterministic hashed bag-of-words vectors, so similar texts land close together
+and results are reproducible. Chat completions sleep for a configurable latency and answer each
+prompt type (guard, query expansion, rerank score, report) with a fixed, well-formed reply.
+
+Run with:
+    FAKE_LLM_LATENCY_MS=300 python -m uvicorn benchmarks.fake_openai:app --port 8100
+and point the service at it with OPENAI_BASE_URL=http://localhost:8100/v1
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import uuid
+from typing import List, Dict, Any, Union
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+REPORT_LATENCY_MS = float(os.getenv("FAKE_REPORT_LATENCY_MS", str(LLM_LATENCY_MS * 4)))
+EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50"))
+REPORT_WORDS = int(os.getenv("FAKE_REPORT_WORDS", "200"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+app = FastAPI(title="Fake OpenAI")
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding, L2-normalized.
+
+    Args:
+        text (str): Text to embed.
+        dim (int): Vector dimension.
+
+    Returns:
+        List[float]: The embedding.
+    """
+    vector = [0.0] * dim
+    for word in _WORD.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _completion_text(prompt: str) -> str:
+    if "Provide only the numeric relevance score" in prompt:
+        # Stable pseudo-score per document so reranking is reproducible
+        return str(2 + int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16) % 9)
+    if "Format output strictly as JSON array" in prompt:
+        query = prompt.rsplit("Query:", 1)[-1].strip()
+        return json.dumps([
+            f"{query} wallet transfers",
+            f"{query} laundering through mixers",
+            f"{query} exchange cash out",
+            f"{query} phishing credentials",
+            f"{query} suspect identification",
+        ])
+    if "RELEVANT:" in prompt:
+        return "The query concerns the exchange hack.\nRELEVANT: This query is about the crypto hack investigation"
+    return " ".join(f"finding{i}" for i in range(REPORT_WORDS))
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs: Union[str, List[str]] = body["input"]
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    await asyncio.sleep(EMBEDDING_LATENCY_MS / 1000)
+    return {
+        "object": "list",
+        "model": body.get("model", "fake-embedding"),
+        "data": [
+            {"object": "embedding", "index": idx, "embedding": embed_text(text)}
+            for idx, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs), "total_tokens": sum(len(t) // 4 for t in inputs)},
+    }
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "fake-gpt", "object": "model", "created": 0, "owned_by": "benchmark"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body: Dict[str, Any] = await request.json()
+    prompt = "\n".join(message["content"] for message in body["messages"])
+    text = _completion_text(prompt)
+    is_report = text.startswith("finding")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = body.get("model", "fake-gpt")
+
+    if body.get("stream"):
+        async def events():
+            words = text.split(" ")
+            delay = (REPORT_LATENCY_MS if is_report else LLM_LATENCY_MS) / 1000 / max(len(words), 1)
+            for idx, word in enumerate(words):
+                await asyncio.sleep(delay)
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if idx == 0 else " " + word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": _usage(prompt, text),
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep((REPORT_LATENCY_MS if is_report else LLM_LATENCY_MS) / 1000)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": _usage(prompt, text),
+    }
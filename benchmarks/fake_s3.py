@@ -0,0 +1,67 @@
+"""
+Local in-memory stand-in for the S3 object API used by benchmarks (path-style PUT/GET/HEAD).
+
+Run with:
+    FAKE_S3_LATENCY_MS=20 python -m uvicorn benchmarks.fake_s3:app --port 9100
+and point the service at it with `s3_endpoint_url: http://localhost:9100` in the config.
+`POST /_faults {"put_errors": n}` makes the next n PUTs fail with 503 SlowDown, e.g. to exercise retries.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Dict, Tuple
+from fastapi import FastAPI, Request, Response
+
+S3_LATENCY_MS = float(os.getenv("FAKE_S3_LATENCY_MS", "20"))
+
+app = FastAPI(title="Fake S3")
+
+_objects: Dict[Tuple[str, str], Tuple[bytes, str, Dict[str, str]]] = {}
+_faults = {"put_errors": 0}
+
+_SLOW_DOWN = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b"<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>"
+)
+
+
+@app.post("/_faults")
+async def set_faults(faults: Dict[str, int]):
+    _faults.update(faults)
+    return _faults
+
+
+@app.head("/{bucket}")
+async def head_bucket(bucket: str):
+    return Response(status_code=200)
+
+
+@app.put("/{bucket}/{key:path}")
+async def put_object(bucket: str, key: str, request: Request):
+    body = await request.body()
+    await asyncio.sleep(S3_LATENCY_MS / 1000)
+    if _faults["put_errors"] > 0:
+        _faults["put_errors"] -= 1
+        return Response(content=_SLOW_DOWN, status_code=503, media_type="application/xml")
+    headers = {
+        name: value for name, value in request.headers.items()
+        if name in ("content-encoding", "cache-control") or name.startswith("x-amz-meta-")
+    }
+    _objects[(bucket, key)] = (body, request.headers.get("content-type", "binary/octet-stream"), headers)
+    return Response(status_code=200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+
+@app.get("/{bucket}/{key:path}")
+async def get_object(bucket: str, key: str):
+    if (bucket, key) not in _objects:
+        return Response(status_code=404)
+    body, content_type, headers = _objects[(bucket, key)]
+    return Response(content=body, media_type=content_type, headers=headers)
+
+
+@app.head("/{bucket}/{key:path}")
+async def head_object(bucket: str, key: str):
+    if (bucket, key) not in _objects:
+        return Response(status_code=404)
+    body, content_type, headers = _objects[(bucket, key)]
+    return Response(headers={"Content-Length": str(len(body)), "Content-Type": content_type, **headers})
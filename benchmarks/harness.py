@@ -0,0 +1,366 @@
+"""
+End-to-end benchmark of the investigation API against local stand-ins.
+
+Starts the fake OpenAI server (deterministic embeddings, configurable latency), the fake S3 server,
+and `app.application:app` with an embedded in-memory Qdrant seeded from `data_dir`. It then replays
+a query set at each concurrency level and reports throughput, p50/p95/p99 latency and per-stage
+timings taken from each response's `metrics`. Results are written as JSON for regression comparisons.
+
+Run with:
+    python -m benchmarks.harness --queries queries.jsonl --concurrency 1 8 32 --requests 100
+    python -m benchmarks.harness --concurrency 8 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+import httpx
+import yaml
+from benchmarks.load_test import DEFAULT_QUERIES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_queries(path: Optional[str], field: str) -> List[str]:
+    """
+    Reads one query per line: the `field` of a JSON object, or the plain line.
+
+    Args:
+        path (Optional[str]): JSONL or text file; the built-in queries are used if omitted.
+        field (str): JSON field holding the query text.
+
+    Returns:
+        List[str]: The queries, in file order.
+    """
+    if not path:
+        return list(DEFAULT_QUERIES)
+
+    queries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            text = record.get(field, "") if isinstance(record, dict) else str(record)
+            if text:
+                queries.append(str(text))
+    return queries
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Linear-interpolated percentile, `q` in [0, 100].
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, "w")
+    return subprocess.Popen(args, cwd=ROOT, env={**os.environ, **env}, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, process: subprocess.Popen, log_path: str, timeout: float = 120.0, interval: float = 0.2):
+    deadline = time.monotonic() + timeout
+    with httpx.Client(timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}, see {log_path}")
+            try:
+                if client.get(url).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(interval)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f} s, see {log_path}")
+
+
+def write_bench_config(base_config: str, workdir: str, s3_port: int, overrides: Dict[str, Any], name: str = "config.yaml") -> str:
+    """
+    Writes the config used by the benchmarked app: the base config pointed at the local stand-ins.
+
+    Returns:
+        str: Path of the written config file.
+    """
+    with open(base_config, "r") as file:
+        cfg = yaml.safe_load(file)
+
+    cfg.update({
+        "open_api_key": "benchmark",
+        "qdrant_location": ":memory:",
+        "embedding_dim": int(os.getenv("FAKE_EMBEDDING_DIM", "1536")),
+        "aws_access_key_id": "benchmark",
+        "aws_secret_access_key": "benchmark",
+        "region": "us-east-1",
+        "bucket": "s3://benchmark-reports",
+        "s3_endpoint_url": f"http://127.0.0.1:{s3_port}",
+        "jobs_db_path": os.path.join(workdir, "jobs.sqlite3"),
+        "logging_file": os.path.join(workdir, "app.log"),
+        "profiles_dir": os.path.join(workdir, "profiles"),
+        "data_dir": os.path.join(ROOT, cfg.get("data_dir", "./data/")),
+    })
+    cfg.update(overrides)
+
+    path = os.path.join(workdir, name)
+    with open(path, "w") as file:
+        yaml.safe_dump(cfg, file)
+    return path
+
+
+def serve(port: int):
+    """
+    Runs the API on `port`, seeding the embedded Qdrant collection once the app has started.
+    Expects CONFIG_PATH and OPENAI_BASE_URL to be set by the harness.
+    """
+    import uvicorn
+    from app.application import app
+    from src.embedding import Embedding
+    from logs.logging import log
+
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def seeded_lifespan(app_):
+        async with app_lifespan(app_) as state:
+            chunks = await asyncio.to_thread(Embedding().process)
+            # Through the DB layer, so sharded configurations are seeded into their shards
+            await app_.state.container.qdrant_db.add_vectors(
+                [chunk["id"] for chunk in chunks],
+                [chunk["embedding"] for chunk in chunks],
+                [{"text": chunk["text"], **chunk["metadata"]} for chunk in chunks],
+            )
+            log.info(f"Seeded {len(chunks)} chunks into the embedded Qdrant collection.")
+            yield state
+
+    app.router.lifespan_context = seeded_lifespan
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def run_load(url: str, queries: List[str], total: int, concurrency: int) -> List[Dict[str, Any]]:
+    """
+    Sends `total` investigations, at most `concurrency` at a time, cycling through `queries`.
+
+    Returns:
+        List[Dict[str, Any]]: One sample per request: latency, HTTP status and the response `metrics`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        async def one(idx: int):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json={"query": queries[idx % len(queries)], "user_id": f"bench_{idx}"})
+                    body = response.json() if response.status_code == 200 else {}
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    body, status = {"error": str(e)}, 0
+                samples.append({
+                    "latency": time.perf_counter() - started,
+                    "status": status,
+                    "error": status != 200 or bool(body.get("error")),
+                    "metrics": body.get("metrics") or {},
+                })
+
+        await asyncio.gather(*[one(idx) for idx in range(total)])
+    return samples
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    """
+    Aggregates one load run into throughput, latency percentiles, per-stage timings and LLM usage per request.
+    """
+    latencies = [sample["latency"] for sample in samples]
+    ok = [sample for sample in samples if not sample["error"]]
+
+    stage_names = sorted({stage for sample in ok for stage in sample["metrics"].get("stages", {})})
+    stages = {}
+    for stage in stage_names:
+        values = [sample["metrics"]["stages"].get(stage, 0.0) for sample in ok]
+        stages[stage] = {
+            "mean": round(sum(values) / len(values), 4),
+            "p50": round(percentile(values, 50), 4),
+            "p95": round(percentile(values, 95), 4),
+        }
+
+    def per_request(field: str) -> Optional[float]:
+        values = [sample["metrics"].get("llm", {}).get(field, 0) for sample in ok]
+        return round(sum(values) / len(values), 6) if values else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": round(percentile(latencies, 50), 4) if latencies else None,
+            "p95": round(percentile(latencies, 95), 4) if latencies else None,
+            "p99": round(percentile(latencies, 99), 4) if latencies else None,
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "stages_seconds": stages,
+        "llm_per_request": {
+            "calls": per_request("calls"),
+            "prompt_tokens": per_request("prompt_tokens"),
+            "completion_tokens": per_request("completion_tokens"),
+            "cost_usd": per_request("cost_usd"),
+        },
+    }
+
+
+def print_run(run: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    latency = run["latency_seconds"]
+    print(f"\nconcurrency {run['concurrency']}: {run['requests']} requests, {run['errors']} errors, "
+          f"{run['throughput_rps']} req/s")
+
+    def delta(value: Optional[float], old: Optional[float]) -> str:
+        if baseline is None or value is None or not old:
+            return ""
+        return f"  ({(value - old) / old * 100:+.1f}% vs baseline {old})"
+
+    for name in ("p50", "p95", "p99"):
+        old = baseline["latency_seconds"].get(name) if baseline else None
+        print(f"  latency {name}: {latency[name]} s{delta(latency[name], old)}")
+    if baseline:
+        print(f"  throughput: {run['throughput_rps']} req/s{delta(run['throughput_rps'], baseline['throughput_rps'])}")
+    for stage, values in run["stages_seconds"].items():
+        print(f"  {stage:<9} mean {values['mean']:.4f} s  p95 {values['p95']:.4f} s")
+    print(f"  llm per request: {run['llm_per_request']}")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSONL or text file with one query per line (default: built-in queries).")
+    parser.add_argument("--field", default="query", help="JSON field holding the query text.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--warmup", type=int, default=2, help="Unrecorded requests before each level.")
+    parser.add_argument("--endpoint", default="/crypto_investigate")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--report-latency-ms", type=float, default=1200)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--s3-latency-ms", type=float, default=20)
+    parser.add_argument("--base-config", default=os.path.join(ROOT, "configs", "config _example.yaml"))
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="Config overrides for the app, e.g. rerank_mode=cascade (values parsed as YAML).")
+    parser.add_argument("--report-cache", action="store_true", help="Keep the report cache on (off by default).")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    overrides = {"report_cache_enabled": args.report_cache}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        overrides[key] = yaml.safe_load(value)
+
+    queries = load_queries(args.queries, args.field)
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    openai_port, s3_port, app_port = free_port(), free_port(), free_port()
+    config_path = write_bench_config(args.base_config, workdir, s3_port, overrides)
+
+    stand_in_env = {
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_REPORT_LATENCY_MS": str(args.report_latency_ms),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_S3_LATENCY_MS": str(args.s3_latency_ms),
+    }
+    uvicorn_args = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning"]
+    processes = []
+    try:
+        for name, module, port in (("openai", "benchmarks.fake_openai:app", openai_port), ("s3", "benchmarks.fake_s3:app", s3_port)):
+            log_path = os.path.join(workdir, f"fake_{name}.log")
+            process = spawn([*uvicorn_args, "--port", str(port), module], stand_in_env, log_path)
+            processes.append(process)
+            wait_ready(f"http://127.0.0.1:{port}/docs", process, log_path)
+
+        app_env = {
+            "CONFIG_PATH": config_path,
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+            "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        }
+        log_path = os.path.join(workdir, "app_stdout.log")
+        app_process = spawn([sys.executable, "-m", "benchmarks.harness", "--serve", str(app_port)], app_env, log_path)
+        processes.append(app_process)
+        wait_ready(f"http://127.0.0.1:{app_port}/health", app_process, log_path)
+
+        url = f"http://127.0.0.1:{app_port}{args.endpoint}"
+        baseline = None
+        if args.compare:
+            with open(args.compare, "r") as file:
+                baseline = {run["concurrency"]: run for run in json.load(file)["runs"]}
+
+        runs = []
+        for concurrency in args.concurrency:
+            if args.warmup:
+                asyncio.run(run_load(url, queries, args.warmup, min(args.warmup, concurrency)))
+            started = time.perf_counter()
+            samples = asyncio.run(run_load(url, queries, args.requests, concurrency))
+            run = summarize(samples, time.perf_counter() - started, concurrency)
+            runs.append(run)
+            print_run(run, (baseline or {}).get(concurrency))
+
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "queries": len(queries),
+        "endpoint": args.endpoint,
+        "stand_ins": {key.lower(): float(value) for key, value in stand_in_env.items()},
+        "config_overrides": overrides,
+        "runs": runs,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults written to {output} (logs in {workdir})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Fires concurrent investigation requests at a running API and reports latency and throughput.
+
+Run with:
+    python -m benchmarks.load_test --url http://localhost:8000/crypto_investigate --requests 50 --concurrency 25
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+import httpx
+
+DEFAULT_QUERIES = [
+    "Which wallets received the stolen crypto funds?",
+    "How was Tornado Cash used to launder the hack proceeds?",
+    "What phishing method gave the hacker wallet access?",
+    "Which exchanges were used to cash out stolen bitcoin?",
+]
+
+
+async def _run(url: str, total: int, concurrency: int, queries: List[str]) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        async def one(idx: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, json={"query": queries[idx % len(queries)], "user_id": f"load_{idx}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*[one(idx) for idx in range(total)])
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/crypto_investigate")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=25)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    latencies = asyncio.run(_run(args.url, args.requests, args.concurrency, DEFAULT_QUERIES))
+    elapsed = time.perf_counter() - started
+
+    print(f"requests:    {len(latencies)} at concurrency {args.concurrency}")
+    print(f"wall time:   {elapsed:.2f} s")
+    print(f"throughput:  {len(latencies) / elapsed:.2f} req/s")
+    print(f"latency avg: {statistics.mean(latencies):.2f} s, max {max(latencies):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Offline retrieval quality-versus-latency benchmark.
+
+Evaluates a labeled query set (`benchmarks/data/retrieval_queries.jsonl`) over the `data_dir` case files,
+optionally scaled with synthetic distractor documents, for every configuration of a sweep. Each
+configuration runs in its own process: it chunks and ingests the corpus with its own settings into an
+embedded Qdrant (or a Qdrant server, for HNSW sweeps; embedded Qdrant searches exactly), then runs
+retrieval and reranking with the production components against the fake OpenAI server, whose
+embeddings are frozen and deterministic. Query guarding and report generation are not run.
+
+Labels name evidence passages, not chunks: a retrieved chunk is relevant to a passage if it comes from
+the labeled case file and contains at least half of the passage, so labels hold for any chunking.
+Synthetic documents are never relevant.
+
+Reports per configuration: recall@k and MRR of the retrieved candidates (ordered by vector score) and
+of the reranked evidence, mean and p95 latency per stage, and LLM calls and tokens per query.
+Results are written as JSON; `--compare` flags quality regressions against an earlier run.
+The stand-in's LLM relevance scores are arbitrary, so rerank quality is only meaningful for the
+vector and cross-encoder scores; LLM-scored modes still show their latency and token cost.
+
+Run with:
+    python -m benchmarks.retrieval_quality
+    python -m benchmarks.retrieval_quality --scale 20 --sweep chunk_size=200,500 top_k_retrieval=5,10,20
+    python -m benchmarks.retrieval_quality --sweep qdrant_search_hnsw_ef=16,64,128 --qdrant-host localhost:6333
+    python -m benchmarks.retrieval_quality --compare benchmarks/results/quality_baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+import yaml
+from benchmarks.harness import ROOT, free_port, spawn, wait_ready, write_bench_config, percentile, git_commit
+
+DEFAULT_QUERIES_PATH = os.path.join(ROOT, "benchmarks", "data", "retrieval_queries.jsonl")
+DEFAULT_SWEEP = {
+    "chunk_size": [200, 500],
+    "chunk_overlap": [0, 50],
+    "top_k_retrieval": [5, 10],
+    "rerank_mode": ["vector", "cascade"],
+}
+K_VALUES = (1, 3, 5, 10)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def load_labeled_queries(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads the labeled queries: one JSON object per line with `query` and `relevant`,
+    a list of {"file": case file name, "text": evidence passage}.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def build_corpus(source_dir: str, target_dir: str, scale: int, seed: int = 13) -> int:
+    """
+    Copies the case files to `target_dir` and adds `scale` synthetic distractors per case file:
+    documents recombining sentences from every case, with about a third of their words replaced,
+    so they share the corpus vocabulary without containing any evidence passage.
+
+    Returns:
+        int: The number of documents written.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    case_paths = sorted(path for path in os.listdir(source_dir) if path.endswith(".txt"))
+    sentences = []
+    for name in case_paths:
+        shutil.copy(os.path.join(source_dir, name), os.path.join(target_dir, name))
+        with open(os.path.join(source_dir, name), "r", encoding="utf-8") as file:
+            sentences.extend(sentence.strip() for sentence in _SENTENCE.split(file.read()) if sentence.strip())
+
+    rng = random.Random(seed)
+    vocabulary = sorted({word for sentence in sentences for word in sentence.split()})
+    for idx in range(scale * len(case_paths)):
+        paragraphs = []
+        for _ in range(rng.randint(2, 3)):
+            picked = rng.sample(sentences, k=min(len(sentences), rng.randint(2, 4)))
+            paragraphs.append(" ".join(
+                " ".join(rng.choice(vocabulary) if rng.random() < 0.35 else word for word in sentence.split())
+                for sentence in picked
+            ))
+        with open(os.path.join(target_dir, f"synthetic_{idx:05d}.txt"), "w", encoding="utf-8") as file:
+            file.write("\n\n".join(paragraphs))
+    return len(case_paths) * (scale + 1)
+
+
+def matched_evidence(document: Dict[str, Any], relevant: List[Dict[str, str]]) -> List[int]:
+    """
+    Returns the indices of the evidence passages a retrieved chunk covers: it comes from the passage's
+    file and contains a contiguous run of at least half the passage's words.
+    """
+    file_name = os.path.basename(document.get("metadata", {}).get("file_name", ""))
+    chunk_words = _words(document.get("text", ""))
+    matched = []
+    for idx, evidence in enumerate(relevant):
+        if evidence["file"] != file_name:
+            continue
+        words = _words(evidence["text"])
+        span = max(1, math.ceil(len(words) / 2))
+        chunk_grams = {tuple(chunk_words[i:i + span]) for i in range(len(chunk_words) - span + 1)}
+        if any(tuple(words[i:i + span]) in chunk_grams for i in range(len(words) - span + 1)):
+            matched.append(idx)
+    return matched
+
+
+def score_ranking(documents: List[Dict[str, Any]], relevant: List[Dict[str, str]], k_values: tuple = K_VALUES) -> Dict[str, float]:
+    """
+    Computes recall@k (share of evidence passages covered by the top k) and the reciprocal rank
+    of the first relevant document for one ranked list.
+    """
+    first_hit: Dict[int, int] = {}
+    reciprocal_rank = 0.0
+    for rank, document in enumerate(documents, start=1):
+        matched = matched_evidence(document, relevant)
+        for idx in matched:
+            first_hit.setdefault(idx, rank)
+        if matched and not reciprocal_rank:
+            reciprocal_rank = 1.0 / rank
+
+    scores = {f"recall@{k}": sum(rank <= k for rank in first_hit.values()) / len(relevant) for k in k_values}
+    scores["recall@all"] = len(first_hit) / len(relevant)
+    scores["mrr"] = reciprocal_rank
+    return scores
+
+
+async def _evaluate(queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Ingests the corpus and runs every query through retrieval and reranking, in the configuration of this process.
+    """
+    import openai
+    from qdrant_client import AsyncQdrantClient
+    from configs import config
+    from db.qdrant_db import AsyncQdrantDB
+    from src.embedding import Embedding
+    from src.metrics import start_request_metrics, finish_request_metrics
+    from src.retriever import DocumentRetriever
+    from src.reranker import Reranker
+
+    location = getattr(config, "qdrant_location", None)
+    client = AsyncQdrantClient(location=":memory:") if location == ":memory:" else AsyncQdrantClient(host=config.qdrant_host, port=config.qdrant_port)
+    qdrant_db = AsyncQdrantDB(client=client)
+    openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, max_retries=0)
+
+    try:
+        started = time.perf_counter()
+        await qdrant_db.initialize_collection()
+        chunks = await asyncio.to_thread(Embedding().process)
+        await qdrant_db.add_vectors(
+            [chunk["id"] for chunk in chunks],
+            [chunk["embedding"] for chunk in chunks],
+            [{"text": chunk["text"], **chunk["metadata"]} for chunk in chunks],
+        )
+        ingest_seconds = time.perf_counter() - started
+
+        retriever = DocumentRetriever(openai_client=openai_client, qdrant_db=qdrant_db)
+        reranker = Reranker(openai_client=openai_client)
+        samples = []
+        for item in queries:
+            start_request_metrics()
+            retrieval = await retriever.retrieve(item["query"])
+            candidates = sorted(retrieval["documents"], key=lambda doc: doc.get("score", 0.0), reverse=True)
+            ranked = await reranker.rank_evidence(item["query"], candidates)
+            metrics = finish_request_metrics("quality_benchmark", "ok")
+            samples.append({
+                "query": item["query"],
+                "candidates": len(candidates),
+                "retrieval": score_ranking(candidates, item["relevant"]),
+                "rerank": score_ranking(ranked, item["relevant"]),
+                "metrics": metrics,
+            })
+    finally:
+        if location != ":memory:":
+            for collection in (await client.get_collections()).collections:
+                if collection.name.startswith(config.qdrant_collection):
+                    await client.delete_collection(collection.name)
+        await client.close()
+
+    return {"chunks": len(chunks), "ingest_seconds": round(ingest_seconds, 3), "samples": samples}
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Averages one configuration's per-query samples.
+    """
+    samples = result["samples"]
+
+    def mean(values: List[float]) -> float:
+        return round(sum(values) / len(values), 4) if values else 0.0
+
+    def quality(part: str) -> Dict[str, float]:
+        return {name: mean([sample[part][name] for sample in samples]) for name in samples[0][part]}
+
+    stages = {}
+    for stage in sorted({stage for sample in samples for stage in sample["metrics"]["stages"]}):
+        values = [sample["metrics"]["stages"].get(stage, 0.0) for sample in samples]
+        stages[stage] = {"mean": mean(values), "p95": round(percentile(values, 95), 4)}
+    totals = [sample["metrics"]["total_seconds"] for sample in samples]
+
+    return {
+        "chunks": result["chunks"],
+        "ingest_seconds": result["ingest_seconds"],
+        "candidates_per_query": mean([sample["candidates"] for sample in samples]),
+        "retrieval": quality("retrieval"),
+        "rerank": quality("rerank"),
+        "latency_seconds": {"mean": mean(totals), "p95": round(percentile(totals, 95), 4)},
+        "stages_seconds": stages,
+        "llm_per_query": {
+            field: mean([sample["metrics"]["llm"][field] for sample in samples])
+            for field in ("calls", "prompt_tokens", "completion_tokens")
+        },
+    }
+
+
+def parse_sweep(items: List[str]) -> Dict[str, List[Any]]:
+    """
+    Parses `KEY=v1,v2,...` items; values are parsed as YAML.
+    """
+    sweep = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        sweep[key] = [yaml.safe_load(value) for value in values.split(",")]
+    return sweep
+
+
+def config_label(settings: Dict[str, Any]) -> str:
+    return " ".join(f"{key}={value}" for key, value in settings.items())
+
+
+def print_run(run: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    summary = run["summary"]
+
+    def delta(part: str, name: str) -> str:
+        if baseline is None:
+            return ""
+        return f" ({summary[part][name] - baseline['summary'][part][name]:+.3f})"
+
+    print(f"\n{run['label']}")
+    print(f"  {summary['chunks']} chunks, {summary['candidates_per_query']} candidates per query")
+    for part in ("retrieval", "rerank"):
+        scores = summary[part]
+        print(f"  {part:<9} recall@5 {scores['recall@5']:.3f}{delta(part, 'recall@5')}  "
+              f"recall@10 {scores['recall@10']:.3f}{delta(part, 'recall@10')}  mrr {scores['mrr']:.3f}{delta(part, 'mrr')}")
+    print(f"  latency   mean {summary['latency_seconds']['mean']:.4f} s  p95 {summary['latency_seconds']['p95']:.4f} s")
+    for stage, values in summary["stages_seconds"].items():
+        print(f"  {stage:<9} mean {values['mean']:.4f} s  p95 {values['p95']:.4f} s")
+    print(f"  llm per query: {summary['llm_per_query']}")
+
+
+def regressions(runs: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], max_drop: float) -> List[str]:
+    """
+    Lists the configurations whose reranked recall@5 or MRR dropped by more than `max_drop` against the baseline.
+    """
+    found = []
+    for run in runs:
+        old = baseline.get(run["label"])
+        if old is None:
+            continue
+        for name in ("recall@5", "mrr"):
+            drop = old["summary"]["rerank"][name] - run["summary"]["rerank"][name]
+            if drop > max_drop:
+                found.append(f"{run['label']}: rerank {name} {old['summary']['rerank'][name]:.3f} -> {run['summary']['rerank'][name]:.3f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES_PATH, help="Labeled queries (JSONL).")
+    parser.add_argument("--scale", type=int, default=0, help="Synthetic distractor documents per case file.")
+    parser.add_argument("--sweep", nargs="*", metavar="KEY=V1,V2", help="Config values to sweep; every combination is run.")
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="Config overrides for every run (values parsed as YAML).")
+    parser.add_argument("--qdrant-host", metavar="HOST:PORT", help="Qdrant server to benchmark instead of embedded Qdrant (needed for HNSW sweeps).")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--base-config", default=os.path.join(ROOT, "configs", "config _example.yaml"))
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/quality_<timestamp>.json).")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="Reranked recall@5 or MRR drop that fails a --compare run.")
+    parser.add_argument("--evaluate", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    queries = load_labeled_queries(args.queries)
+    if args.evaluate:
+        result = asyncio.run(_evaluate(queries))
+        with open(args.evaluate, "w") as file:
+            json.dump(result, file)
+        return
+
+    sweep = parse_sweep(args.sweep) if args.sweep is not None else DEFAULT_SWEEP
+    fixed = {key: yaml.safe_load(value) for key, _, value in (item.partition("=") for item in args.set)}
+
+    workdir = tempfile.mkdtemp(prefix="rag-quality-")
+    with open(args.base_config, "r") as file:
+        data_dir = os.path.join(ROOT, yaml.safe_load(file).get("data_dir", "./data/"))
+    corpus_dir = os.path.join(workdir, "corpus")
+    documents = build_corpus(data_dir, corpus_dir, args.scale)
+    print(f"Corpus: {documents} documents ({args.scale} synthetic per case file), {len(queries)} labeled queries.")
+
+    openai_port = free_port()
+    stand_in_env = {"FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms), "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms)}
+    log_path = os.path.join(workdir, "fake_openai.log")
+    openai_process = spawn([sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning",
+                            "--port", str(openai_port), "benchmarks.fake_openai:app"], stand_in_env, log_path)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = {run["label"]: run for run in json.load(file)["runs"]}
+
+    runs = []
+    try:
+        wait_ready(f"http://127.0.0.1:{openai_port}/docs", openai_process, log_path)
+        for idx, values in enumerate(itertools.product(*sweep.values())):
+            settings = dict(zip(sweep, values))
+            overrides = {
+                "data_dir": corpus_dir,
+                "report_cache_enabled": False,
+                "log_console": False,
+                **fixed,
+                **settings,
+            }
+            if args.qdrant_host:
+                host, _, port = args.qdrant_host.partition(":")
+                overrides.update({"qdrant_location": None, "qdrant_host": host, "qdrant_port": int(port or 6333),
+                                  "qdrant_collection": f"retrieval_quality_{idx}"})
+            config_path = write_bench_config(args.base_config, workdir, 0, overrides, name=f"config_{idx}.yaml")
+            result_path = os.path.join(workdir, f"result_{idx}.json")
+            run_log = os.path.join(workdir, f"run_{idx}.log")
+            process = spawn(
+                [sys.executable, "-m", "benchmarks.retrieval_quality", "--queries", args.queries, "--evaluate", result_path],
+                {
+                    "CONFIG_PATH": config_path,
+                    "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                    "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+                },
+                run_log,
+            )
+            if process.wait() != 0:
+                print(f"\n{config_label(settings)}: failed, see {run_log}")
+                continue
+            with open(result_path, "r") as file:
+                run = {"label": config_label(settings), "settings": settings, "summary": summarize(json.load(file))}
+            runs.append(run)
+            print_run(run, (baseline or {}).get(run["label"]))
+    finally:
+        openai_process.terminate()
+        openai_process.wait(timeout=10)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "queries": len(queries),
+        "documents": documents,
+        "scale": args.scale,
+        "stand_ins": {key.lower(): float(value) for key, value in stand_in_env.items()},
+        "config_overrides": fixed,
+        "runs": runs,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", "quality_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults written to {output} (logs in {workdir})")
+
+    if baseline is not None:
+        found = regressions(runs, baseline, args.max_drop)
+        for line in found:
+            print(f"Quality regression: {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Cold-start benchmark: import time of `app.application` and time until a fresh worker is ready.
+
+Measures, over several fresh interpreters:
+- the wall time of `import app.application`, plus the slowest modules from `python -X importtime`;
+- the time from spawning `uvicorn app.application:app` until /health answers, with warm-up on and off,
+  and the latency of the first investigation it serves (against the local OpenAI and S3 stand-ins).
+
+Run with:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any
+import httpx
+from benchmarks.harness import ROOT, free_port, spawn, wait_ready, write_bench_config, git_commit
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def measure_import(env: Dict[str, str], runs: int) -> Dict[str, Any]:
+    """
+    Times `import app.application` in fresh interpreters and lists the slowest top-level imports.
+    """
+    code = "import time; started = time.perf_counter(); import app.application; print(time.perf_counter() - started)"
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT, env={**os.environ, **env}, text=True)
+        timings.append(float(output.strip().splitlines()[-1]))
+
+    trace = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.application"],
+        cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True,
+    ).stderr
+
+    modules = []
+    for match in _IMPORT_LINE.finditer(trace):
+        _, cumulative_us, indent, module = match.groups()
+        # Only modules imported directly by the app's own import chain, not their internals
+        if len(indent) <= 5:
+            modules.append({"module": module, "cumulative_ms": round(int(cumulative_us) / 1000, 1)})
+    modules.sort(key=lambda item: item["cumulative_ms"], reverse=True)
+
+    return {"seconds": _summary(timings), "slowest_imports": modules[:15]}
+
+
+def measure_ready(config_path: str, openai_port: int, workdir: str, runs: int) -> Dict[str, Any]:
+    """
+    Spawns fresh workers and times how long each takes to answer /health, and its first investigation.
+    """
+    env = {
+        "CONFIG_PATH": config_path,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+    }
+    ready_times, first_request_times = [], []
+    for run in range(runs):
+        port = free_port()
+        log_path = os.path.join(workdir, f"startup_{os.path.basename(config_path)}_{run}.log")
+        started = time.perf_counter()
+        process = spawn(
+            [sys.executable, "-m", "uvicorn", "app.application:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            env, log_path,
+        )
+        try:
+            wait_ready(f"http://127.0.0.1:{port}/health", process, log_path, interval=0.01)
+            ready_times.append(time.perf_counter() - started)
+
+            request_started = time.perf_counter()
+            httpx.post(
+                f"http://127.0.0.1:{port}/crypto_investigate",
+                json={"query": "Which wallets received the stolen crypto funds?", "user_id": "startup_bench"},
+                timeout=60,
+            )
+            first_request_times.append(time.perf_counter() - request_started)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    return {"ready_seconds": _summary(ready_times), "first_request_seconds": _summary(first_request_times)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement.")
+    parser.add_argument("--base-config", default=os.path.join(ROOT, "configs", "config _example.yaml"))
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/startup_<timestamp>.json).")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag-startup-")
+    openai_port, s3_port = free_port(), free_port()
+    configs = {
+        "warm_up": write_bench_config(args.base_config, workdir, s3_port, {"warmup_on_startup": True}, "warm.yaml"),
+        "no_warm_up": write_bench_config(args.base_config, workdir, s3_port, {"warmup_on_startup": False}, "cold.yaml"),
+    }
+
+    processes = []
+    try:
+        for module, port in (("benchmarks.fake_openai:app", openai_port), ("benchmarks.fake_s3:app", s3_port)):
+            log_path = os.path.join(workdir, f"{module.split(':')[0].split('.')[-1]}.log")
+            process = spawn(
+                [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                {}, log_path,
+            )
+            processes.append(process)
+            wait_ready(f"http://127.0.0.1:{port}/docs", process, log_path)
+
+        imports = measure_import({"CONFIG_PATH": configs["warm_up"]}, args.runs)
+        print(f"import app.application: {imports['seconds']}")
+        for item in imports["slowest_imports"][:8]:
+            print(f"  {item['module']:<40} {item['cumulative_ms']} ms")
+
+        startup = {}
+        for name, config_path in configs.items():
+            startup[name] = measure_ready(config_path, openai_port, workdir, args.runs)
+            print(f"{name}: ready {startup[name]['ready_seconds']}, first request {startup[name]['first_request_seconds']}")
+
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "runs": args.runs,
+        "import": imports,
+        "startup": startup,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", datetime.now().strftime("startup_%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults written to {output} (logs in {workdir})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
+import os
 from pathlib import Path
 from typing import Optional
 
 import yaml
 
 ROOT = Path(__file__).resolve().parent.parent
-CONFIG_FILE_PATH = ROOT / "configs" / "config.yaml"
+# CONFIG_PATH points a process at another config file, e.g. for benchmarks
+CONFIG_FILE_PATH = Path(os.getenv("CONFIG_PATH", ROOT / "configs" / "config.yaml"))
 
 class DictDotNotation(dict):
     def __init__(self, *args, **kwargs):
@@ -32,4 +34,27 @@ def configure() -> DictDotNotation:
     cfg = DictDotNotation(cfg)
     return cfg
 
-config = configure()
+class LazyConfig:
+    """Reads the config file on first access, so importing modules that use `config` stays cheap."""
+
+    def __init__(self):
+        self._config: Optional[DictDotNotation] = None
+
+    def _load(self) -> DictDotNotation:
+        if self._config is None:
+            self._config = configure()
+        return self._config
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __getitem__(self, key: str):
+        return self._load()[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._load()
+
+    def get(self, key: str, default=None):
+        return self._load().get(key, default)
+
+config = LazyConfig()
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import quote
+from configs import config
+from db.report_storage import ReportStorage
+from logs.logging import log
+
+
+class LocalReportStorage(ReportStorage):
+    """
+    Stores investigation reports and their index entries under a local directory, with the same keys as S3.
+    For deployments without cloud credentials, and for running the full pipeline offline.
+    Reports are downloaded through the app's `/reports/download` endpoint.
+
+    The encoded entry at the end of an index key can exceed the 255-byte file name limit, e.g. for
+    an email address as user ID, so index files are named by its hash and hold the entry as their body.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root (Optional[str]): Storage directory; `report_storage_dir` if omitted.
+        """
+        super().__init__()
+        self.root = os.path.realpath(root or getattr(config, "report_storage_dir", "./report_storage"))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        """
+        Maps a key to a path under the root, refusing keys that would escape it.
+        """
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def _write(self, key: str, body: bytes):
+        # Write to a temporary file and rename, so readers never see a partial report
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _write_index_entry(self, index_key: str):
+        directory, name = index_key.rsplit("/", 1)
+        inverted_time, token = name.split("-", 1)
+        self._write(f"{directory}/{inverted_time}-{hashlib.sha256(token.encode('ascii')).hexdigest()[:16]}", token.encode("ascii"))
+
+    def _read_index_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        # Entries written before hashed names carry the entry in the name and have an empty body
+        entry = self.parse_index_key(key)
+        if entry is not None:
+            return entry
+        try:
+            with open(self._path(key), "rb") as file:
+                token = file.read().decode("ascii")
+        except (OSError, UnicodeDecodeError, ValueError):
+            return None
+        return self.parse_index_key(f"{key.rsplit('-', 1)[0]}-{token}")
+
+    @staticmethod
+    def report_url(file_path: str) -> str:
+        return f"/reports/download?file_path={quote(file_path, safe='')}"
+
+    def upload_report(self, report_data: Dict[str, Any], file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Writes a report and its index entries to the storage directory.
+
+        Args:
+            report_data (Dict[str, Any]): The report to store.
+            file_path (Optional[str]): Key from `build_report_key`; derived from the report if omitted.
+        """
+        try:
+            file_path = file_path or self.build_report_key(report_data)
+            user_id = report_data.get("user_id", "unknown_user")
+
+            body, _ = self.encode_report(report_data)
+            self._write(file_path, body)
+            for index_key in self.build_index_keys(file_path, user_id, len(body)):
+                self._write_index_entry(index_key)
+
+            return {
+                "success": True,
+                "user_id": user_id,
+                "file_path": file_path,
+                "url": self.report_url(file_path),
+                "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+                "size": len(body)
+            }
+
+        except (OSError, ValueError) as e:
+            return {"success": False, "error": str(e)}
+
+    def get_recent_reports(self, limit: int = 10, user_id: Optional[str] = None, day: Optional[str] = None,
+                           cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lists reports newest first by walking the index directories in sorted order.
+        See `ReportStorage.get_recent_reports`.
+        """
+        prefix = self.index_prefix(user_id, day)
+        if cursor and not cursor.startswith(prefix):
+            raise ValueError("Cursor does not belong to this listing.")
+        limit = max(1, min(limit, 1000))
+
+        # Index keys are <scope>/<day>/<name>: walk day directories, then entries, in sorted order
+        scope = self.index_prefix(user_id)
+        scope_dir = self._path(scope)
+        if not os.path.isdir(scope_dir):
+            return {"success": True, "reports": [], "next_cursor": None}
+        days = [prefix[len(scope):].strip("/")] if day else sorted(os.listdir(scope_dir))
+        cursor_day = cursor[len(scope):].split("/")[0] if cursor else ""
+
+        keys = []
+        for day_dir in days:
+            day_path = os.path.join(scope_dir, day_dir)
+            if day_dir < cursor_day or not os.path.isdir(day_path):
+                continue
+            for name in sorted(os.listdir(day_path)):
+                key = f"{scope}{day_dir}/{name}"
+                if name.startswith(".tmp-") or (cursor and key <= cursor):
+                    continue
+                keys.append(key)
+                if len(keys) > limit:
+                    break
+            if len(keys) > limit:
+                break
+
+        reports = []
+        for key in keys[:limit]:
+            entry = self._read_index_entry(key)
+            if entry is not None:
+                entry["url"] = self.report_url(entry["file_path"])
+                reports.append(entry)
+        return {
+            "success": True,
+            "reports": reports,
+            "next_cursor": keys[limit - 1] if len(keys) > limit else None
+        }
+
+    def read_raw(self, file_path: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Reads a stored report body and its encoding, or returns None if it does not exist.
+
+        Args:
+            file_path (str): The report key.
+        """
+        try:
+            with open(self._path(file_path), "rb") as file:
+                body = file.read()
+        except (FileNotFoundError, IsADirectoryError, ValueError):
+            return None
+        return body, self.detect_encoding(body)
+
+    def rebuild_index(self) -> Dict[str, Any]:
+        """
+        Writes index entries for every report under `reports/`.
+        """
+        indexed = 0
+        reports_dir = self._path("reports")
+        for directory, _, names in os.walk(reports_dir):
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                report = self.read_report(key)
+                if report is None:
+                    log.warning(f"Report {key} was deleted while the index was rebuilt, skipping it.")
+                    continue
+                for index_key in self.build_index_keys(key, report.get("user_id", "unknown_user"), os.path.getsize(path)):
+                    self._write_index_entry(index_key)
+                indexed += 1
+        return {"success": True, "indexed": indexed}
+
+    def check(self):
+        """
+        Checks that the storage directory is writable.
+        """
+        if not os.access(self.root, os.W_OK):
+            raise PermissionError(f"Report storage directory is not writable: {self.root}")
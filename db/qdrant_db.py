@@ -1,65 +1,176 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from typing import List, Dict, Any
+import asyncio
+import heapq
+import time
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, VectorParamsDiff, HnswConfigDiff, CollectionParamsDiff, QueryRequest, PointStruct,
+    Filter, FieldCondition, MatchValue, SearchParams,
+)
+from typing import List, Dict, Any, Optional
 from configs import config
-import logging
+from db.shards import (
+    sharding_mode, shard_collection, registry_collection, registry_id, group_by_shard, registry_entry, mentioned_shards,
+)
+from logs.logging import log
+
+
+def _hits_to_documents(hits) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": hit.id,
+            "score": hit.score,
+            "text": hit.payload.get("text", ""),
+            "metadata": hit.payload,
+        }
+        for hit in hits
+    ]
+
+
+def _merge_top_k(results: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    # Cosine scores from collections of the same embedding model are comparable
+    if len(results) == 1:
+        return results[0]
+    return heapq.nlargest(top_k, (doc for documents in results for doc in documents), key=lambda doc: doc["score"])
+
+
+def vector_params() -> VectorParams:
+    """
+    Vector settings of new collections: cosine over `embedding_dim` dimensions, with the HNSW graph
+    built from `qdrant_hnsw_m` and `qdrant_hnsw_ef_construct` when set (Qdrant's defaults otherwise).
+    """
+    m = getattr(config, "qdrant_hnsw_m", None)
+    ef_construct = getattr(config, "qdrant_hnsw_ef_construct", None)
+    hnsw_config = HnswConfigDiff(m=m, ef_construct=ef_construct) if m or ef_construct else None
+    return VectorParams(size=config.embedding_dim, distance=Distance.COSINE, hnsw_config=hnsw_config)
+
+
+def search_params() -> Optional[SearchParams]:
+    # `qdrant_search_hnsw_ef` trades search latency for recall; Qdrant picks it when unset
+    hnsw_ef = getattr(config, "qdrant_search_hnsw_ef", None)
+    return SearchParams(hnsw_ef=hnsw_ef) if hnsw_ef else None
+
+
+def _not_archived() -> Filter:
+    return Filter(must_not=[FieldCondition(key="archived", match=MatchValue(value=True))])
+
+
+def create_client(location: Optional[str] = None) -> QdrantClient:
+    """
+    Creates a synchronous Qdrant client, like the API's: embedded (":memory:" or a directory) when
+    `location` or `qdrant_location` is set, otherwise connected to `qdrant_host`/`qdrant_port`.
+    """
+    location = location or getattr(config, "qdrant_location", None)
+    if location == ":memory:":
+        return QdrantClient(location=":memory:")
+    if location:
+        return QdrantClient(path=location)
+    return QdrantClient(host=config.qdrant_host, port=config.qdrant_port)
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
 class QdrantDB:
     """
     Manages vector storage and retrieval using Qdrant.
+
+    With `qdrant_sharding` set to "case" or "month", chunks are written to one collection per case file
+    or per month instead of `qdrant_collection`, and each shard is listed in a registry collection
+    (see `db.shards`). Old shards can be archived: their vectors, index and payloads move to disk,
+    and searches skip them unless the query names them.
     """
 
-    def __init__(self):
+    def __init__(self, client: Optional[QdrantClient] = None, check_collection: bool = True):
         """
         Initializes the connection to Qdrant, ensuring the collection is ready.
+
+        Args:
+            client (Optional[QdrantClient]): Shared client; a new one is created if omitted.
+            check_collection (bool): Whether to verify (and create) the collection now.
         """
-        self.client = QdrantClient(host=config.qdrant_host, port=config.qdrant_port)
+        self.client = client or create_client()
         self.collection_name = config.qdrant_collection
+        self.sharded = sharding_mode() != "none"
+
+        if check_collection:
+            self._initialize_collection()
 
-        self._initialize_collection()
+    def _ensure_collection(self, collection_name: str):
+        existing_collections = [col.name for col in self.client.get_collections().collections]
+        if collection_name not in existing_collections:
+            self.client.create_collection(collection_name=collection_name, vectors_config=vector_params())
+            log.info(f"Qdrant collection '{collection_name}' created.")
 
     def _initialize_collection(self):
         """
-        Creates the collection in Qdrant if it does not already exist.
+        Creates the collection (or, when sharded, the shard registry) in Qdrant if it does not already exist.
         """
-        existing_collections = [col.name for col in self.client.get_collections().collections]
-        if self.collection_name not in existing_collections:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(size=config.embedding_dim, distance=Distance.COSINE),
-            )
-            logger.info(f"Qdrant collection '{self.collection_name}' created.")
+        self._ensure_collection(registry_collection() if self.sharded else self.collection_name)
 
     def add_vectors(self, ids: List[str], vectors: List[List[float]], metadata: List[Dict[str, Any]]):
         """
-        Inserts vectors into Qdrant with correct payload structure.
+        Inserts vectors into Qdrant with correct payload structure; into their shard collections when sharded.
         """
         try:
-            points = []
-            for doc_id, vec, meta in zip(ids, vectors, metadata):
+            payloads = []
+            for doc_id, meta in zip(ids, metadata):
                 if "text" not in meta:
-                    logger.error(f"❌ Missing 'text' in metadata for document {doc_id}: {meta}")
-                
-                payload = {"text": meta.get("text", ""), **meta}
-                
-                points.append({
-                    "id": doc_id,
-                    "vector": vec,
-                    "payload": payload
-                })
-
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points
-            )
+                    log.error(f"❌ Missing 'text' in metadata for document {doc_id}: {meta}")
+                payloads.append({"text": meta.get("text", ""), **meta})
 
-            logger.info("✅ Successfully inserted vectors into Qdrant.")
+            if not self.sharded:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=[PointStruct(id=doc_id, vector=vec, payload=payload) for doc_id, vec, payload in zip(ids, vectors, payloads)]
+                )
+            else:
+                for shard, points in group_by_shard(ids, vectors, payloads).items():
+                    self._ensure_collection(shard_collection(shard))
+                    self.client.upsert(
+                        collection_name=shard_collection(shard),
+                        points=[PointStruct(id=doc_id, vector=vec, payload=payload) for doc_id, vec, payload in points]
+                    )
+                    self._register_shard(shard, [vec for _, vec, _ in points])
+                    log.info(f"Inserted {len(points)} vectors into shard '{shard}'.")
+
+            log.info("✅ Successfully inserted vectors into Qdrant.")
 
         except Exception as e:
-            logger.error(f"❌ Error inserting vectors into Qdrant: {e}")
+            log.error(f"❌ Error inserting vectors into Qdrant: {e}")
+
+    def _register_shard(self, shard: str, vectors: List[List[float]]):
+        existing = self.client.retrieve(registry_collection(), ids=[registry_id(shard)], with_payload=True, with_vectors=True)
+        centroid, payload = registry_entry(
+            shard, vectors,
+            existing[0].payload if existing else None,
+            existing[0].vector if existing else None,
+        )
+        # Re-ingested chunks overwrite their points, so count rather than add
+        payload["points"] = self.client.count(shard_collection(shard), exact=True).count
+        self.client.upsert(registry_collection(), points=[PointStruct(id=registry_id(shard), vector=centroid, payload=payload)])
+
+    def list_shards(self) -> List[Dict[str, Any]]:
+        """
+        Returns the registry entries of all shards: shard, collection, sharding, points, archived, updated.
+        """
+        records, _ = self.client.scroll(registry_collection(), limit=10000, with_payload=True)
+        return sorted((record.payload for record in records), key=lambda entry: entry["shard"])
+
+    def set_archived(self, shard: str, archived: bool = True):
+        """
+        Archives a shard: moves its vectors, HNSW index and payloads to disk and excludes it from searches
+        that do not name it. With `archived=False`, loads it back into memory and searches it again.
+
+        Args:
+            shard (str): The shard name, e.g. "case_3" or "2024_01".
+            archived (bool): Archive or restore.
+        """
+        collection = shard_collection(shard)
+        self.client.update_collection(
+            collection_name=collection,
+            vectors_config={"": VectorParamsDiff(on_disk=archived)},
+            hnsw_config=HnswConfigDiff(on_disk=archived),
+            collection_params=CollectionParamsDiff(on_disk_payload=archived),
+        )
+        self.client.set_payload(registry_collection(), payload={"archived": archived}, points=[registry_id(shard)])
+        log.info(f"Shard '{shard}' {'archived to disk' if archived else 'restored to memory'}.")
 
     def similarity_search(self, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
         """
@@ -72,32 +183,222 @@ class QdrantDB:
         Returns:
             List[Dict[str, Any]]: Retrieved documents sorted by relevance.
         """
+        if self.sharded:
+            collections = [entry["collection"] for entry in self.list_shards() if not entry.get("archived")]
+        else:
+            collections = [self.collection_name]
         try:
-            results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=top_k,
-            )
-            return [
-                {
-                    "id": hit.id,
-                    "score": hit.score,
-                    "text": hit.payload.get("text", ""),
-                    "metadata": hit.payload,
-                }
-                for hit in results
-            ]
+            return _merge_top_k([
+                _hits_to_documents(self.client.query_points(
+                    collection_name=collection,
+                    query=query_embedding,
+                    limit=top_k,
+                    search_params=search_params(),
+                    with_payload=True,
+                ).points)
+                for collection in collections
+            ], top_k)
 
         except Exception as e:
-            logger.error(f"Error performing similarity search in Qdrant: {e}")
+            log.error(f"Error performing similarity search in Qdrant: {e}")
             return []
 
     def delete_all(self):
         """
-        Deletes all stored vectors from Qdrant.
+        Deletes all stored vectors from Qdrant, including every shard and the shard registry.
+        """
+        try:
+            collections = [self.collection_name]
+            if self.sharded:
+                collections = [entry["collection"] for entry in self.list_shards()] + [registry_collection()]
+            for collection in collections:
+                self.client.delete_collection(collection)
+                log.info(f"Successfully deleted collection '{collection}'.")
+        except Exception as e:
+            log.error(f"Error deleting collection: {e}")
+
+
+class AsyncQdrantDB:
+    """
+    Non-blocking vector search against Qdrant for the request path.
+
+    When sharded (see `QdrantDB`), each search is routed to the shards it concerns: the shards the query
+    names (archived ones included), otherwise every active shard, or only the `qdrant_shard_max_fanout`
+    shards whose centroids are closest to the query. Routed shards are searched concurrently and the
+    hits merged by score.
+    """
+
+    def __init__(self, client: Optional[AsyncQdrantClient] = None):
+        """
+        Reads `qdrant_sharding`, `qdrant_shard_max_fanout` (0 searches every active shard) and
+        `qdrant_shard_registry_ttl` (seconds the shard list is cached) from config.
+
+        Args:
+            client (Optional[AsyncQdrantClient]): Shared client; a new one is created if omitted.
+        """
+        self.client = client or AsyncQdrantClient(host=config.qdrant_host, port=config.qdrant_port)
+        self.collection_name = config.qdrant_collection
+        self.sharded = sharding_mode() != "none"
+        self.max_fanout = getattr(config, "qdrant_shard_max_fanout", 0)
+        self.registry_ttl = getattr(config, "qdrant_shard_registry_ttl", 30.0)
+        self._shards: Optional[List[Dict[str, Any]]] = None
+        self._shards_loaded_at = 0.0
+
+    async def initialize_collection(self):
+        """
+        Creates the collection (or, when sharded, the shard registry) in Qdrant if it does not already exist.
+        Call once at startup.
+        """
+        collection_name = registry_collection() if self.sharded else self.collection_name
+        if not await self.client.collection_exists(collection_name):
+            await self.client.create_collection(collection_name=collection_name, vectors_config=vector_params())
+            log.info(f"Qdrant collection '{collection_name}' created.")
+
+    async def add_vectors(self, ids: List[str], vectors: List[List[float]], metadata: List[Dict[str, Any]]):
+        """
+        Inserts vectors, into their shard collections when sharded. Used to seed embedded Qdrant instances;
+        ingestion goes through `QdrantDB.add_vectors`.
+        """
+        payloads = [{"text": meta.get("text", ""), **meta} for meta in metadata]
+        if not self.sharded:
+            await self.client.upsert(self.collection_name, points=[
+                PointStruct(id=doc_id, vector=vec, payload=payload) for doc_id, vec, payload in zip(ids, vectors, payloads)
+            ])
+            return
+
+        for shard, points in group_by_shard(ids, vectors, payloads).items():
+            collection = shard_collection(shard)
+            if not await self.client.collection_exists(collection):
+                await self.client.create_collection(collection_name=collection, vectors_config=vector_params())
+            await self.client.upsert(collection, points=[PointStruct(id=doc_id, vector=vec, payload=payload) for doc_id, vec, payload in points])
+            existing = await self.client.retrieve(registry_collection(), ids=[registry_id(shard)], with_payload=True, with_vectors=True)
+            centroid, payload = registry_entry(
+                shard, [vec for _, vec, _ in points],
+                existing[0].payload if existing else None,
+                existing[0].vector if existing else None,
+            )
+            payload["points"] = (await self.client.count(collection, exact=True)).count
+            await self.client.upsert(registry_collection(), points=[PointStruct(id=registry_id(shard), vector=centroid, payload=payload)])
+        self._shards = None
+
+    async def list_shards(self) -> List[Dict[str, Any]]:
+        """
+        Returns the shard registry entries, cached for `qdrant_shard_registry_ttl` seconds.
+        """
+        if self._shards is None or time.monotonic() - self._shards_loaded_at > self.registry_ttl:
+            records, _ = await self.client.scroll(registry_collection(), limit=10000, with_payload=True)
+            self._shards = [record.payload for record in records]
+            self._shards_loaded_at = time.monotonic()
+        return self._shards
+
+    async def route(self, query: Optional[str], query_embedding: List[float]) -> List[str]:
+        """
+        Chooses the collections to search for a query.
+
+        Args:
+            query (Optional[str]): The investigator's query, checked for named cases or months.
+            query_embedding (List[float]): Its embedding, compared to shard centroids when the fan-out is capped.
+
+        Returns:
+            List[str]: Collection names; empty if nothing has been ingested yet.
+        """
+        if not self.sharded:
+            return [self.collection_name]
+
+        shards = await self.list_shards()
+        named = mentioned_shards(query, shards) if query else []
+        if named:
+            return [shard["collection"] for shard in named]
+
+        active = [shard for shard in shards if not shard.get("archived")]
+        if not self.max_fanout or len(active) <= self.max_fanout:
+            return [shard["collection"] for shard in active]
+
+        response = await self.client.query_points(
+            collection_name=registry_collection(),
+            query=query_embedding,
+            query_filter=_not_archived(),
+            limit=self.max_fanout,
+            with_payload=True,
+        )
+        return [point.payload["collection"] for point in response.points]
+
+    async def similarity_search(self, query_embedding: List[float], top_k: int, query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Searches for similar vectors in Qdrant.
+
+        Args:
+            query_embedding (List[float]): Query embedding vector.
+            top_k (int): Number of top similar documents to return.
+            query (Optional[str]): The investigator's query, used to route sharded searches.
+
+        Returns:
+            List[Dict[str, Any]]: Retrieved documents sorted by relevance.
+        """
+        try:
+            collections = await self.route(query, query_embedding)
+            responses = await asyncio.gather(*[
+                self.client.query_points(
+                    collection_name=collection,
+                    query=query_embedding,
+                    limit=top_k,
+                    search_params=search_params(),
+                    with_payload=True,
+                )
+                for collection in collections
+            ])
+            return _merge_top_k([_hits_to_documents(response.points) for response in responses], top_k)
+
+        except Exception as e:
+            log.error(f"Error performing similarity search in Qdrant: {e}")
+            return []
+
+    async def search_batch(self, query_embeddings: List[List[float]], top_k: int,
+                           queries: Optional[List[Optional[str]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Runs several similarity searches with one Qdrant batch request per collection searched.
+
+        Args:
+            query_embeddings (List[List[float]]): Query embedding vectors.
+            top_k (int): Number of top similar documents to return per query.
+            queries (Optional[List[Optional[str]]]): The investigators' queries, aligned with
+                `query_embeddings`, used to route sharded searches.
+
+        Returns:
+            List[List[Dict[str, Any]]]: Retrieved documents per query, aligned with `query_embeddings`.
         """
+        if not query_embeddings:
+            return []
+
         try:
-            self.client.delete_collection(self.collection_name)
-            logger.info(f"Successfully deleted collection '{self.collection_name}'.")
+            queries = queries or [None] * len(query_embeddings)
+            routes = await asyncio.gather(*[
+                self.route(query, embedding) for query, embedding in zip(queries, query_embeddings)
+            ])
+            # collection -> indices of the queries searching it
+            by_collection: Dict[str, List[int]] = {}
+            for idx, collections in enumerate(routes):
+                for collection in collections:
+                    by_collection.setdefault(collection, []).append(idx)
+
+            collection_names = list(by_collection)
+            responses = await asyncio.gather(*[
+                self.client.query_batch_points(
+                    collection_name=collection,
+                    requests=[
+                        QueryRequest(query=query_embeddings[idx], limit=top_k, params=search_params(), with_payload=True)
+                        for idx in by_collection[collection]
+                    ],
+                )
+                for collection in collection_names
+            ])
+
+            per_query: List[List[List[Dict[str, Any]]]] = [[] for _ in query_embeddings]
+            for collection, collection_responses in zip(collection_names, responses):
+                for idx, response in zip(by_collection[collection], collection_responses):
+                    per_query[idx].append(_hits_to_documents(response.points))
+            return [_merge_top_k(results, top_k) if results else [] for results in per_query]
+
         except Exception as e:
-            logger.error(f"Error deleting collection: {e}")
+            log.error(f"Error performing batch similarity search in Qdrant: {e}")
+            return [[] for _ in query_embeddings]
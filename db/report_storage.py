@@ -0,0 +1,269 @@
+import base64
+import gzip
+import hashlib
+import importlib.util
+import json
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import quote
+import orjson
+from configs import config
+from logs.logging import log
+
+INDEX_PREFIX = "report-index"
+
+_REPORT_KEY = re.compile(r"^reports/\d{4}/\d{2}/\d{2}/.+?_(?P<timestamp>\d{8}_\d{6})_")
+_DAY = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})$")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _invert_digits(digits: str) -> str:
+    # 9 minus each digit: the result sorts in reverse, and a prefix inverts independently of the rest
+    return "".join(str(9 - int(digit)) for digit in digits)
+
+
+class ReportStorage(ABC):
+    """
+    Stores investigation reports as compact, compressed JSON, with an index for newest-first listing.
+
+    Every report also gets empty index entries under `report-index/all/` and `report-index/user/<user_id>/`.
+    Each index key holds the report's creation time, inverted so that an ascending listing
+    returns the newest report first, and it is partitioned by day:
+
+        report-index/all/<inverted YYYYMMDD>/<inverted HHMMSS>-<entry>
+
+    `<entry>` encodes the report key, user and size, so one listing call returns a full page.
+    """
+
+    def __init__(self):
+        """
+        Reads the compression setting from config ("gzip", "zstd" or "none").
+        """
+        self.compression = getattr(config, "report_compression", "gzip") or "none"
+        self.compression_level = getattr(config, "report_compression_level", 6)
+        if self.compression == "zstd":
+            if importlib.util.find_spec("zstandard") is None:
+                log.warning("zstandard is not installed, compressing reports with gzip instead.")
+                self.compression = "gzip"
+
+    @staticmethod
+    def build_report_key(report_data: Dict[str, Any]) -> str:
+        """
+        Derives the key of a report before it is uploaded, so callers can return it immediately.
+
+        Args:
+            report_data (Dict[str, Any]): The report, with `user_id` and the investigator's query.
+
+        Returns:
+            str: The object key, unique per user, second, query and report content.
+        """
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        folder_date = now.strftime("%Y/%m/%d")
+
+        user_id = report_data.get("user_id", "unknown_user")
+        query = report_data.get("investigator_query", report_data.get("query", "unknown"))
+        query_slug = "".join(c if c.isalnum() else "_" for c in query[:30])
+        digest = hashlib.sha1(json.dumps(report_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:8]
+
+        return f"reports/{folder_date}/{user_id}_{timestamp}_{query_slug}_{digest}.json"
+
+    @staticmethod
+    def build_index_keys(file_path: str, user_id: str, size: int, created: Optional[datetime] = None) -> List[str]:
+        """
+        Derives the index keys of a report: one in the global index and one in the user's index.
+        They depend only on the arguments, so a retried upload rewrites the same entries.
+
+        Args:
+            file_path (str): The report key.
+            user_id (str): The report's user.
+            size (int): The stored report size in bytes.
+            created (Optional[datetime]): Creation time; read from the report key if omitted.
+
+        Returns:
+            List[str]: The two index keys.
+        """
+        if created is None:
+            match = _REPORT_KEY.match(file_path)
+            created = datetime.strptime(match.group("timestamp"), "%Y%m%d_%H%M%S") if match else datetime.now()
+
+        inverted = _invert_digits(created.strftime("%Y%m%d%H%M%S"))
+        entry = json.dumps({"k": file_path, "u": user_id, "s": size}, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(entry.encode("utf-8")).decode("ascii").rstrip("=")
+        name = f"{inverted[:8]}/{inverted[8:]}-{token}"
+        return [
+            f"{INDEX_PREFIX}/all/{name}",
+            f"{INDEX_PREFIX}/user/{quote(user_id, safe='')}/{name}",
+        ]
+
+    @staticmethod
+    def parse_index_key(index_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Decodes an index key from `build_index_keys`; returns None for anything else under the prefix.
+        """
+        try:
+            inverted_day, name = index_key.split("/")[-2:]
+            inverted_time, token = name.split("-", 1)
+            created = datetime.strptime(_invert_digits(inverted_day + inverted_time), "%Y%m%d%H%M%S")
+            entry = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            return {"file_path": entry["k"], "user_id": entry["u"], "created": created.isoformat(), "size": entry["s"]}
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def index_prefix(user_id: Optional[str] = None, day: Optional[str] = None) -> str:
+        """
+        Returns the index prefix to list, for all reports or one user's, optionally for one day.
+
+        Args:
+            user_id (Optional[str]): Only this user's reports.
+            day (Optional[str]): Only reports from this day, "YYYY-MM-DD" or "YYYYMMDD".
+
+        Raises:
+            ValueError: If `day` is malformed.
+        """
+        prefix = f"{INDEX_PREFIX}/user/{quote(user_id, safe='')}/" if user_id else f"{INDEX_PREFIX}/all/"
+        if day:
+            match = _DAY.match(day)
+            if not match:
+                raise ValueError(f"Invalid day: {day}")
+            prefix += _invert_digits("".join(match.groups())) + "/"
+        return prefix
+
+    def encode_report(self, report_data: Dict[str, Any]) -> Tuple[bytes, Optional[str]]:
+        """
+        Serializes a report as compact JSON and compresses it.
+
+        Args:
+            report_data (Dict[str, Any]): The report.
+
+        Returns:
+            Tuple[bytes, Optional[str]]: The body and its Content-Encoding (None if uncompressed).
+        """
+        body = orjson.dumps(report_data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        if self.compression == "gzip":
+            # mtime=0 keeps the body, and so the upload, deterministic
+            return gzip.compress(body, compresslevel=self.compression_level, mtime=0), "gzip"
+        if self.compression == "zstd":
+            import zstandard
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(body), "zstd"
+        return body, None
+
+    @staticmethod
+    def decode_report(body: bytes, content_encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Decompresses and parses a stored report. Without a Content-Encoding, the format is detected
+        from the body, so older uncompressed reports still read.
+
+        Args:
+            body (bytes): The stored body.
+            content_encoding (Optional[str]): "gzip", "zstd" or None.
+
+        Returns:
+            Dict[str, Any]: The report.
+        """
+        content_encoding = content_encoding or ReportStorage.detect_encoding(body)
+        if content_encoding == "gzip":
+            body = gzip.decompress(body)
+        elif content_encoding == "zstd":
+            import zstandard
+            body = zstandard.ZstdDecompressor().decompress(body)
+        return orjson.loads(body)
+
+    @staticmethod
+    def detect_encoding(body: bytes) -> Optional[str]:
+        if body[:2] == _GZIP_MAGIC:
+            return "gzip"
+        if body[:4] == _ZSTD_MAGIC:
+            return "zstd"
+        return None
+
+    @abstractmethod
+    def upload_report(self, report_data: Dict[str, Any], file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stores a report and its index entries.
+
+        Args:
+            report_data (Dict[str, Any]): The report to store.
+            file_path (Optional[str]): Key from `build_report_key`; derived from the report if omitted.
+
+        Returns:
+            Dict[str, Any]: {"success", "user_id", "file_path", "url", "timestamp", "size"} or {"success": False, "error"}.
+        """
+
+    @abstractmethod
+    def get_recent_reports(self, limit: int = 10, user_id: Optional[str] = None, day: Optional[str] = None,
+                           cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lists reports newest first from the report index.
+
+        Args:
+            limit (int): Page size (at most 1000).
+            user_id (Optional[str]): Only this user's reports.
+            day (Optional[str]): Only reports from this day, "YYYY-MM-DD" or "YYYYMMDD".
+            cursor (Optional[str]): `next_cursor` from the previous page.
+
+        Returns:
+            Dict[str, Any]: {"success", "reports": [{file_path, user_id, created, size, url}], "next_cursor"}.
+
+        Raises:
+            ValueError: If `day` is malformed or `cursor` is from another listing.
+        """
+
+    @abstractmethod
+    def read_raw(self, file_path: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Returns a stored report body and its Content-Encoding, or None if it does not exist.
+
+        Args:
+            file_path (str): The report key.
+        """
+
+    def read_report(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Reads and decodes a stored report, or returns None if it does not exist.
+
+        Args:
+            file_path (str): The report key.
+        """
+        stored = self.read_raw(file_path)
+        return self.decode_report(*stored) if stored is not None else None
+
+    @abstractmethod
+    def rebuild_index(self) -> Dict[str, Any]:
+        """
+        Writes index entries for every stored report, e.g. for reports stored before the index existed.
+
+        Returns:
+            Dict[str, Any]: {"success", "indexed"}.
+        """
+
+    @abstractmethod
+    def check(self):
+        """
+        Verifies the storage is reachable, e.g. at startup. Raises on failure.
+        """
+
+
+def create_report_storage(s3_client: Optional[Any] = None) -> ReportStorage:
+    """
+    Builds the report storage backend selected by `report_storage` ("s3" or "local").
+
+    Args:
+        s3_client (Optional[Any]): Shared boto3 S3 client for the S3 backend.
+
+    Returns:
+        ReportStorage: The storage backend.
+    """
+    backend = getattr(config, "report_storage", "s3")
+    if backend == "local":
+        from db.local_storage import LocalReportStorage
+        return LocalReportStorage()
+    if backend == "s3":
+        from db.s3_db import S3Handler
+        return S3Handler(s3_client=s3_client)
+    raise ValueError(f"Unknown report_storage backend: {backend}")
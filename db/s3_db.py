@@ -1,91 +1,197 @@
 import boto3
-import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from configs import config
-from botocore.exceptions import BotoCoreError, NoCredentialsError
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+from db.report_storage import ReportStorage
+from logs.logging import log
 
-class S3Handler:
-    def __init__(self):
 
-        self.s3_client = boto3.client(
+class S3Handler(ReportStorage):
+    """
+    Stores investigation reports and their index entries in S3, with presigned download URLs.
+    """
+
+    def __init__(self, s3_client: Optional[Any] = None):
+        """
+        Args:
+            s3_client (Optional[Any]): Shared boto3 S3 client; a new one is created if omitted.
+        """
+        super().__init__()
+        self.s3_client = s3_client or boto3.client(
             's3',
             aws_access_key_id=config.aws_access_key_id,
             aws_secret_access_key=config.aws_secret_access_key,
-            region_name=config.region
+            region_name=config.region,
+            endpoint_url=getattr(config, "s3_endpoint_url", None)
         )
         self.bucket_name = config.bucket.replace("s3://", "")
+        self.presign_expiry = getattr(config, "s3_presign_expiry", 3600)
+        self.presign_refresh_margin = getattr(config, "s3_presign_refresh_margin", 300)
+        self.presign_cache_size = getattr(config, "s3_presign_cache_size", 10000)
+        self._presigned: "OrderedDict[Tuple[str, int], tuple]" = OrderedDict()
+        self._presign_lock = threading.Lock()
 
-    def upload_report(self, report_data: Dict[str, Any]) -> Dict[str, Any]:
+    def upload_report(self, report_data: Dict[str, Any], file_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Lưu báo cáo lên S3, sử dụng `user_id` thay vì `report_id`.
+        The body is compact JSON, compressed per `report_compression` and tagged with its Content-Encoding,
+        so presigned downloads are decompressed transparently by HTTP clients.
+
+        Args:
+            report_data (Dict[str, Any]): The report to store.
+            file_path (Optional[str]): Key from `build_report_key`; derived from the report if omitted.
         """
         try:
+            file_path = file_path or self.build_report_key(report_data)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            folder_date = datetime.now().strftime("%Y/%m/%d") 
 
             user_id = report_data.get("user_id", "unknown_user")
 
-            query_slug = "".join(c if c.isalnum() else "_" for c in report_data.get("query", "unknown")[:30])
-
-            file_path = f"reports/{folder_date}/{user_id}_{timestamp}_{query_slug}.json"
-
-            report_json = json.dumps(report_data, indent=2)
+            body, content_encoding = self.encode_report(report_data)
+            put_args = {"ContentEncoding": content_encoding} if content_encoding else {}
             self.s3_client.put_object(
                 Bucket=self.bucket_name,
                 Key=file_path,
-                Body=report_json.encode('utf-8'),
-                ContentType='application/json'
+                Body=body,
+                ContentType='application/json',
+                **put_args
             )
+            # Written after the report, so an index entry never points at a missing object
+            for index_key in self.build_index_keys(file_path, user_id, len(body)):
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=index_key, Body=b"")
 
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': file_path},
-                ExpiresIn=86400
-            )
+            url = self.presigned_url(file_path, expires_in=86400)
 
             return {
                 "success": True,
                 "user_id": user_id,
                 "file_path": file_path,
                 "url": url,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "size": len(body)
             }
 
-        except (BotoCoreError, NoCredentialsError) as e:
-            print(f"AWS S3 Error: {e}")
+        except (BotoCoreError, ClientError, NoCredentialsError) as e:
+            log.error(f"AWS S3 Error: {e}")
             return {"success": False, "error": str(e)}
 
-    def get_recent_reports(self, limit: int = 10) -> Dict[str, Any]:
+    def presigned_url(self, file_path: str, expires_in: Optional[int] = None) -> str:
+        """
+        Returns a presigned GET URL, reusing a cached one until shortly before it expires.
+
+        Args:
+            file_path (str): The object key.
+            expires_in (Optional[int]): Lifetime in seconds; `s3_presign_expiry` if omitted.
+
+        Returns:
+            str: The presigned URL.
+        """
+        expires_in = expires_in or self.presign_expiry
+        cache_key = (file_path, expires_in)
+        now = time.monotonic()
+        with self._presign_lock:
+            cached = self._presigned.get(cache_key)
+            if cached is not None and cached[1] - self.presign_refresh_margin > now:
+                self._presigned.move_to_end(cache_key)
+                return cached[0]
+
+        url = self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': file_path},
+            ExpiresIn=expires_in
+        )
+        with self._presign_lock:
+            self._presigned[cache_key] = (url, now + expires_in)
+            self._presigned.move_to_end(cache_key)
+            while len(self._presigned) > self.presign_cache_size:
+                self._presigned.popitem(last=False)
+        return url
+
+    def get_recent_reports(self, limit: int = 10, user_id: Optional[str] = None, day: Optional[str] = None,
+                           cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lists reports newest first from the report index, one S3 listing call per page.
+        See `ReportStorage.get_recent_reports`.
+        """
+        prefix = self.index_prefix(user_id, day)
+        if cursor and not cursor.startswith(prefix):
+            raise ValueError("Cursor does not belong to this listing.")
 
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix="reports/",
-                MaxKeys=limit
-            )
+            params = {"Bucket": self.bucket_name, "Prefix": prefix, "MaxKeys": max(1, min(limit, 1000))}
+            if cursor:
+                params["StartAfter"] = cursor
+            response = self.s3_client.list_objects_v2(**params)
 
             reports = []
-            if "Contents" in response:
-                for item in sorted(response["Contents"], key=lambda x: x["LastModified"], reverse=True)[:limit]:
-                    url = self.s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={'Bucket': self.bucket_name, 'Key': item["Key"]},
-                        ExpiresIn=3600
-                    )
-
-                    reports.append({
-                        "file_path": item["Key"],
-                        "last_modified": item["LastModified"].isoformat(),
-                        "size": item["Size"],
-                        "url": url
-                    })
-
+            for item in response.get("Contents", []):
+                entry = self.parse_index_key(item["Key"])
+                if entry is None:
+                    continue
+                entry["url"] = self.presigned_url(entry["file_path"])
+                reports.append(entry)
+
+            contents = response.get("Contents", [])
+            next_cursor = contents[-1]["Key"] if response.get("IsTruncated") and contents else None
             return {
                 "success": True,
-                "reports": reports
+                "reports": reports,
+                "next_cursor": next_cursor
             }
 
-        except (BotoCoreError, NoCredentialsError) as e:
-            print(f"AWS S3 Error: {e}")
+        except (BotoCoreError, ClientError, NoCredentialsError) as e:
+            log.error(f"AWS S3 Error: {e}")
             return {"success": False, "error": str(e), "reports": []}
+
+    def rebuild_index(self) -> Dict[str, Any]:
+        """
+        Writes index entries for every report under `reports/`, e.g. for reports uploaded before the index existed.
+        Existing entries are rewritten with the same keys.
+
+        Returns:
+            Dict[str, Any]: {"success", "indexed"}.
+        """
+        try:
+            indexed = 0
+            paginator = self.s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix="reports/"):
+                for item in page.get("Contents", []):
+                    report = self.read_report(item["Key"])
+                    if report is None:
+                        log.warning(f"Report {item['Key']} was deleted while the index was rebuilt, skipping it.")
+                        continue
+                    for index_key in self.build_index_keys(item["Key"], report.get("user_id", "unknown_user"), item["Size"]):
+                        self.s3_client.put_object(Bucket=self.bucket_name, Key=index_key, Body=b"")
+                    indexed += 1
+            return {"success": True, "indexed": indexed}
+
+        except (BotoCoreError, ClientError, NoCredentialsError) as e:
+            log.error(f"AWS S3 Error: {e}")
+            return {"success": False, "error": str(e), "indexed": 0}
+
+    def read_raw(self, file_path: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Downloads a stored report body and its Content-Encoding, or returns None if it does not exist.
+
+        Args:
+            file_path (str): The report key.
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        body = response["Body"].read()
+        # Reports uploaded before compression have no Content-Encoding
+        return body, response.get("ContentEncoding") or self.detect_encoding(body)
+
+    def check(self):
+        """
+        Checks that the bucket is reachable, and opens a pooled connection to it.
+        """
+        self.s3_client.head_bucket(Bucket=self.bucket_name)
@@ -0,0 +1,145 @@
+import math
+import os
+import re
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from configs import config
+
+_MONTHS = {
+    name: number for number, names in enumerate([
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+        ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"),
+        ("dec", "december"),
+    ], start=1) for name in names
+}
+_YEAR = re.compile(r"\b(19\d\d|20\d\d)\b")
+_YEAR_MONTH = re.compile(r"\b(19\d\d|20\d\d)[-/_](\d{1,2})\b")
+_WORD = re.compile(r"[a-z]+")
+
+
+def sharding_mode() -> str:
+    """
+    Returns `qdrant_sharding`: "none" (one collection), "case" (one collection per case file)
+    or "month" (one collection per month of the documents' modification time).
+    """
+    return getattr(config, "qdrant_sharding", "none") or "none"
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def shard_for(metadata: Dict[str, Any]) -> str:
+    """
+    Returns the shard a chunk belongs to, from its ingestion metadata.
+
+    Args:
+        metadata (Dict[str, Any]): Chunk metadata with `file_name` and, for month sharding, `modified` (ISO time).
+
+    Returns:
+        str: The shard name, e.g. "case_3" or "2025_03".
+    """
+    if sharding_mode() == "month":
+        modified = metadata.get("modified")
+        return (datetime.fromisoformat(modified) if modified else datetime.now()).strftime("%Y_%m")
+    file_name = metadata.get("file_name") or metadata.get("source") or "unknown"
+    return slug(os.path.splitext(os.path.basename(file_name))[0]) or "unknown"
+
+
+def shard_collection(shard: str) -> str:
+    return f"{config.qdrant_collection}__{shard}"
+
+
+def registry_collection() -> str:
+    """
+    The collection listing the shards: one point per shard whose vector is the shard's centroid
+    and whose payload holds its name, collection, size and archive state.
+    """
+    return f"{config.qdrant_collection}__shards"
+
+
+def registry_id(shard: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{config.qdrant_collection}/{shard}"))
+
+
+def group_by_shard(ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> Dict[str, List[Tuple[str, List[float], Dict[str, Any]]]]:
+    """
+    Splits points to insert by shard.
+
+    Returns:
+        Dict[str, List[Tuple[str, List[float], Dict[str, Any]]]]: shard -> (id, vector, payload) triples.
+    """
+    groups: Dict[str, list] = {}
+    for point_id, vector, payload in zip(ids, vectors, payloads):
+        shard = shard_for(payload)
+        groups.setdefault(shard, []).append((point_id, vector, {**payload, "shard": shard}))
+    return groups
+
+
+def registry_entry(shard: str, vectors: List[List[float]], existing: Optional[Dict[str, Any]] = None,
+                   existing_vector: Optional[List[float]] = None) -> Tuple[List[float], Dict[str, Any]]:
+    """
+    Builds a shard's registry point after inserting `vectors`, folding them into its centroid.
+    The stored centroid is normalized by Qdrant, so it is weighted by the previous point count.
+
+    Args:
+        shard (str): The shard name.
+        vectors (List[List[float]]): The vectors just inserted.
+        existing (Optional[Dict[str, Any]]): The shard's current registry payload, if any.
+        existing_vector (Optional[List[float]]): Its current centroid.
+
+    Returns:
+        Tuple[List[float], Dict[str, Any]]: The centroid and payload to upsert.
+    """
+    previous = existing.get("points", 0) if existing else 0
+    centroid = [value * previous for value in existing_vector] if existing_vector and previous else [0.0] * len(vectors[0])
+    for vector in vectors:
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        for idx, value in enumerate(vector):
+            centroid[idx] += value / norm
+    payload = {
+        "shard": shard,
+        "collection": shard_collection(shard),
+        "sharding": sharding_mode(),
+        "points": previous + len(vectors),
+        "archived": bool(existing and existing.get("archived")),
+        "updated": datetime.now().isoformat(timespec="seconds"),
+    }
+    return centroid, payload
+
+
+def mentioned_shards(query: str, shards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Returns the shards a query names explicitly: a case ("case 3" matches shard "case_3"),
+    or for month shards a year ("2024") or month ("March 2024", "2024-03").
+
+    Args:
+        query (str): The investigator's query.
+        shards (List[Dict[str, Any]]): Registry payloads.
+
+    Returns:
+        List[Dict[str, Any]]: The matching shards, archived ones included.
+    """
+    normalized = f"_{slug(query)}_"
+    lowered = query.lower()
+    months = set()
+    for year, month in _YEAR_MONTH.findall(lowered):
+        months.add(f"{year}_{int(month):02d}")
+    rest = _YEAR_MONTH.sub(" ", lowered)
+    words = _WORD.findall(rest)
+    for year in _YEAR.findall(rest):
+        named = [_MONTHS[word] for word in words if word in _MONTHS and word != "may"]
+        months.update(f"{year}_{month:02d}" for month in named)
+        if not named:
+            months.update(f"{year}_{month:02d}" for month in range(1, 13))
+
+    matched = []
+    for shard in shards:
+        name = shard["shard"]
+        if shard.get("sharding") == "month":
+            if name in months:
+                matched.append(shard)
+        elif f"_{name}_" in normalized:
+            matched.append(shard)
+    return matched
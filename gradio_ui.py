@@ -13,36 +13,22 @@ import os
 # API Endpoint
 API_URL = os.getenv("API_URL", "http://localhost:8000/crypto_investigate")
 
-def investigate(query):
-    """Send query to API and process the response."""
-    if not query.strip():
-        return "Please enter a valid query.", None, None, None, None
-    
-    payload = {
-        "query": query,
-        "user_id": "detective_001",  # Default user ID
-        "source": "cybercrime_unit"  # Default source
-    }
-    response = requests.post(API_URL, json=payload)
-    
-    if response.status_code != 200:
-        return f"API Error: {response.status_code}", None, None, None, None
-    
-    result = response.json()
-
-    # Handle invalid queries
-    if result['report'].get('is_relevant') is False:
-        return (
-            f"Query rejected: {result['report'].get('rejection_reason', 'Not related to the investigation')}",
-            None, None, None, None
-        )
-    
-    # Extract report content
-    report_text = result['report']['generated_report']
-    
-    # Process retrieved evidence
-    evidence_list = result['retrieval']['documents']
-    evidence_display = "\n\n".join([
+STREAM_URL = os.getenv("STREAM_URL", f"{API_URL}/stream")
+API_BASE_URL = API_URL.rsplit("/crypto_investigate", 1)[0]
+
+def _iter_sse(response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
+def _format_evidence(evidence_list):
+    return "\n\n".join([
         f"- **Evidence {idx+1}** ({doc['confidence_label']} Confidence)\n"
         f"- **Source:** {doc['metadata'].get('file_name', 'Unknown')}\n"
         f"- **Text:** {doc['text'][:500]}...\n"
@@ -51,18 +37,60 @@ def investigate(query):
         f"- **Final Score:** {doc['final_score']}"
         for idx, doc in enumerate(evidence_list)
     ])
+
+def investigate(query, user_id="detective_001"):
+    """Stream the investigation from the API, rendering the report as it is generated."""
+    if not query.strip():
+        yield "Please enter a valid query.", None, None, None, None
+        return
     
-    # Expanded queries used for retrieval
-    expanded_queries = result['retrieval'].get("expanded_queries", [])
-    expanded_queries_text = "\n".join([f"🔹 {query}" for query in expanded_queries]) if expanded_queries else "No expanded queries used."
-    
-    # Retrieval strategy
-    retrieval_strategy = result['retrieval'].get("strategy", "Unknown")
-    
-    # S3 report download link (if available)
-    s3_link = result.get('storage', {}).get('url', "No report available.")
-    
-    return report_text, evidence_display, expanded_queries_text, retrieval_strategy, s3_link
+    payload = {
+        "query": query,
+        "user_id": user_id or "detective_001",  # Default user ID
+        "source": "cybercrime_unit"  # Default source
+    }
+
+    report_text, evidence_display, expanded_queries_text, retrieval_strategy, s3_link = (
+        "Validating query...", None, None, None, None
+    )
+    yield report_text, evidence_display, expanded_queries_text, retrieval_strategy, s3_link
+
+    with requests.post(STREAM_URL, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            yield f"API Error: {response.status_code}", None, None, None, None
+            return
+
+        for event, data in _iter_sse(response):
+            if event == "validated":
+                if not data["is_valid"]:
+                    yield f"Query rejected: {data.get('reason', 'Not related to the investigation')}", None, None, None, None
+                    return
+                report_text = "Retrieving evidence..."
+
+            elif event == "retrieved":
+                if not data["document_count"]:
+                    yield "No relevant documents found.", None, None, None, None
+                    return
+                expanded_queries = data.get("expanded_queries") or []
+                expanded_queries_text = "\n".join([f"🔹 {q}" for q in expanded_queries]) if expanded_queries else "No expanded queries used."
+                retrieval_strategy = data.get("strategy", "Unknown")
+                report_text = f"Ranking {data['document_count']} documents..."
+
+            elif event == "reranked":
+                evidence_display = _format_evidence(data["documents"])
+                report_text = ""
+
+            elif event == "token":
+                report_text += data["text"]
+
+            elif event == "stored":
+                # Uploads run in the background; link to the status endpoint until the URL is known
+                s3_link = data.get("url") or f"{API_BASE_URL}{data['status_url']}"
+
+            elif event == "error":
+                report_text = data.get("detail", "Investigation failed.")
+
+            yield report_text, evidence_display, expanded_queries_text, retrieval_strategy, s3_link
 
 # Create UI with Gradio
 with gr.Blocks() as app:
@@ -94,7 +122,7 @@ with gr.Blocks() as app:
 
     submit_btn.click(
         investigate,
-        inputs=[query_input],
+        inputs=[query_input, user_id_input],
         outputs=[report_output, evidence_output, expanded_queries_output, retrieval_strategy_output, report_link]
     )
 
@@ -1,42 +1,200 @@
-from typing import TypeVar
+import atexit
+import logging
+import queue
+import random
+import sys
+import threading
+import traceback
+from logging.handlers import QueueListener, RotatingFileHandler
+from contextvars import ContextVar
+from typing import TypeVar, Optional, Dict, Any
 import loguru
+import orjson
 from configs import config
 
-log_level = "DEBUG"
 log_format = (
     "<green>{time:YYYY-MM-DD HH:mm:ss.SSS zz}</green> | "
     "<level>{level: <8}</level> | "
+    "<cyan>{extra[request_id]}</cyan> | "
     "<yellow>Line {line: >4} ({file}):</yellow> <b>{message}</b>"
 )
 
 _T_loguru_logger = TypeVar("_T_loguru_logger", bound=loguru._logger.Logger)
 
+# Bound by `log.contextualize`, e.g. per request; listed here so formats can always refer to them
+_CONTEXT_DEFAULTS = {"request_id": "-"}
+_sampling_enabled = True
+
+# The pipeline stage running in the current task, set by `stage_timer`; added to every record as `stage`
+log_stage: ContextVar[Optional[str]] = ContextVar("log_stage", default=None)
+
+
+def _add_stage(record: Dict[str, Any]):
+    stage = log_stage.get()
+    if stage is not None:
+        record["extra"]["stage"] = stage
+
+
+def _json_format(record: Dict[str, Any]) -> str:
+    """
+    Renders a record as one JSON line: time, level, message, source, and every bound field
+    (request_id, stage, ...) at the top level.
+    """
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "module": record["name"],
+        "line": record["line"],
+    }
+    entry.update({key: value for key, value in record["extra"].items() if key not in ("sample", "_json")})
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = orjson.dumps(entry, default=str).decode("utf-8")
+    return "{extra[_json]}\n"
+
+
+def _sample_filter(record: Dict[str, Any]) -> bool:
+    """
+    Keeps a high-volume message, logged as `log.bind(sample=0.01).info(...)`, with the given probability,
+    unless `log_sampling` is off. Warnings and errors are always kept.
+    """
+    rate = record["extra"].get("sample")
+    if rate is None or record["level"].no >= logging.WARNING or not _sampling_enabled:
+        return True
+    return random.random() < rate
+
+
+class InterceptHandler(logging.Handler):
+    """
+    Forwards records from libraries that use the stdlib `logging` module (uvicorn, httpx, qdrant) to loguru.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = loguru.logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Report the caller of the stdlib logger, not this handler
+        frame, depth = sys._getframe(), 0
+        while frame is not None and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        loguru.logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+class _QueueSink:
+    """
+    Loguru sink that only puts the formatted line on an in-process queue; a background thread
+    writes it to the file and console handlers. Loguru's own `enqueue=True` pickles every record
+    through a pipe, which costs several times more than formatting it.
+    When the writer falls behind (e.g. a stalled disk), lines are dropped instead of blocking requests.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def __call__(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LineListener(QueueListener):
+    """
+    Writes already formatted lines, reporting lines dropped since the last write.
+    """
+
+    def __init__(self, sink: _QueueSink, *handlers: logging.Handler):
+        super().__init__(sink.queue, *handlers)
+        self.sink = sink
+
+    def prepare(self, line: str) -> logging.LogRecord:
+        if self.sink.dropped:
+            line = f"[logging] dropped {self.sink.dropped} lines while the writer was behind\n{line}"
+            self.sink.dropped = 0
+        return logging.makeLogRecord({"msg": line})
+
+    def enqueue_sentinel(self):
+        # Blocking, so `stop` still flushes when the queue is full
+        self.queue.put(self._sentinel)
+
+
 def setup_logger(
     use_log_file: bool = True,
-    file: str = config.logging_file,
-    rotation: str = "50 MB",
-    retention: str = "30 days",
+    file: Optional[str] = None,
+    rotation_bytes: int = 50 * 1024 * 1024,
+    backup_count: int = 10,
 ) -> _T_loguru_logger:
+    """
+    Configures loguru once for the process.
+
+    Logging is queue-backed: a log call only formats the record and puts the line on a queue,
+    and a background thread does the file and console I/O. Remaining lines are flushed at exit.
+
+    Reads from config: `log_level` (default INFO), `log_format` ("text" or "json"),
+    `log_console`, `log_diagnose`, `log_stdlib_level`, `log_sampling` and `log_queue_size`.
+    """
+    global _sampling_enabled
+    _sampling_enabled = getattr(config, "log_sampling", True)
+    log_level = getattr(config, "log_level", "INFO")
+    structured = getattr(config, "log_format", "text") == "json"
+    # diagnose renders local variables into tracebacks: slow, and may leak request data
+    diagnose = getattr(config, "log_diagnose", False)
+
     loguru.logger.remove()
+    loguru.logger.configure(extra=_CONTEXT_DEFAULTS, patcher=_add_stage)
+    handlers = []
     if use_log_file:
-        loguru.logger.add(
-            file,
-            level=log_level,
-            format=log_format,
-            colorize=False,
-            rotation=rotation,
-            retention=retention,
-            backtrace=True,
-            diagnose=True,
-        )
+        # delay: open the file on the first message, not at import
+        handlers.append(RotatingFileHandler(file or config.logging_file, maxBytes=rotation_bytes, backupCount=backup_count, encoding="utf-8", delay=True))
+    if getattr(config, "log_console", True):
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.terminator = ""  # lines are formatted by loguru, newline included
+
+    sink = _QueueSink(maxsize=getattr(config, "log_queue_size", 10000))
+    listener = _LineListener(sink, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
 
     loguru.logger.add(
-        sink=lambda msg: print(msg, end=""),
+        sink,
         level=log_level,
-        format=log_format,
-        colorize=True
+        format=_json_format if structured else log_format,
+        filter=_sample_filter,
+        colorize=False,
+        backtrace=True,
+        diagnose=diagnose,
     )
 
+    # Library logs go through the same sinks; below WARNING they are mostly per-request noise
+    logging.basicConfig(handlers=[InterceptHandler()], level=getattr(config, "log_stdlib_level", "WARNING"), force=True)
+
     return loguru.logger
 
-log = setup_logger()
+
+class _LazyLogger:
+    """
+    The process logger, configured by `setup_logger` on first use rather than at import, so importing
+    a module that logs neither reads the config nor starts the writer thread.
+    """
+
+    def __init__(self):
+        self._logger: Optional[_T_loguru_logger] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> _T_loguru_logger:
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    self._logger = setup_logger()
+        return self._logger
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+
+log = _LazyLogger()
@@ -1,7 +1,7 @@
-import logging
 from typing import List, Dict, Any, Optional
 from db.qdrant_db import QdrantDB
 from src.embedding import Embedding
+from src.report_cache import bump_ingestion_generation
 from logs.logging import log
 
 
@@ -49,6 +49,9 @@ class VectorDBService:
 
             log.info("Successfully uploaded documents to Qdrant.")
 
+            # Reports cached by the API from the previous corpus are stale now
+            bump_ingestion_generation()
+
             return {
                 "success": True,
                 "chunk_count": len(processed_chunks),
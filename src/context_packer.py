@@ -0,0 +1,78 @@
+from typing import List, Dict, Any, Tuple
+from configs import config
+
+
+class ContextPacker:
+    """
+    Fits ranked evidence into a fixed input-token budget for report generation.
+    """
+
+    def __init__(self):
+        """
+        Initializes the budget settings from config. The tokenizer is loaded on first use, or by `warm_up`.
+        """
+        self._tokenizer = None
+        self.max_context_tokens = getattr(config, "max_context_tokens", 6000)
+        # Evidence that would be cut below this many tokens is dropped instead of truncated
+        self.min_evidence_tokens = getattr(config, "min_evidence_tokens", 64)
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            import tiktoken
+            self._tokenizer = tiktoken.get_encoding(getattr(config, "tokenizer", "cl100k_base"))
+        return self._tokenizer
+
+    def warm_up(self):
+        """
+        Loads the tokenizer ahead of the first request; blocking, so run it off the event loop.
+        """
+        self.tokenizer.encode("warm up")
+
+    def _format_header(self, idx: int, doc: Dict[str, Any]) -> str:
+        return f"EVIDENCE #{idx+1} - Confidence Score ({doc['confidence_label']}):\n"
+
+    def pack(self, docs: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Formats evidence highest-score first until the token budget is spent.
+        The evidence that crosses the budget is truncated, everything after it is dropped.
+
+        Args:
+            docs (List[Dict[str, Any]]): Ranked documents with `text`, `confidence_label` and `final_score`.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: The evidence context and packing stats
+                (context_tokens, token_budget, evidence_included, evidence_truncated, evidence_dropped).
+        """
+        ordered = sorted(docs, key=lambda doc: doc.get("final_score", 0.0), reverse=True)
+        separator_tokens = len(self.tokenizer.encode("\n\n"))
+
+        sections = []
+        used_tokens = 0
+        truncated = 0
+
+        for doc in ordered:
+            header = self._format_header(len(sections), doc)
+            header_tokens = len(self.tokenizer.encode(header))
+            text_tokens = self.tokenizer.encode(doc["text"])
+            overhead = header_tokens + (separator_tokens if sections else 0)
+            remaining = self.max_context_tokens - used_tokens - overhead
+
+            if len(text_tokens) <= remaining:
+                sections.append(header + doc["text"])
+                used_tokens += overhead + len(text_tokens)
+                continue
+
+            if remaining >= self.min_evidence_tokens:
+                sections.append(header + self.tokenizer.decode(text_tokens[:remaining]))
+                used_tokens += overhead + remaining
+                truncated += 1
+            break
+
+        return "\n\n".join(sections), {
+            "context_tokens": used_tokens,
+            "token_budget": self.max_context_tokens,
+            "evidence_included": len(sections),
+            "evidence_truncated": truncated,
+            "evidence_dropped": len(ordered) - len(sections),
+        }
@@ -0,0 +1,84 @@
+import math
+from functools import lru_cache
+from typing import List, Tuple
+from logs.logging import log
+from configs import config
+
+
+@lru_cache(maxsize=4)
+def _load_model(model_name: str, max_length: int, num_threads: int):
+    """
+    Loads a sentence-transformers cross-encoder once per process.
+
+    Args:
+        model_name (str): Hugging Face model name or local path.
+        max_length (int): Maximum token length of a (query, chunk) pair.
+        num_threads (int): Number of CPU threads used by torch for inference.
+
+    Returns:
+        CrossEncoder: The loaded model.
+    """
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+    log.info(f"Loading cross-encoder '{model_name}' on CPU with {num_threads} threads.")
+    return CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+
+class LocalCrossEncoder:
+    """
+    Scores (query, chunk) pairs with a local CPU cross-encoder.
+    """
+
+    def __init__(self):
+        """
+        Reads cross-encoder settings from config. The model itself is loaded on first use.
+        """
+        self.model_name = getattr(config, "cross_encoder_model", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        self.batch_size = getattr(config, "cross_encoder_batch_size", 32)
+        self.num_threads = getattr(config, "cross_encoder_threads", 4)
+        self.max_length = getattr(config, "cross_encoder_max_length", 512)
+
+    @property
+    def model(self):
+        return _load_model(self.model_name, self.max_length, self.num_threads)
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Scores every text against the query in batched inference.
+
+        Args:
+            query (str): The investigator's search query.
+            texts (List[str]): Candidate chunk texts.
+
+        Returns:
+            List[float]: Relevance scores normalized to the 0.2-1.0 range used by the LLM scorer.
+        """
+        if not texts:
+            return []
+
+        pairs: List[Tuple[str, str]] = [(query, text) for text in texts]
+        logits = self.model.predict(
+            pairs,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+        return [self._normalize(float(logit)) for logit in logits]
+
+    @staticmethod
+    def _normalize(logit: float) -> float:
+        """
+        Maps a raw cross-encoder logit onto the 0.2-1.0 scale of `llm_score`.
+
+        Args:
+            logit (float): Raw model output.
+
+        Returns:
+            float: Normalized score.
+        """
+        probability = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, logit))))
+        return round(0.2 + 0.8 * probability, 4)
@@ -2,9 +2,11 @@ import os
 import glob
 import openai
 import tiktoken
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from logs.logging import log
 from configs import config
+from src.resilience import resilient_caller
 import uuid  
 
 class Embedding:
@@ -15,7 +17,9 @@ class Embedding:
         """
         Initializes OpenAI embedding model and tokenizer.
         """
-        self.openai_client = openai.OpenAI(api_key=config.open_api_key)
+        # Offline ingestion: the embedding call policy is applied through the client's own timeout and retries
+        policy = resilient_caller.policy("embedding")
+        self.openai_client = openai.OpenAI(api_key=config.open_api_key, timeout=policy["timeout"], max_retries=policy["retries"])
         self.embedding_model = config.embedding_model
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
         self.chunk_size = config.chunk_size
@@ -50,7 +54,8 @@ class Embedding:
             metadata = {
                 "source": path,
                 "file_name": os.path.basename(path),
-                "file_size": os.path.getsize(path)
+                "file_size": os.path.getsize(path),
+                "modified": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds"),
             }
             with open(path, 'r', encoding='utf-8') as file:
                 text_content = file.read()
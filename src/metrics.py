@@ -0,0 +1,323 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, Optional, Sequence, Tuple
+from configs import config
+from src.profiling import open_span, close_span
+from logs.logging import log, log_stage
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per 1M tokens; override or extend with `llm_pricing` in the config
+DEFAULT_LLM_PRICING = {
+    "gpt-4o": {"prompt": 2.50, "completion": 10.00},
+    "gpt-4o-mini": {"prompt": 0.15, "completion": 0.60},
+    "text-embedding-ada-002": {"prompt": 0.10, "completion": 0.0},
+    "text-embedding-3-small": {"prompt": 0.02, "completion": 0.0},
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    A monotonically increasing value per label combination.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count per label combination.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Tuple[list, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+    Each worker process keeps its own registry, so scrape every worker.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "investigation_stage_seconds", "Latency of each pipeline stage.", ["stage"]
+)
+INVESTIGATION_SECONDS = metrics.histogram(
+    "investigation_seconds", "End-to-end latency of an investigation.", ["endpoint", "outcome"]
+)
+LLM_CALLS = metrics.counter(
+    "llm_calls_total", "OpenAI calls by call type, model and outcome.", ["call_type", "model", "outcome"]
+)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "OpenAI tokens by call type, model and kind (prompt or completion).", ["call_type", "model", "kind"]
+)
+LLM_COST = metrics.counter(
+    "llm_cost_usd_total", "Estimated OpenAI spend in USD by call type and model.", ["call_type", "model"]
+)
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"]
+)
+LLM_RETRIES = metrics.counter(
+    "llm_retries_total", "OpenAI call attempts retried after a transient failure, by call type.", ["call_type"]
+)
+LLM_HEDGES = metrics.counter(
+    "llm_hedges_total", "Hedged OpenAI calls by call type and which attempt answered first (primary or hedge).", ["call_type", "winner"]
+)
+CIRCUIT_EVENTS = metrics.counter(
+    "llm_circuit_events_total", "OpenAI circuit breaker transitions by call type and new state (opened or closed).", ["call_type", "state"]
+)
+COALESCED_CALLS = metrics.counter(
+    "coalesced_calls_total", "Calls that joined an identical in-flight call instead of repeating it, by stage.", ["stage"]
+)
+GUARD_DECISIONS = metrics.counter(
+    "guard_decisions_total", "Query guard decisions by deciding tier and verdict.", ["tier", "verdict"]
+)
+
+_request_metrics: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_metrics", default=None)
+
+
+def start_request_metrics() -> Dict[str, Any]:
+    """
+    Starts collecting stage timings and LLM usage for the current request.
+    Tasks created afterwards inherit the context and report into the same record.
+
+    Returns:
+        Dict[str, Any]: The live per-request record.
+    """
+    record = {
+        "started": time.perf_counter(),
+        "stages": {},
+        "llm": {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0},
+    }
+    _request_metrics.set(record)
+    return record
+
+
+def finish_request_metrics(endpoint: str, outcome: str) -> Dict[str, Any]:
+    """
+    Records the end-to-end latency of the current request and returns its metrics.
+
+    Args:
+        endpoint (str): Label for the entry point, e.g. "investigate" or "stream".
+        outcome (str): "ok", "rejected", "no_documents" or "error".
+
+    Returns:
+        Dict[str, Any]: {"total_seconds", "stages": {stage: seconds}, "llm": {calls, tokens, cost_usd}}.
+    """
+    record = _request_metrics.get()
+    if record is None:
+        return {}
+
+    total = time.perf_counter() - record["started"]
+    INVESTIGATION_SECONDS.observe(total, endpoint=endpoint, outcome=outcome)
+    summary = {
+        "total_seconds": round(total, 4),
+        "stages": {stage: round(seconds, 4) for stage, seconds in record["stages"].items()},
+        "llm": {**record["llm"], "cost_usd": round(record["llm"]["cost_usd"], 6)},
+    }
+    # One structured line per request; sampled, since it is the highest-volume message
+    log.bind(
+        sample=getattr(config, "log_request_sample_rate", 1.0), endpoint=endpoint, outcome=outcome, **summary
+    ).info(f"Investigation {outcome} in {summary['total_seconds']} s.")
+    return summary
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Times a pipeline stage into the stage histogram and the current request's record,
+    into its span tree when the request is profiled, and tags log lines emitted inside it with `stage`.
+    Stages that run several times per request (e.g. concurrent searches) accumulate.
+
+    Args:
+        stage (str): route, embed, search, expand, rerank, generate or upload.
+    """
+    started = time.perf_counter()
+    span = open_span(stage)
+    # Set and restored rather than reset: a stage may end in another context, e.g. a closed stream
+    parent_stage = log_stage.get()
+    log_stage.set(stage)
+    try:
+        yield
+    finally:
+        log_stage.set(parent_stage)
+        close_span(span)
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record = _request_metrics.get()
+        if record is not None:
+            record["stages"][stage] = record["stages"].get(stage, 0.0) + elapsed
+
+
+def _price(model: str) -> Dict[str, float]:
+    pricing = {**DEFAULT_LLM_PRICING, **(getattr(config, "llm_pricing", None) or {})}
+    return pricing.get(model, {})
+
+
+def record_llm_call(call_type: str, model: str, usage: Any = None, outcome: str = "ok"):
+    """
+    Counts one OpenAI call and its token usage and estimated cost.
+
+    Args:
+        call_type (str): guard, expand, embedding, rerank or report.
+        model (str): Model name, used for pricing.
+        usage (Any): The response's `usage` object, if any.
+        outcome (str): "ok" or "error".
+    """
+    LLM_CALLS.inc(call_type=call_type, model=model, outcome=outcome)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    price = _price(model)
+    cost = (prompt_tokens * price.get("prompt", 0.0) + completion_tokens * price.get("completion", 0.0)) / 1_000_000
+
+    LLM_TOKENS.inc(prompt_tokens, call_type=call_type, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, call_type=call_type, model=model, kind="completion")
+    LLM_COST.inc(cost, call_type=call_type, model=model)
+
+    record = _request_metrics.get()
+    if record is not None:
+        record["llm"]["calls"] += 1
+        record["llm"]["prompt_tokens"] += prompt_tokens
+        record["llm"]["completion_tokens"] += completion_tokens
+        record["llm"]["cost_usd"] += cost
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Counts a cache lookup.
+
+    Args:
+        cache (str): Cache name, e.g. "report".
+        hit (bool): Whether the lookup was served from the cache.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_guard_decision(tier: str, is_relevant: bool):
+    """
+    Counts a query guard decision.
+
+    Args:
+        tier (str): The tier that decided: "keyword", "classifier", "llm" or "llm_error".
+        is_relevant (bool): The verdict.
+    """
+    GUARD_DECISIONS.inc(tier=tier, verdict="relevant" if is_relevant else "irrelevant")
+
+
+def record_llm_retry(call_type: str):
+    """
+    Counts a retried OpenAI call attempt.
+
+    Args:
+        call_type (str): guard, expand, embedding, rerank or report.
+    """
+    LLM_RETRIES.inc(call_type=call_type)
+
+
+def record_llm_hedge(call_type: str, winner: str):
+    """
+    Counts a hedged OpenAI call.
+
+    Args:
+        call_type (str): guard, expand, embedding, rerank or report.
+        winner (str): "primary" or "hedge", whichever answered first.
+    """
+    LLM_HEDGES.inc(call_type=call_type, winner=winner)
+
+
+def record_circuit_event(call_type: str, state: str):
+    """
+    Counts a circuit breaker transition.
+
+    Args:
+        call_type (str): guard, expand, embedding, rerank or report.
+        state (str): "opened" or "closed".
+    """
+    CIRCUIT_EVENTS.inc(call_type=call_type, state=state)
+
+
+def record_coalesced(stage: str):
+    """
+    Counts a call served by an identical in-flight call.
+
+    Args:
+        stage (str): embedding, expand, rerank or report.
+    """
+    COALESCED_CALLS.inc(stage=stage)
@@ -1,40 +1,38 @@
-import openai
-from typing import List, Dict, Any
-from logging import log
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, TYPE_CHECKING
+from logs.logging import log
 from configs import config
-from src.retriever import DocumentRetriever
-from src.prompt_engineering import build_investigation_prompt
+from src.context_packer import ContextPacker
+from src.report_cache import ReportCache, report_cache
+from src.metrics import stage_timer, record_llm_call, record_cache
+from src.profiling import profile_span
+from src.resilience import resilient_caller
+from src.single_flight import SingleFlight
+from src.prompt_engineering import PROMPT_VERSION, build_investigation_prompt, build_investigation_system_prompt
 from datetime import datetime
 
+if TYPE_CHECKING:
+    import openai
+
 
 class PerformLLM:
     """
     Handles investigation report generation based on retrieved case evidence.
     """
 
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=config.open_api_key)
+    def __init__(self, openai_client: Optional["openai.AsyncOpenAI"] = None):
+        if openai_client is None:
+            import openai
+            openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, max_retries=0)
+        self.openai_client = openai_client
         self.gpt_model = config.gpt_model
         self.temperature = getattr(config, 'temperature', 0.3)
         self.max_tokens = getattr(config, 'max_tokens', 2000)
-        self.retriever = DocumentRetriever()
-
-    def _format_evidence_context(self, docs: List[Dict[str, Any]]) -> str:
-        """
-        Formats retrieved case documents for LLM processing.
-
-        Args:
-            docs (List[Dict[str, Any]]): List of retrieved documents.
+        self.context_packer = ContextPacker()
+        self.report_cache = report_cache
+        self.caller = resilient_caller
+        # Identical concurrent reports (same prompt, e.g. the same query from a shared dashboard) are generated once
+        self.report_flights = SingleFlight("report")
 
-        Returns:
-            str: Formatted evidence content.
-        """
-        return "\n\n".join([
-            f"EVIDENCE #{idx+1} - Confidence Score ({doc['confidence_label']}):\n{doc['text']}" 
-            for idx, doc in enumerate(docs)
-        ])
-        
-        
     def _build_strategy_notes(self, expanded_queries: List[str]) -> str:
         """
         Constructs a summary of the multi-step retrieval strategy used.
@@ -50,9 +48,10 @@ class PerformLLM:
             "\n".join([f"- {query}" for query in expanded_queries])
         ) if expanded_queries else ""
         
-    def generate_report(self, investigator_query: str, documents: List[Dict[str, Any]], retrieval_info: Dict[str, Any]) -> Dict[str, Any]:
+    def build_messages(self, investigator_query: str, documents: List[Dict[str, Any]], retrieval_info: Dict[str, Any]) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
         """
-        Generates a structured investigative report based on retrieved evidence.
+        Builds the chat messages for report generation, packing evidence into the token budget.
+        The static instructions go first so every request shares the same prompt prefix.
 
         Args:
             investigator_query (str): The investigator's original question.
@@ -60,9 +59,11 @@ class PerformLLM:
             retrieval_info (Dict[str, Any]): Metadata related to retrieval strategy.
 
         Returns:
-            Dict[str, Any]: The structured report.
+            Tuple[List[Dict[str, str]], Dict[str, Any]]: System and user messages for the chat completion,
+                and the evidence packing stats.
         """
-        evidence_context = self._format_evidence_context(documents)
+        with profile_span("pack_context"):
+            evidence_context, context_stats = self.context_packer.pack(documents)
         strategy_notes = self._build_strategy_notes(retrieval_info.get("expanded_queries", []))
 
         prompt = build_investigation_prompt(
@@ -71,26 +72,84 @@ class PerformLLM:
             strategy_notes=strategy_notes
         )
 
+        messages = [
+            {"role": "system", "content": build_investigation_system_prompt()},
+            {"role": "user", "content": prompt}
+        ]
+        return messages, context_stats
+
+    def _report_cache_key(self, investigator_query: str, documents: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> str:
+        prompt_version = f"{PROMPT_VERSION}:{self.context_packer.max_context_tokens}:{max_tokens or self.max_tokens}"
+        return ReportCache.build_key(
+            investigator_query, documents, self.gpt_model, self.temperature, prompt_version, self.report_cache.generation()
+        )
+
+    def get_cached_report(self, investigator_query: str, documents: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Looks up a previously generated report for the same query, evidence set and report length.
+
+        Args:
+            investigator_query (str): The investigator's original question.
+            documents (List[Dict[str, Any]]): List of ranked documents for investigation.
+            max_tokens (Optional[int]): Report length limit; `max_tokens` from config if omitted.
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached report marked with `cache_hit`, or None.
+        """
+        cached = self.report_cache.get(self._report_cache_key(investigator_query, documents, max_tokens))
+        if self.report_cache.enabled:
+            record_cache("report", cached is not None)
+        if cached is not None:
+            log.debug("Report cache hit, skipping LLM generation.")
+            cached["cache_hit"] = True
+        return cached
+
+    def cache_report(self, investigator_query: str, documents: List[Dict[str, Any]], report: Dict[str, Any], max_tokens: Optional[int] = None):
+        """
+        Stores a successfully generated report for reuse.
+
+        Args:
+            investigator_query (str): The investigator's original question.
+            documents (List[Dict[str, Any]]): List of ranked documents for investigation.
+            report (Dict[str, Any]): The structured report.
+            max_tokens (Optional[int]): Report length limit it was generated with.
+        """
+        if not report.get("error"):
+            self.report_cache.set(self._report_cache_key(investigator_query, documents, max_tokens), report)
+
+    async def generate_report(self, investigator_query: str, documents: List[Dict[str, Any]], retrieval_info: Dict[str, Any],
+                              max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Generates a structured investigative report based on retrieved evidence.
+
+        Args:
+            investigator_query (str): The investigator's original question.
+            documents (List[Dict[str, Any]]): List of ranked documents for investigation.
+            retrieval_info (Dict[str, Any]): Metadata related to retrieval strategy.
+            max_tokens (Optional[int]): Overrides `max_tokens` for this report.
+
+        Returns:
+            Dict[str, Any]: The structured report.
+        """
+        max_tokens = max_tokens or self.max_tokens
+        cached = self.get_cached_report(investigator_query, documents, max_tokens)
+        if cached is not None:
+            return cached
+
+        messages, context_stats = self.build_messages(investigator_query, documents, retrieval_info)
         report_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         try:
-            completion = self.openai_client.chat.completions.create(
-                model=self.gpt_model,
-                messages=[
-                    {"role": "system", "content": "You are a criminal investigation AI assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            flight_key = (self.gpt_model, self.temperature, max_tokens, tuple((m["role"], m["content"]) for m in messages))
+            with stage_timer("generate"):
+                completion = await self.report_flights.run(flight_key, lambda: self._request_report(messages, max_tokens))
 
-            return {
-                "generated_report": completion.choices[0].message.content,
-                "investigator_query": investigator_query,
-                "generation_time": report_time,
-                "number_of_evidences": len(documents),
-                "retrieval_strategy": retrieval_info.get("strategy", "unknown")
-            }
+            report = self.build_report(
+                investigator_query, completion.choices[0].message.content, documents, retrieval_info, report_time,
+                context_stats=context_stats
+            )
+            self.cache_report(investigator_query, documents, report, max_tokens)
+            return report
 
         except Exception as err:
             log.error(f"LLM report generation encountered an error: {err}")
@@ -100,3 +159,71 @@ class PerformLLM:
                 "generation_time": report_time,
                 "error": True
             }
+
+    async def _request_report(self, messages: List[Dict[str, str]], max_tokens: int) -> Any:
+        try:
+            completion = await self.caller.call("report", lambda: self.openai_client.chat.completions.create(
+                model=self.gpt_model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens
+            ))
+        except Exception:
+            record_llm_call("report", self.gpt_model, outcome="error")
+            raise
+        record_llm_call("report", self.gpt_model, completion.usage)
+        return completion
+
+    async def stream_report(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Streams the investigative report token by token as the LLM produces it.
+
+        Args:
+            messages (List[Dict[str, str]]): Chat messages from `build_messages`.
+
+        Yields:
+            str: Report text deltas in generation order.
+        """
+        with stage_timer("generate"):
+            # The policy covers opening the stream, not reading it
+            stream = await self.caller.call("report", lambda: self.openai_client.chat.completions.create(
+                model=self.gpt_model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            ))
+
+            usage = None
+            async for chunk in stream:
+                # The final chunk has no choices and carries the token usage
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        record_llm_call("report", self.gpt_model, usage)
+
+    def build_report(self, investigator_query: str, report_text: str, documents: List[Dict[str, Any]], retrieval_info: Dict[str, Any], report_time: str, context_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Assembles the report dict for text that has already been generated, e.g. by `stream_report`.
+
+        Args:
+            investigator_query (str): The investigator's original question.
+            report_text (str): The generated report.
+            documents (List[Dict[str, Any]]): List of ranked documents for investigation.
+            retrieval_info (Dict[str, Any]): Metadata related to retrieval strategy.
+            report_time (str): When generation started.
+            context_stats (Optional[Dict[str, Any]]): Evidence packing stats from `build_messages`.
+
+        Returns:
+            Dict[str, Any]: The structured report, shaped like `generate_report` output.
+        """
+        return {
+            "generated_report": report_text,
+            "investigator_query": investigator_query,
+            "generation_time": report_time,
+            "number_of_evidences": len(documents),
+            "retrieval_strategy": retrieval_info.get("strategy", "unknown"),
+            "context": context_stats or {}
+        }
@@ -0,0 +1,250 @@
+import threading
+import time
+from typing import Dict, Any, Optional
+from configs import config
+
+# Cheapest first. "thorough" is filled in from the global settings, so it matches a request without a plan
+DEFAULT_QUALITY_TIERS = {
+    "fast": {"strategy": "single-step", "top_k_retrieval": 5, "rerank_mode": "vector", "top_rerank": 3, "max_tokens": 600},
+    "balanced": {"strategy": "single-step", "top_k_retrieval": 10, "rerank_mode": "cascade", "top_rerank": 5, "max_tokens": 1200},
+    "thorough": {},
+}
+
+# Seconds per stage variant until the first observation
+DEFAULT_STAGE_PRIORS = {
+    "retrieve:single-step": 0.5,
+    "retrieve:multi-step": 2.0,
+    "rerank:vector": 0.0,
+    "rerank:cross-encoder": 0.5,
+    "rerank:cascade": 1.5,
+    "rerank:llm": 3.0,
+}
+
+# LLM rerank modes; the others run locally and are never cut short
+_LLM_RERANK_MODES = ("llm", "cascade")
+
+
+class Deadline:
+    """
+    The end of a request's latency budget, started when the request's pipeline starts.
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.perf_counter() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.perf_counter())
+
+
+class LatencyPlanner:
+    """
+    Chooses per-request pipeline settings (retrieval strategy and depth, rerank mode and depth, report length)
+    from a quality tier or a latency budget, using the stage latencies observed on this worker.
+
+    Each stage variant, e.g. "rerank:llm" or "generate:1200", keeps an exponentially weighted moving average
+    of its latency, starting from a prior. With a budget, the planner picks the best tier whose estimate fits;
+    during the request, `rerank_mode_within` and `max_tokens_within` downgrade later stages when earlier
+    ones used more than their share.
+    """
+
+    def __init__(self, cross_encoder_available: bool = False):
+        """
+        Reads `quality_tiers`, `planner_priors`, `planner_ewma_alpha`, `planner_timeout_penalty` and
+        `planner_generate_seconds_per_1k_tokens` from config.
+
+        Args:
+            cross_encoder_available (bool): Whether the reranker has a cross-encoder loaded;
+                tiers asking for one fall back to cascade with vector scores otherwise.
+        """
+        thorough = {
+            "strategy": config.strategy,
+            "top_k_retrieval": config.top_k_retrieval,
+            "rerank_mode": getattr(config, "rerank_mode", "llm"),
+            "top_rerank": config.top_rerank,
+            "max_tokens": getattr(config, "max_tokens", 2000),
+        }
+        tiers = getattr(config, "quality_tiers", None) or DEFAULT_QUALITY_TIERS
+        self.tiers = {name: {**thorough, **(settings or {})} for name, settings in tiers.items()}
+        self.default_tier = getattr(config, "default_quality_tier", "thorough")
+        if self.default_tier not in self.tiers:
+            self.default_tier = list(self.tiers)[-1]
+
+        self.cross_encoder_available = cross_encoder_available
+        self.alpha = getattr(config, "planner_ewma_alpha", 0.2)
+        self.timeout_penalty = getattr(config, "planner_timeout_penalty", 1.5)
+        self.generate_seconds_per_1k = getattr(config, "planner_generate_seconds_per_1k_tokens", 8.0)
+        self._priors: Dict[str, float] = {**DEFAULT_STAGE_PRIORS, **(getattr(config, "planner_priors", None) or {})}
+        self._estimates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, key: str) -> float:
+        """
+        Returns the expected latency of a stage variant in seconds: its moving average once observed,
+        otherwise its prior. An unobserved report length is scaled from the closest observed one.
+
+        Args:
+            key (str): "<stage>:<variant>", e.g. "retrieve:multi-step", "rerank:cascade" or "generate:600".
+        """
+        with self._lock:
+            if key in self._estimates:
+                return self._estimates[key]
+            if key.startswith("generate:"):
+                max_tokens = int(key.split(":", 1)[1])
+                observed = [(int(other.split(":", 1)[1]), seconds) for other, seconds in self._estimates.items()
+                            if other.startswith("generate:")]
+                if observed:
+                    closest, seconds = min(observed, key=lambda item: abs(item[0] - max_tokens))
+                    return seconds * max_tokens / closest
+                return max_tokens / 1000 * self.generate_seconds_per_1k
+            return self._priors.get(key, 0.0)
+
+    def observe(self, key: str, seconds: float):
+        """
+        Folds one measured stage latency into its moving average; the first one replaces the prior.
+
+        Args:
+            key (str): The stage variant, as in `estimate`.
+            seconds (float): The measured latency.
+        """
+        with self._lock:
+            previous = self._estimates.get(key)
+            self._estimates[key] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def observe_timeout(self, key: str, seconds: float):
+        """
+        Records a stage cut off after `seconds`. Its true latency is unknown but longer, so the sample
+        folded in is `max(seconds, current estimate) * planner_timeout_penalty`: a stage that keeps
+        overrunning its share is estimated slower and planned less often, instead of faster.
+
+        Args:
+            key (str): The stage variant, as in `estimate`.
+            seconds (float): How long it ran before it was abandoned.
+        """
+        self.observe(key, max(seconds, self.estimate(key)) * self.timeout_penalty)
+
+    def _rerank_mode(self, mode: str) -> str:
+        return mode if mode != "cross-encoder" or self.cross_encoder_available else "cascade"
+
+    def stage_estimates(self, settings: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Estimates each stage of a tier.
+
+        Args:
+            settings (Dict[str, Any]): Tier settings.
+
+        Returns:
+            Dict[str, float]: Seconds for "retrieve", "rerank" and "generate".
+        """
+        return {
+            "retrieve": self.estimate(f"retrieve:{settings['strategy']}"),
+            "rerank": self.estimate(f"rerank:{self._rerank_mode(settings['rerank_mode'])}"),
+            "generate": self.estimate(f"generate:{settings['max_tokens']}"),
+        }
+
+    def plan(self, tier: Optional[str] = None, budget_ms: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Chooses the settings for one request. An explicit tier wins; with only a budget, the most
+        thorough tier whose estimate fits is chosen, or the cheapest if none does.
+
+        Args:
+            tier (Optional[str]): Quality tier name, e.g. "fast", "balanced" or "thorough".
+            budget_ms (Optional[int]): End-to-end latency budget in milliseconds.
+
+        Returns:
+            Dict[str, Any]: {"tier", "budget_ms", "strategy", "top_k_retrieval", "rerank_mode", "top_rerank",
+                "max_tokens", "estimated_seconds", "degraded"}.
+
+        Raises:
+            ValueError: If the tier is unknown or the budget is not positive.
+        """
+        if tier is not None and tier not in self.tiers:
+            raise ValueError(f"Unknown quality tier '{tier}', expected one of: {', '.join(self.tiers)}.")
+        if budget_ms is not None and budget_ms <= 0:
+            raise ValueError("budget_ms must be positive.")
+
+        if tier is None and budget_ms is not None:
+            tier = next(
+                (name for name in reversed(list(self.tiers))
+                 if sum(self.stage_estimates(self.tiers[name]).values()) * 1000 <= budget_ms),
+                list(self.tiers)[0],
+            )
+        tier = tier or self.default_tier
+        settings = {**self.tiers[tier], "rerank_mode": self._rerank_mode(self.tiers[tier]["rerank_mode"])}
+
+        return {
+            "tier": tier,
+            "budget_ms": budget_ms,
+            **settings,
+            "estimated_seconds": round(sum(self.stage_estimates(settings).values()), 3),
+            "degraded": [],
+        }
+
+    def stage_share(self, plan: Dict[str, Any], stage: str) -> float:
+        """
+        Returns a stage's share of the budget, in proportion to its estimate.
+
+        Args:
+            plan (Dict[str, Any]): Output of `plan`, with a budget.
+            stage (str): "retrieve", "rerank" or "generate".
+
+        Returns:
+            float: Seconds.
+        """
+        estimates = self.stage_estimates(plan)
+        total = sum(estimates.values())
+        budget = plan["budget_ms"] / 1000
+        return budget * estimates[stage] / total if total > 0 else budget / len(estimates)
+
+    def rerank_mode_within(self, plan: Dict[str, Any], remaining: float) -> str:
+        """
+        Returns the planned rerank mode, or the best cheaper one if the planned mode and the report
+        no longer fit in the remaining budget.
+
+        Args:
+            plan (Dict[str, Any]): Output of `plan`.
+            remaining (float): Seconds left in the budget.
+
+        Returns:
+            str: The rerank mode to run.
+        """
+        allowance = remaining - self.estimate(f"generate:{plan['max_tokens']}")
+        candidates = ["llm", "cascade", "cross-encoder", "vector"]
+        candidates = candidates[candidates.index(plan["rerank_mode"]):]
+        for mode in candidates:
+            if mode == "cross-encoder" and not self.cross_encoder_available:
+                continue
+            if mode == "vector" or self.estimate(f"rerank:{mode}") <= allowance:
+                return mode
+        return "vector"
+
+    def rerank_timeout(self, plan: Dict[str, Any], mode: str, remaining: float) -> Optional[float]:
+        """
+        Returns how long an LLM rerank may run before it is abandoned for vector ordering,
+        leaving time for the report; None for local modes, which are not cut short.
+
+        Args:
+            plan (Dict[str, Any]): Output of `plan`.
+            mode (str): The rerank mode about to run.
+            remaining (float): Seconds left in the budget.
+        """
+        if mode not in _LLM_RERANK_MODES:
+            return None
+        return max(0.0, remaining - self.estimate(f"generate:{plan['max_tokens']}"))
+
+    def max_tokens_within(self, plan: Dict[str, Any], remaining: float) -> int:
+        """
+        Returns the planned report length, or the longest tier report length that fits in the remaining budget.
+
+        Args:
+            plan (Dict[str, Any]): Output of `plan`.
+            remaining (float): Seconds left in the budget.
+
+        Returns:
+            int: The report's `max_tokens`.
+        """
+        lengths = sorted({settings["max_tokens"] for settings in self.tiers.values() if settings["max_tokens"] <= plan["max_tokens"]}, reverse=True)
+        for max_tokens in lengths:
+            if self.estimate(f"generate:{max_tokens}") <= remaining:
+                return max_tokens
+        return lengths[-1] if lengths else plan["max_tokens"]
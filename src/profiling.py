@@ -0,0 +1,191 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, List, Optional
+from configs import config
+from logs.logging import log
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# cProfile hooks the whole thread; only one request can hold it at a time
+_profiler_lock = threading.Lock()
+
+
+class ProfileSession:
+    """
+    Collects a span tree and, when the profiler is free, a cProfile trace for one request.
+    The event loop is shared, so the trace also contains whatever other requests ran meanwhile.
+    """
+
+    def __init__(self, name: str):
+        self.profile_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.root = {"name": name, "start_ms": 0.0, "duration_ms": None, "children": []}
+        self.profiler: Optional[cProfile.Profile] = None
+
+        if _profiler_lock.acquire(blocking=False):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiling tool (e.g. a debugger) already owns the thread
+                self.profiler = None
+                _profiler_lock.release()
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def stop(self):
+        self.root["duration_ms"] = self.elapsed_ms()
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profiler_lock.release()
+
+    def top_functions(self, limit: int) -> List[Dict[str, Any]]:
+        if self.profiler is None:
+            return []
+        # By own time: Python overhead stands out, and time idle in the selector shows upstream waiting
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+        ]
+
+
+_active_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("profile_span", default=None)
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """
+    Decides whether to profile a request, from its X-Profile header or the configured sample rate.
+
+    Args:
+        header_value (Optional[str]): The X-Profile request header.
+
+    Returns:
+        bool: True if the request should be profiled.
+    """
+    if header_value and getattr(config, "profiling_header_enabled", True):
+        return header_value.strip().lower() in ("1", "true", "yes")
+    sample_rate = getattr(config, "profiling_sample_rate", 0.0)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def start_profile(name: str) -> ProfileSession:
+    """
+    Starts profiling the current request. Spans opened afterwards, including in child tasks, join its tree.
+
+    Args:
+        name (str): Name of the root span, e.g. the endpoint.
+
+    Returns:
+        ProfileSession: The active session; pass it to `finish_profile`.
+    """
+    session = ProfileSession(name)
+    _active_session.set(session)
+    _current_span.set(session.root)
+    return session
+
+
+def finish_profile(session: ProfileSession) -> Dict[str, Any]:
+    """
+    Stops the session and saves `<id>.json` (span tree and hottest functions) and `<id>.prof`
+    (pstats, e.g. for snakeviz) under `profiles_dir`.
+
+    Args:
+        session (ProfileSession): Session from `start_profile`.
+
+    Returns:
+        Dict[str, Any]: The profile ID and its download URLs.
+    """
+    session.stop()
+    _active_session.set(None)
+    _current_span.set(None)
+
+    profiles_dir = getattr(config, "profiles_dir", "./profiles")
+    os.makedirs(profiles_dir, exist_ok=True)
+
+    summary = {
+        "profile_id": session.profile_id,
+        "spans": session.root,
+        "cprofile": session.profiler is not None,
+        "top_functions": session.top_functions(getattr(config, "profiling_top_functions", 30)),
+    }
+    with open(os.path.join(profiles_dir, f"{session.profile_id}.json"), "w", encoding="utf-8") as file:
+        json.dump(summary, file)
+    if session.profiler is not None:
+        session.profiler.dump_stats(os.path.join(profiles_dir, f"{session.profile_id}.prof"))
+
+    log.info(f"Saved profile {session.profile_id} ({session.root['duration_ms']} ms).")
+    return {
+        "profile_id": session.profile_id,
+        "url": f"/profiles/{session.profile_id}",
+        "pstats_url": f"/profiles/{session.profile_id}/pstats" if session.profiler is not None else None,
+    }
+
+
+def profile_path(profile_id: str, extension: str) -> Optional[str]:
+    """
+    Returns the path of a saved profile file, or None if the ID is malformed or unknown.
+
+    Args:
+        profile_id (str): ID returned by `finish_profile`.
+        extension (str): "json" or "prof".
+    """
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(getattr(config, "profiles_dir", "./profiles"), f"{profile_id}.{extension}")
+    return path if os.path.isfile(path) else None
+
+
+def open_span(name: str) -> Optional[tuple]:
+    """
+    Opens a span under the current one when the request is being profiled; otherwise a no-op returning None.
+    """
+    session = _active_session.get()
+    if session is None:
+        return None
+    parent = _current_span.get() or session.root
+    span = {"name": name, "start_ms": session.elapsed_ms(), "duration_ms": None, "children": []}
+    parent["children"].append(span)
+    _current_span.set(span)
+    return session, span, parent
+
+
+def close_span(opened: Optional[tuple]):
+    """
+    Closes a span returned by `open_span`.
+    """
+    if opened is None:
+        return
+    session, span, parent = opened
+    span["duration_ms"] = round(session.elapsed_ms() - span["start_ms"], 3)
+    _current_span.set(parent)
+
+
+@contextmanager
+def profile_span(name: str) -> Iterator[None]:
+    """
+    Records a span for Python-side work that is not a pipeline stage, e.g. context packing.
+    """
+    opened = open_span(name)
+    try:
+        yield
+    finally:
+        close_span(opened)
@@ -1,18 +1,12 @@
-def build_investigation_prompt(query: str, evidence_context: str, strategy_notes: str = "") -> str:
-    prompt = f"""
-    You are an expert AI investigator assisting with cybercrime investigations, specifically those targeting cryptocurrency exchanges.
+# Bump whenever a report prompt changes so cached reports from the old prompt are not reused
+PROMPT_VERSION = "2"
 
-    OBJECTIVE:
-    Create a comprehensive and methodical investigative report that addresses the provided query, grounded solely on the presented evidence. The report must be factual, clear, structured, and include precise references to each piece of evidence.
 
-    INVESTIGATOR'S QUESTION:
-    {query}
-
-    CASE EVIDENCE:
-    {evidence_context}
+INVESTIGATION_SYSTEM_PROMPT = """
+    You are a criminal investigation AI assistant and an expert investigator assisting with cybercrime investigations, specifically those targeting cryptocurrency exchanges.
 
-    ADDITIONAL STRATEGY DETAILS:
-    {strategy_notes}
+    OBJECTIVE:
+    Create a comprehensive and methodical investigative report that addresses the investigator's question, grounded solely on the case evidence supplied in the user message. The report must be factual, clear, structured, and include precise references to each piece of evidence.
 
     REQUIRED REPORT FORMAT:
     1. BRIEF OVERVIEW: Provide a succinct summary that directly responds to the investigator's question.
@@ -25,6 +19,41 @@ def build_investigation_prompt(query: str, evidence_context: str, strategy_notes
     - Keep the report strictly evidence-based; do not include assumptions or speculative remarks.
     - Explicitly identify and discuss conflicting evidence, if any.
     - Reference all evidence using the identifiers provided within the context.
+    """
+
+
+def build_investigation_system_prompt() -> str:
+    """
+    Returns the static report instructions. Keeping them identical across requests and ahead of
+    any request-specific text lets the provider reuse its cached prompt prefix.
+
+    Returns:
+        str: The system prompt for report generation.
+    """
+    return INVESTIGATION_SYSTEM_PROMPT
+
+
+def build_investigation_prompt(query: str, evidence_context: str, strategy_notes: str = "") -> str:
+    """
+    Constructs the request-specific part of the report prompt, placed after the static system prompt.
+
+    Args:
+        query (str): The investigator's question.
+        evidence_context (str): Packed case evidence.
+        strategy_notes (str): Notes on the retrieval strategy used.
+
+    Returns:
+        str: The user prompt for report generation.
+    """
+    prompt = f"""
+    ADDITIONAL STRATEGY DETAILS:
+    {strategy_notes}
+
+    CASE EVIDENCE:
+    {evidence_context}
+
+    INVESTIGATOR'S QUESTION:
+    {query}
 
     INVESTIGATIVE REPORT:
     """
@@ -35,12 +64,6 @@ def format_rerank_prompt(query: str, document_text: str) -> str:
     prompt = f"""
     You are a criminal investigation AI assistant. Evaluate the relevance (from 1-10 scores) of the given document based on the investigator's query.
 
-    INVESTIGATOR'S QUERY:
-    {query}
-
-    DOCUMENT:
-    {document_text}
-
     EVALUATION CRITERIA:
     - Direct relevance to the cryptocurrency exchange hack
     - Technical details of cryptocurrency transactions
@@ -56,6 +79,12 @@ def format_rerank_prompt(query: str, document_text: str) -> str:
     - 9-10: Critically relevant
 
     Provide only the numeric relevance score (1-10).
+
+    INVESTIGATOR'S QUERY:
+    {query}
+
+    DOCUMENT:
+    {document_text}
     """
     return prompt
 
@@ -75,9 +104,9 @@ def build_expanded_query_prompt(query: str) -> str:
     - Blockchain laundering methods used
     - Exchanges where stolen funds may have been cashed out
 
-    Query: {query}
-
     Format output strictly as JSON array: ["Query 1", "Query 2", "Query 3", "Query 4", "Query 5"]
+
+    Query: {query}
     """
 
 
@@ -101,13 +130,13 @@ def build_guard_prompt(query: str) -> str:
     - Tracking how the hacker covered their tracks
     - Digital forensics and cryptocurrency security
 
-    Determine if the following query is relevant to this investigation:
-
-    Query: {query}
+    Determine if the query below is relevant to this investigation.
 
     First, explain why this query is or is not related to the investigation.
 
     Then, provide a final determination using ONLY one of these exact phrases:
     - "RELEVANT: This query is about the crypto hack investigation"
     - "NON-RELEVANT: This query is not about the crypto hack investigation"
+
+    Query: {query}
     """
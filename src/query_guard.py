@@ -0,0 +1,284 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+from configs import config
+from logs.logging import log
+
+DEFAULT_GUARD_KEYWORDS = [
+    "crypto", "cryptocurrency", "hack", "hacker", "stolen", "stole", "theft", "wallet", "bitcoin",
+    "ethereum", "blockchain", "forensic", "investigation", "breach", "laundering", "phishing",
+    "mixer", "tornado cash", "ransom", "malware", "exploit",
+]
+
+_TOKEN = re.compile(r"[a-z0-9$]+")
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ied", "ers", "er", "ed", "es", "ly", "s")
+# Endings a guard keyword may take: inflections only, so "hack" matches "hackers" but not "hackathon"
+_INFLECTIONS = ("ings", "ing", "ers", "er", "ies", "ied", "es", "ed", "s")
+# On-chain identifiers: an EVM address or transaction hash, a Bitcoin address (bech32 or legacy), an ENS name
+_ONCHAIN = re.compile(
+    r"\b(?:0x[0-9a-f]{64}|0x[0-9a-f]{40}|bc1[ac-hj-np-z02-9]{11,71}|[13][a-km-zA-HJ-NP-Z1-9]{25,34}|[a-z0-9-]+\.eth)\b",
+    re.IGNORECASE,
+)
+
+
+def stem(word: str) -> str:
+    """
+    Strips common English suffixes, keeping at least four characters ("laundering" -> "launder").
+
+    Args:
+        word (str): A lowercase word.
+
+    Returns:
+        str: The stem.
+    """
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and stems the words of a text.
+
+    Args:
+        text (str): Input text.
+
+    Returns:
+        List[str]: Stemmed tokens.
+    """
+    return [stem(token) for token in _TOKEN.findall(text.lower())]
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class KeywordMatcher:
+    """
+    Matches investigation terms as whole words, in their inflections, with one compiled pattern.
+    A wallet address, transaction hash or ENS name counts as a match too.
+    """
+
+    def __init__(self, keywords: List[str]):
+        """
+        Compiles the keywords into a single alternation.
+
+        Args:
+            keywords (List[str]): Terms or phrases; each word, or its stem, may take an inflectional ending
+                ("launder" matches "laundering", "laundered"), but not a derivational one ("exploit" does not
+                match "exploitation").
+        """
+        inflections = "|".join(_INFLECTIONS)
+        alternatives = set()
+        for keyword in keywords:
+            words = [self._word_pattern(word, inflections) for word in keyword.lower().split()]
+            alternatives.add(r"\s+".join(words))
+        # Longest first, so a phrase wins over its own first word
+        pattern = "|".join(sorted(alternatives, key=len, reverse=True))
+        self.pattern = re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+
+    @staticmethod
+    def _word_pattern(word: str, inflections: str) -> str:
+        forms = [rf"{re.escape(form)}(?:{inflections})?" for form in sorted({word, stem(word)})]
+        if word.endswith("y"):
+            # "cryptocurrency" -> "cryptocurrencies"
+            forms.append(rf"{re.escape(word[:-1])}(?:ies|ied)")
+        return "(?:" + "|".join(forms) + ")"
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Returns the first matched term, or None.
+
+        Args:
+            text (str): The query.
+
+        Returns:
+            Optional[str]: The matched text.
+        """
+        found = self.pattern.search(text) or _ONCHAIN.search(text)
+        return found.group(0) if found else None
+
+
+class LinearGuard:
+    """
+    Logistic regression over hashed unigram and bigram features of stemmed tokens.
+    """
+
+    def __init__(self, num_features: int = 2 ** 18):
+        self.num_features = num_features
+        self.weights: Dict[int, float] = {}
+        self.bias = 0.0
+
+    def _features(self, text: str) -> List[int]:
+        tokens = tokenize(text)
+        grams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        # crc32 rather than hash(), so features are stable across processes
+        return sorted({zlib.crc32(gram.encode("utf-8")) % self.num_features for gram in grams})
+
+    def fit(self, examples: List[Tuple[str, bool]], epochs: int = 20, learning_rate: float = 0.2, l2: float = 1e-2):
+        """
+        Trains the weights with stochastic gradient descent.
+
+        Args:
+            examples (List[Tuple[str, bool]]): (text, is_relevant) pairs.
+            epochs (int): Passes over the examples.
+            learning_rate (float): SGD step size.
+            l2 (float): L2 regularization strength.
+        """
+        samples = [(self._features(text), 1.0 if label else 0.0) for text, label in examples]
+        rng = random.Random(13)
+        for _ in range(epochs):
+            rng.shuffle(samples)
+            for features, label in samples:
+                error = self._probability(features) - label
+                for feature in features:
+                    weight = self.weights.get(feature, 0.0)
+                    self.weights[feature] = weight - learning_rate * (error + l2 * weight)
+                self.bias -= learning_rate * error
+
+    def _probability(self, features: List[int]) -> float:
+        score = self.bias + sum(self.weights.get(feature, 0.0) for feature in features)
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, score))))
+
+    def predict(self, text: str) -> float:
+        """
+        Returns the probability that a text is relevant to the investigation.
+
+        Args:
+            text (str): The query.
+
+        Returns:
+            float: Probability between 0 and 1.
+        """
+        return self._probability(self._features(text))
+
+
+class VerdictCache:
+    """
+    In-process LRU cache of guard verdicts with TTL expiry, keyed by the normalized query.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[Tuple[bool, str]]:
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, verdict = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return verdict
+
+    def set(self, query: str, verdict: Tuple[bool, str]):
+        if self.max_size <= 0:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, verdict)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class QueryGuard:
+    """
+    Local tiers of the query filter: a keyword matcher and a linear classifier trained on labeled examples.
+    Only queries the classifier is unsure about need the LLM.
+
+    Acceptance and rejection are asymmetric: a false reject loses an investigation while a false accept
+    only costs a retrieval, so the classifier rejects on its own only below `guard_reject_below`,
+    well under the lower end of `guard_llm_band`.
+    """
+
+    def __init__(self):
+        """
+        Reads guard settings from config. The classifier is trained on first use.
+        """
+        self.matcher = KeywordMatcher(getattr(config, "guard_keywords", None) or DEFAULT_GUARD_KEYWORDS)
+        self.examples_path = getattr(config, "guard_examples_path", "./data/guard_examples.jsonl")
+        self.llm_band = tuple(getattr(config, "guard_llm_band", None) or (0.3, 0.7))
+        self.reject_below = getattr(config, "guard_reject_below", 0.1)
+        self.llm_enabled = getattr(config, "guard_llm_enabled", True)
+        self.cache = VerdictCache(
+            max_size=getattr(config, "guard_cache_size", 4096),
+            ttl_seconds=getattr(config, "guard_cache_ttl", 3600),
+        )
+        self._classifier: Optional[LinearGuard] = None
+        self._lock = threading.Lock()
+
+    @property
+    def classifier(self) -> LinearGuard:
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    self._classifier = self._train()
+        return self._classifier
+
+    def _train(self) -> LinearGuard:
+        """
+        Trains the classifier on the labeled examples file (JSON lines with "text" and "relevant").
+        Without examples the model stays untrained and predicts 0.5, so every decision goes to the LLM.
+
+        Returns:
+            LinearGuard: The trained model.
+        """
+        model = LinearGuard()
+        if not os.path.isfile(self.examples_path):
+            log.warning(f"Guard examples not found at {self.examples_path}, the classifier tier is disabled.")
+            return model
+
+        examples = []
+        with open(self.examples_path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    examples.append((item["text"], bool(item["relevant"])))
+
+        started = time.perf_counter()
+        model.fit(examples)
+        log.info(f"Trained query guard on {len(examples)} examples in {time.perf_counter() - started:.3f} s.")
+        return model
+
+    def classify(self, query: str) -> Tuple[Optional[bool], str, str]:
+        """
+        Decides a query locally when possible.
+
+        Args:
+            query (str): User input.
+
+        Returns:
+            Tuple[Optional[bool], str, str]: (is_relevant, or None if the LLM should decide; tier; reason)
+        """
+        term = self.matcher.match(query)
+        if term:
+            return True, "keyword", f"Query includes the investigation-related term '{term}'."
+
+        probability = self.classifier.predict(query)
+        lower, upper = self.llm_band
+        if probability >= upper or (not self.llm_enabled and probability >= lower):
+            return True, "classifier", f"Query classified as investigation-related (p={probability:.2f})."
+        if probability <= self.reject_below or not self.llm_enabled:
+            return False, "classifier", f"Query classified as unrelated to the investigation (p={probability:.2f})."
+        return None, "classifier", f"Classifier is unsure (p={probability:.2f})."
+
+    def warm_up(self):
+        """
+        Trains the classifier ahead of the first request.
+        """
+        self.classifier.predict("warm-up")
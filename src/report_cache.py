@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from configs import config
+
+
+def ingestion_generation_path() -> str:
+    return getattr(config, "ingestion_generation_path", "./ingestion_generation")
+
+
+def bump_ingestion_generation() -> str:
+    """
+    Records that the corpus was re-ingested, so every API process stops serving reports cached before it.
+    Called by the ingestion process, which does not share the API's in-process cache.
+
+    Returns:
+        str: The new generation.
+    """
+    generation = uuid.uuid4().hex
+    path = ingestion_generation_path()
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        file.write(generation)
+    os.replace(f"{path}.tmp", path)
+    return generation
+
+
+class ReportCache:
+    """
+    In-process LRU cache of generated reports with TTL expiry.
+
+    Keys include the ingestion generation persisted by `bump_ingestion_generation`, so reports
+    cached before the corpus was re-ingested by another process are no longer looked up.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: tuple = (None, "")  # (file mtime, generation)
+
+    def __getattr__(self, name: str):
+        # Limits are read on first use, so importing this module does not load the config
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self._load_settings()
+        return object.__getattribute__(self, name)
+
+    def _load_settings(self):
+        """
+        Reads the size and TTL limits from config.
+        """
+        self.enabled = getattr(config, "report_cache_enabled", True)
+        self.max_size = getattr(config, "report_cache_size", 256)
+        self.ttl_seconds = getattr(config, "report_cache_ttl", 3600)
+
+    def generation(self) -> str:
+        """
+        Returns the current ingestion generation, re-reading the file only when it changed.
+        Empty until the first ingestion bumps it.
+        """
+        try:
+            mtime = os.stat(ingestion_generation_path()).st_mtime_ns
+        except OSError:
+            return ""
+        if self._generation[0] != mtime:
+            with open(ingestion_generation_path(), encoding="utf-8") as file:
+                self._generation = (mtime, file.read().strip())
+        return self._generation[1]
+
+    @staticmethod
+    def build_key(
+        query: str, documents: List[Dict[str, Any]], model: str, temperature: float, prompt_version: str, generation: str = ""
+    ) -> str:
+        """
+        Builds a cache key from everything that determines the generated report.
+
+        Args:
+            query (str): The investigator's question.
+            documents (List[Dict[str, Any]]): Evidence passed to the report prompt.
+            model (str): Chat model name.
+            temperature (float): Sampling temperature.
+            prompt_version (str): Version of the report prompt template.
+            generation (str): Ingestion generation from `generation`.
+
+        Returns:
+            str: A SHA-256 hex digest.
+        """
+        normalized_query = re.sub(r"\s+", " ", query).strip().lower()
+        evidence = sorted(
+            (str(doc["id"]), hashlib.sha256(doc["text"].encode("utf-8")).hexdigest())
+            for doc in documents
+        )
+        material = json.dumps([normalized_query, evidence, model, temperature, prompt_version, generation])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns a copy of the cached report, or None if it is missing or expired.
+
+        Args:
+            key (str): Cache key from `build_key`.
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached report.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, report = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return dict(report)
+
+    def set(self, key: str, report: Dict[str, Any]):
+        """
+        Stores a copy of a report, evicting the least recently used entries beyond the size limit.
+
+        Args:
+            key (str): Cache key from `build_key`.
+            report (Dict[str, Any]): The generated report.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(report))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> int:
+        """
+        Drops every cached report of this process.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+
+
+report_cache = ReportCache()
@@ -1,8 +1,16 @@
-import openai
-from typing import List, Dict, Any
-from logging import log
+import asyncio
+import heapq
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+from logs.logging import log
 from configs import config
 from src.prompt_engineering import format_rerank_prompt
+from src.cross_encoder import LocalCrossEncoder
+from src.metrics import stage_timer, record_llm_call
+from src.resilience import resilient_caller, CircuitOpenError
+from src.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    import openai
 
 
 class Reranker:
@@ -10,11 +18,17 @@ class Reranker:
     A class for reranking evidence documents based on LLM-generated relevance scores.
     """
 
-    def __init__(self):
+    def __init__(self, openai_client: Optional["openai.AsyncOpenAI"] = None):
         """
         Initializes the EvidenceReranker with OpenAI API and model configurations.
+
+        Args:
+            openai_client (Optional[openai.AsyncOpenAI]): Shared client; a new one is created if omitted.
         """
-        self.openai_client = openai.OpenAI(api_key=config.open_api_key)
+        if openai_client is None:
+            import openai
+            openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, max_retries=0)
+        self.openai_client = openai_client
         self.model = config.gpt_model
         self.max_results = config.top_rerank
 
@@ -22,13 +36,37 @@ class Reranker:
         self.weight_vector = getattr(config, "rerank_weight_vector", 0.35)  
         self.weight_llm = getattr(config, "rerank_weight_llm", 0.65)  
 
-    def rank_evidence(self, query: str, evidence_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.caller = resilient_caller
+        self.score_flights = SingleFlight("rerank")
+
+        # Upper bound on concurrent LLM scoring calls per request
+        self.llm_concurrency = getattr(config, "rerank_concurrency", 8)
+
+        # "llm" scores with the chat model, "cross-encoder" with a local CPU model,
+        # "cascade" only sends candidates near the top_rerank cut-off to the LLM
+        self.rerank_mode = getattr(config, "rerank_mode", "llm")
+        self.cascade_first_stage = getattr(config, "cascade_first_stage", "vector")
+        self.cascade_accept_margin = getattr(config, "cascade_accept_margin", 0.05)
+        self.cascade_reject_margin = getattr(config, "cascade_reject_margin", 0.05)
+
+        use_cross_encoder = self.rerank_mode == "cross-encoder" or (
+            self.rerank_mode == "cascade" and self.cascade_first_stage == "cross-encoder"
+        )
+        self.cross_encoder = LocalCrossEncoder() if use_cross_encoder else None
+
+    async def rank_evidence(self, query: str, evidence_list: List[Dict[str, Any]], semaphore: Optional[asyncio.Semaphore] = None,
+                            mode: Optional[str] = None, max_results: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Rerank retrieved evidence based on relevance scores generated by the LLM.
 
         Args:
             query (str): The investigator's search query.
             evidence_list (List[Dict[str, Any]]): A list of evidence documents.
+            semaphore (Optional[asyncio.Semaphore]): Shared limit on concurrent LLM scoring calls,
+                e.g. across a batch; defaults to a per-call limit of `rerank_concurrency`.
+            mode (Optional[str]): Overrides `rerank_mode` for this call; "vector" orders by vector score
+                without scoring calls.
+            max_results (Optional[int]): Overrides `top_rerank` for this call.
 
         Returns:
             List[Dict[str, Any]]: A list of reranked evidence, sorted by relevance.
@@ -37,30 +75,188 @@ class Reranker:
             log.warning("No evidence found for reranking.")
             return []
 
-        batch_size = 3
-        ranked_evidence = []
+        mode = mode or self.rerank_mode
+        max_results = max_results or self.max_results
+        with stage_timer("rerank"):
+            if mode == "vector":
+                ranked_evidence = [
+                    self._build_ranked_entry(evidence, self._vector_score(evidence), score_source="vector")
+                    for evidence in evidence_list
+                ]
+                return heapq.nlargest(max_results, ranked_evidence, key=lambda x: x["final_score"])
+
+            if mode == "cascade":
+                return await self._cascade_rank(query, evidence_list, semaphore, max_results)
+
+            relevance_scores = await self._score_candidates(query, evidence_list, semaphore, mode)
+            ranked_evidence = [
+                self._build_ranked_entry(evidence, llm_weight, score_source=mode)
+                for evidence, llm_weight in zip(evidence_list, relevance_scores)
+            ]
+
+            return heapq.nlargest(max_results, ranked_evidence, key=lambda x: x["final_score"])
+
+    async def _cascade_rank(self, query: str, evidence_list: List[Dict[str, Any]], semaphore: Optional[asyncio.Semaphore] = None,
+                            max_results: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ranks evidence with a cheap first stage and spends LLM calls only on candidates
+        whose first-stage score is within the configured margins of the top_rerank cut-off.
+
+        Args:
+            query (str): The investigator's search query.
+            evidence_list (List[Dict[str, Any]]): A list of evidence documents.
+            semaphore (Optional[asyncio.Semaphore]): Shared limit on concurrent LLM scoring calls.
+            max_results (Optional[int]): The cut-off; `top_rerank` if omitted.
+
+        Returns:
+            List[Dict[str, Any]]: A list of reranked evidence, sorted by relevance.
+        """
+        max_results = max_results or self.max_results
+        first_stage_scores = await self._first_stage_scores(query, evidence_list)
+
+        if len(evidence_list) <= max_results:
+            ranked_evidence = [
+                self._build_ranked_entry(evidence, None, score_source=self.cascade_first_stage, first_stage_score=score)
+                for evidence, score in zip(evidence_list, first_stage_scores)
+            ]
+            return sorted(ranked_evidence, key=lambda x: x["final_score"], reverse=True)
+
+        # Cut-off sits between the k-th and (k+1)-th best first-stage scores
+        boundary = heapq.nlargest(max_results + 1, first_stage_scores)
+        cutoff = (boundary[-2] + boundary[-1]) / 2
+
+        winners, ambiguous, ambiguous_scores = [], [], []
+        for evidence, score in zip(evidence_list, first_stage_scores):
+            if score >= cutoff + self.cascade_accept_margin:
+                winners.append(self._build_ranked_entry(evidence, None, score_source=self.cascade_first_stage, first_stage_score=score))
+            elif score > cutoff - self.cascade_reject_margin:
+                ambiguous.append(evidence)
+                ambiguous_scores.append(score)
+
+        llm_scores = await self._score_with_llm(query, ambiguous, semaphore)
+        contenders = [
+            self._build_ranked_entry(evidence, llm_weight, score_source="llm", first_stage_score=score)
+            for evidence, llm_weight, score in zip(ambiguous, llm_scores, ambiguous_scores)
+        ]
+
+        log.debug(
+            f"Cascade rerank: {len(winners)} accepted, {len(ambiguous)} sent to LLM, "
+            f"{len(evidence_list) - len(winners) - len(ambiguous)} rejected."
+        )
+
+        # Accept margins wider than the gap to the cut-off can let in more than max_results winners
+        selected = heapq.nlargest(max_results, winners, key=lambda x: x["final_score"])
+        selected += heapq.nlargest(max_results - len(selected), contenders, key=lambda x: x["final_score"])
+        return sorted(selected, key=lambda x: x["final_score"], reverse=True)
+
+    async def _first_stage_scores(self, query: str, evidence_list: List[Dict[str, Any]]) -> List[float]:
+        """
+        Computes cheap cascade scores, either from the vector similarity or the local cross-encoder.
+
+        Args:
+            query (str): The investigator's search query.
+            evidence_list (List[Dict[str, Any]]): A list of evidence documents.
+
+        Returns:
+            List[float]: Scores clamped to the 0.2-1.0 range of `llm_score`.
+        """
+        if self.cross_encoder is not None:
+            try:
+                return await self._score_with_cross_encoder(query, evidence_list)
+            except Exception as e:
+                log.error(f"Cross-encoder first stage failed, falling back to vector scores: {e}")
+
+        return [max(0.2, min(1.0, self._vector_score(doc))) for doc in evidence_list]
+
+    def _build_ranked_entry(self, evidence: Dict[str, Any], llm_weight: Optional[float], score_source: str = None,
+                            first_stage_score: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Builds a reranked evidence entry from a candidate and its relevance score.
+
+        Args:
+            evidence (Dict[str, Any]): The candidate document.
+            llm_weight (Optional[float]): Its normalized relevance score; None for cascade candidates
+                decided by the first stage alone.
+            score_source (str): Which scorer produced the score; defaults to the rerank mode.
+            first_stage_score (Optional[float]): Its cascade first-stage score, combined in place of
+                `llm_weight` when that is None.
+
+        Returns:
+            Dict[str, Any]: The entry with vector, LLM and final scores, plus the first-stage score in a cascade.
+        """
+        vector_weight = self._vector_score(evidence)
+        combined = self._compute_final_score(vector_weight, llm_weight if llm_weight is not None else first_stage_score)
+
+        entry = {
+            "id": evidence["id"],
+            "text": evidence["text"],
+            "metadata": evidence.get("metadata", {}),
+            "vector_score": vector_weight,
+            "llm_score": llm_weight,
+            "final_score": combined,
+            "confidence_label": self._categorize_confidence(combined),
+            "score_source": score_source or self.rerank_mode,
+        }
+        if first_stage_score is not None:
+            entry["first_stage_score"] = first_stage_score
+        return entry
+
+    @staticmethod
+    def _vector_score(evidence: Dict[str, Any]) -> float:
+        """
+        Returns the similarity score attached to a candidate by the retriever.
+
+        Args:
+            evidence (Dict[str, Any]): The candidate document.
 
-        for start in range(0, len(evidence_list), batch_size):
-            batch = evidence_list[start: start + batch_size]
-            relevance_scores = self._evaluate_relevance(query, batch)
+        Returns:
+            float: The vector score, 0.5 when the candidate carries none.
+        """
+        return evidence.get("vector_score", evidence.get("score", 0.5))
 
-            for idx, evidence in enumerate(batch):
-                vector_weight = evidence.get("vector_score", 0.5)
-                llm_weight = relevance_scores[idx]
-                combined = self._compute_final_score(vector_weight, llm_weight)
+    async def _score_with_cross_encoder(self, query: str, evidence_list: List[Dict[str, Any]]) -> List[float]:
+        # CPU-bound inference runs in a worker thread so the event loop stays free
+        return await asyncio.to_thread(self.cross_encoder.score, query, [doc["text"] for doc in evidence_list])
 
-                ranked_evidence.append({
-                    "id": evidence["id"],
-                    "text": evidence["text"],
-                    "metadata": evidence.get("metadata", {}),
-                    "vector_score": vector_weight,
-                    "llm_score": llm_weight,
-                    "final_score": combined,
-                    "confidence_label": self._categorize_confidence(combined),
-                })
+    async def _score_candidates(self, query: str, evidence_list: List[Dict[str, Any]], semaphore: Optional[asyncio.Semaphore] = None,
+                                mode: Optional[str] = None) -> List[float]:
+        """
+        Scores every candidate with the given rerank mode, the configured one by default.
 
-        ranked_evidence.sort(key=lambda x: x["final_score"], reverse=True)
-        return ranked_evidence[:self.max_results]
+        Args:
+            query (str): The investigator's search query.
+            evidence_list (List[Dict[str, Any]]): A list of evidence documents.
+            mode (Optional[str]): "llm" or "cross-encoder".
+
+        Returns:
+            List[float]: Normalized relevance scores, aligned with `evidence_list`.
+        """
+        if (mode or self.rerank_mode) == "cross-encoder" and self.cross_encoder is not None:
+            try:
+                return await self._score_with_cross_encoder(query, evidence_list)
+            except Exception as e:
+                log.error(f"Cross-encoder reranking failed, falling back to LLM scoring: {e}")
+
+        return await self._score_with_llm(query, evidence_list, semaphore)
+
+    async def _score_with_llm(self, query: str, evidence_list: List[Dict[str, Any]], semaphore: Optional[asyncio.Semaphore] = None) -> List[float]:
+        """
+        Scores candidates with the LLM concurrently, at most `llm_concurrency` calls at a time.
+
+        Args:
+            query (str): The investigator's search query.
+            evidence_list (List[Dict[str, Any]]): A list of evidence documents.
+
+        Returns:
+            List[float]: Normalized relevance scores, aligned with `evidence_list`.
+        """
+        semaphore = semaphore or asyncio.Semaphore(self.llm_concurrency)
+
+        async def score(doc: Dict[str, Any]) -> float:
+            async with semaphore:
+                return await self._evaluate_relevance(query, doc)
+
+        return list(await asyncio.gather(*[score(doc) for doc in evidence_list]))
 
     def _categorize_confidence(self, score: float) -> str:
         """
@@ -83,42 +279,53 @@ class Reranker:
         else:
             return "Very Low"
 
-    def _evaluate_relevance(self, query: str, documents: List[Dict[str, Any]]) -> List[float]:
+    async def _evaluate_relevance(self, query: str, doc: Dict[str, Any]) -> float:
         """
-        Calls the LLM to evaluate document relevance on a scale of 1-10, then normalizes scores.
+        Calls the LLM to evaluate document relevance on a scale of 1-10, then normalizes the score.
 
         Args:
             query (str): The search query.
-            documents (List[Dict[str, Any]]): A batch of documents to be scored.
+            doc (Dict[str, Any]): The document to be scored.
 
         Returns:
-            List[float]: A list of normalized scores between 0.2 and 1.0.
+            float: A normalized score between 0.2 and 1.0; the clamped vector score while the
+                rerank circuit is open.
         """
-        scores = []
-        for doc in documents:
-            try:
-                response = self.openai_client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are an expert cybercrime investigator."},
-                        {"role": "user", "content": format_rerank_prompt(query, doc["text"])}
-                    ],
-                    temperature=0.2,
-                    max_tokens=5
-                )
-
-                score_text = response.choices[0].message.content.strip()
-                numeric_score = int(''.join(filter(str.isdigit, score_text)))
-                
-                normalized_score = round(max(2, min(10, numeric_score)) / 10.0, 1)
-
-                scores.append(normalized_score)
+        try:
+            prompt = format_rerank_prompt(query, doc["text"])
+            # Concurrent requests for the same query score the same documents: one call per pair
+            response = await self.score_flights.run((self.model, prompt), lambda: self._request_score(prompt))
 
-            except Exception as e:
-                log.error(f"Error reranking document ID {doc['id']}: {e}")
-                scores.append(0.4)
-        return scores
+            score_text = response.choices[0].message.content.strip()
+            numeric_score = int(''.join(filter(str.isdigit, score_text)))
+
+            return round(max(2, min(10, numeric_score)) / 10.0, 1)
+
+        except CircuitOpenError:
+            return max(0.2, min(1.0, self._vector_score(doc)))
+
+        except Exception as e:
+            log.error(f"Error reranking document ID {doc['id']}: {e}")
+            return 0.4
 
+    async def _request_score(self, prompt: str) -> Any:
+        try:
+            response = await self.caller.call("rerank", lambda: self.openai_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are an expert cybercrime investigator."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=5
+            ))
+        except CircuitOpenError:
+            raise
+        except Exception:
+            record_llm_call("rerank", self.model, outcome="error")
+            raise
+        record_llm_call("rerank", self.model, response.usage)
+        return response
 
     def _compute_final_score(self, vector_score: float, llm_score: float) -> float:
         """
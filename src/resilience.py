@@ -0,0 +1,263 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from configs import config
+from logs.logging import log
+from src.metrics import record_llm_retry, record_llm_hedge, record_circuit_event
+
+T = TypeVar("T")
+
+# Per call type: attempt timeout (s), retries after the first attempt, and whether a slow attempt is hedged.
+# Hedging duplicates a call, so it is only enabled for short, idempotent calls.
+DEFAULT_CALL_POLICIES = {
+    "guard": {"timeout": 5.0, "retries": 2, "hedge": True},
+    "expand": {"timeout": 10.0, "retries": 1, "hedge": True},
+    "rerank": {"timeout": 5.0, "retries": 1, "hedge": True},
+    "embedding": {"timeout": 10.0, "retries": 2, "hedge": False},
+    "report": {"timeout": 90.0, "retries": 1, "hedge": False},
+}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit is open; callers take their degraded path.
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether an OpenAI call failure is transient: a timeout, a connection error, rate limiting or a 5xx.
+    Other errors, e.g. an invalid request, fail the same way again.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects calls for `cooldown` seconds.
+    Then a single probe call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                log.info(f"Circuit for {self.name} calls closed.")
+                record_circuit_event(self.name, "closed")
+            self.failures, self.opened_at, self.probing = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                log.warning(f"Circuit for {self.name} calls opened after {self.failures} consecutive failures.")
+                record_circuit_event(self.name, "opened")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release_probe(self):
+        """
+        Lets another probe through when one ended without a verdict, e.g. because it was cancelled
+        or failed with a non-transient error; the circuit stays as it was.
+        """
+        with self._lock:
+            self.probing = False
+
+
+class LatencyWindow:
+    """
+    The latencies of the most recent successful calls of one type, for the hedging delay.
+    """
+
+    def __init__(self, size: int):
+        self.samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if len(self.samples) < min(20, self.samples.maxlen):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class ResilientCaller:
+    """
+    Runs OpenAI calls with a per-call-type timeout, jittered exponential-backoff retries of transient
+    failures, hedging and a circuit breaker, so one slow or failing upstream response does not set
+    the latency of the whole investigation.
+
+    A hedged call sends a duplicate once the first attempt has run longer than the recent
+    `hedge_percentile` latency of its call type, and uses whichever answers first. Hedges are capped
+    at `hedge_max_ratio` of calls so a slow upstream is not hit with twice the load.
+
+    The OpenAI clients are created with `max_retries=0`, so retries happen only here.
+    """
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._counts: Dict[str, list] = {}  # call type -> [calls, hedges]
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        # Settings are read on first use, so importing this module does not load the config
+        if name.startswith("_"):
+            raise AttributeError(name)
+        self._load_settings()
+        return object.__getattribute__(self, name)
+
+    def _load_settings(self):
+        """
+        Reads `llm_call_policies` (overrides per call type), `llm_retry_base_delay`, `llm_retry_max_delay`,
+        `llm_hedge_percentile`, `llm_hedge_max_ratio`, `llm_hedge_window`, `llm_circuit_failure_threshold`
+        and `llm_circuit_cooldown` from config.
+        """
+        overrides = getattr(config, "llm_call_policies", None) or {}
+        self.policies = {
+            call_type: {**DEFAULT_CALL_POLICIES.get(call_type, {}), **overrides.get(call_type, {})}
+            for call_type in {*DEFAULT_CALL_POLICIES, *overrides}
+        }
+        self.retry_base_delay = getattr(config, "llm_retry_base_delay", 0.2)
+        self.retry_max_delay = getattr(config, "llm_retry_max_delay", 2.0)
+        self.hedge_percentile = getattr(config, "llm_hedge_percentile", 95)
+        self.hedge_max_ratio = getattr(config, "llm_hedge_max_ratio", 0.1)
+        self.hedge_window = getattr(config, "llm_hedge_window", 200)
+        self.failure_threshold = getattr(config, "llm_circuit_failure_threshold", 5)
+        self.cooldown = getattr(config, "llm_circuit_cooldown", 30.0)
+
+    def policy(self, call_type: str) -> Dict[str, Any]:
+        return self.policies.get(call_type, {"timeout": 60.0, "retries": 1, "hedge": False})
+
+    def breaker(self, call_type: str) -> CircuitBreaker:
+        with self._lock:
+            if call_type not in self._breakers:
+                self._breakers[call_type] = CircuitBreaker(call_type, self.failure_threshold, self.cooldown)
+                self._latencies[call_type] = LatencyWindow(self.hedge_window)
+                self._counts[call_type] = [0, 0]
+            return self._breakers[call_type]
+
+    def _hedge_delay(self, call_type: str) -> Optional[float]:
+        """
+        Returns how long to wait before hedging, or None if this call should not be hedged.
+        """
+        if not self.policy(call_type).get("hedge"):
+            return None
+        counts = self._counts[call_type]
+        counts[0] += 1
+        if counts[1] >= self.hedge_max_ratio * counts[0]:
+            return None
+        return self._latencies[call_type].percentile(self.hedge_percentile)
+
+    async def call(self, call_type: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs a call under its call type's policy.
+
+        Args:
+            call_type (str): guard, expand, rerank, embedding or report.
+            factory (Callable[[], Awaitable[T]]): Starts one attempt, e.g.
+                `lambda: client.chat.completions.create(...)`; called again for retries and hedges.
+
+        Returns:
+            T: The first successful result.
+
+        Raises:
+            CircuitOpenError: If the call type's circuit is open.
+            Exception: The last error once retries are exhausted, or the first non-transient error.
+        """
+        breaker = self.breaker(call_type)
+        policy = self.policy(call_type)
+        retries = policy.get("retries", 0)
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit for {call_type} calls is open.")
+            try:
+                result = await self._attempt(call_type, factory, policy["timeout"])
+            except asyncio.CancelledError:
+                # A cancelled probe must not keep the circuit half-open forever
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # Says nothing about the upstream's health: leave the failure count alone
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                log.warning(f"{call_type} call failed ({type(e).__name__}), retrying in {delay:.2f} s.")
+                record_llm_retry(call_type)
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def _attempt(self, call_type: str, factory: Callable[[], Awaitable[T]], timeout: float) -> T:
+        """
+        Runs one attempt within `timeout` seconds, hedging it if it is slower than usual.
+        Each attempt's latency is measured from its own start; the loser of a hedge is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        expires_at = started + timeout
+        hedge_delay = self._hedge_delay(call_type)
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+        tasks = {asyncio.ensure_future(factory()): ("primary", started)}
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                wake_at = min(expires_at, hedge_at) if hedge_at is not None else expires_at
+                done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    source, task_started = tasks.pop(task)
+                    if task.exception() is None:
+                        self._latencies[call_type].add(loop.time() - task_started)
+                        if hedge_at is None and hedge_delay is not None:
+                            record_llm_hedge(call_type, source)
+                        return task.result()
+                    error = task.exception()
+                if done:
+                    continue
+                if loop.time() >= expires_at:
+                    raise asyncio.TimeoutError(f"{call_type} call timed out after {timeout} s.")
+                # Hedge: a duplicate of the slow attempt, racing it
+                tasks[asyncio.ensure_future(factory())] = ("hedge", loop.time())
+                self._counts[call_type][1] += 1
+                hedge_at = None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+resilient_caller = ResilientCaller()
@@ -1,9 +1,16 @@
-import openai
+import asyncio
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Awaitable, Tuple, Optional, TYPE_CHECKING
 from configs import config
-from db.qdrant_db import QdrantDB
 from src.prompt_engineering import build_expanded_query_prompt
+from src.metrics import stage_timer, record_llm_call
+from src.resilience import resilient_caller, CircuitOpenError
+from src.single_flight import SingleFlight
+from logs.logging import log
+
+if TYPE_CHECKING:
+    import openai
+    from db.qdrant_db import AsyncQdrantDB
 
 
 class DocumentRetriever:
@@ -11,13 +18,56 @@ class DocumentRetriever:
     Retrieves relevant case documents using multi-step retrieval strategy with Qdrant.
     """
 
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=config.open_api_key)
-        self.qdrant_db = QdrantDB()
+    def __init__(self, openai_client: Optional["openai.AsyncOpenAI"] = None, qdrant_db: Optional["AsyncQdrantDB"] = None):
+        if openai_client is None:
+            import openai
+            openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, max_retries=0)
+        self.openai_client = openai_client
+        if qdrant_db is None:
+            from db.qdrant_db import AsyncQdrantDB
+            qdrant_db = AsyncQdrantDB()
+        self.qdrant_db = qdrant_db
         self.top_k = config.top_k_retrieval
         self.strategy = config.strategy  # Single-step or multi-step retrieval
+        self.embedding_batch_size = getattr(config, "embedding_batch_size", 512)
+        self.caller = resilient_caller
+        # Identical concurrent embedding and expansion calls, e.g. the same query from several investigators, run once
+        self.embedding_flights = SingleFlight("embedding")
+        self.expansion_flights = SingleFlight("expand")
+
+    async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for several texts in a single OpenAI call,
+        or in concurrent calls of `embedding_batch_size` inputs when there are more.
+
+        Args:
+            texts (List[str]): The input texts to be embedded.
+
+        Returns:
+            List[List[float]]: Vector representations, aligned with `texts`.
+        """
+        if len(texts) > self.embedding_batch_size:
+            batches = await asyncio.gather(*[
+                self._get_embeddings(texts[start: start + self.embedding_batch_size])
+                for start in range(0, len(texts), self.embedding_batch_size)
+            ])
+            return [embedding for batch in batches for embedding in batch]
+
+        with stage_timer("embed"):
+            response = await self.embedding_flights.run(
+                (config.embedding_model, tuple(texts)), lambda: self._request_embeddings(texts)
+            )
+        return [entry.embedding for entry in response.data]
 
-    def _get_embedding(self, text: str) -> List[float]:
+    async def _request_embeddings(self, texts: List[str]) -> Any:
+        response = await self.caller.call("embedding", lambda: self.openai_client.embeddings.create(
+            input=texts,
+            model=config.embedding_model
+        ))
+        record_llm_call("embedding", config.embedding_model, response.usage)
+        return response
+
+    async def _get_embedding(self, text: str) -> List[float]:
         """
         Generates an embedding for the given text using OpenAI's model.
 
@@ -27,13 +77,17 @@ class DocumentRetriever:
         Returns:
             List[float]: A vector representation of the text.
         """
-        response = self.openai_client.embeddings.create(
-            input=[text],
-            model=config.embedding_model
-        )
-        return response.data[0].embedding
+        return (await self._get_embeddings([text]))[0]
 
-    def _generate_expanded_queries(self, query: str) -> List[str]:
+    async def search(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Embeds the query and runs one vector search: the first step of `retrieve`, without LLM calls.
+        """
+        query_embedding = await self._get_embedding(query)
+        with stage_timer("search"):
+            return await self.qdrant_db.similarity_search(query_embedding, top_k or self.top_k, query=query)
+
+    async def _generate_expanded_queries(self, query: str) -> List[str]:
         """
         Uses LLM to generate multiple refined search queries for deeper retrieval.
 
@@ -45,7 +99,19 @@ class DocumentRetriever:
         """
         prompt = build_expanded_query_prompt(query)
 
-        response = self.openai_client.chat.completions.create(
+        with stage_timer("expand"):
+            response = await self.expansion_flights.run((config.gpt_model, prompt), lambda: self._request_expansion(prompt))
+
+        try:
+            content = response.choices[0].message.content
+            queries = json.loads(content)
+            return [str(q) for q in queries] if isinstance(queries, list) and queries else [query]
+        except Exception as e:
+            log.warning(f"Error generating expanded queries: {e}")
+            return [query]
+
+    async def _request_expansion(self, prompt: str) -> Any:
+        response = await self.caller.call("expand", lambda: self.openai_client.chat.completions.create(
             model=config.gpt_model,
             messages=[
                 {"role": "system", "content": "You are a cybercrime forensic assistant."},
@@ -53,48 +119,143 @@ class DocumentRetriever:
             ],
             temperature=0.3,
             max_tokens=300
-        )
+        ))
+        record_llm_call("expand", config.gpt_model, response.usage)
+        return response
+
+    async def _expand_within(self, query: str, timeout: Optional[float]) -> Optional[List[str]]:
+        """
+        Generates expanded queries, giving up after `timeout` seconds or when the expansion circuit is open.
 
+        Returns:
+            Optional[List[str]]: The expanded queries, or None if the expansion timed out or is unavailable.
+        """
         try:
-            content = response.choices[0].message.content
-            queries = json.loads(content)
-            return queries if isinstance(queries, list) else [query]
-        except Exception as e:
-            print(f"Error generating expanded queries: {e}")
-            return [query]
+            if timeout is None:
+                return await self._generate_expanded_queries(query)
+            try:
+                return await asyncio.wait_for(self._generate_expanded_queries(query), timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"Query expansion exceeded its {timeout:.2f} s budget, continuing with single-step results.")
+                return None
+        except CircuitOpenError as e:
+            log.warning(f"{e} Continuing with single-step results.")
+            return None
 
-    def retrieve(self, query: str) -> Dict[str, Any]:
+    async def retrieve(self, query: str, strategy: Optional[str] = None, top_k: Optional[int] = None,
+                       expansion_timeout: Optional[float] = None,
+                       initial_search: Optional[Awaitable[List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
         """
         Retrieves documents using single-step or multi-step retrieval strategy.
+        In multi-step mode the initial search and the query expansion run concurrently,
+        and all expanded queries are embedded in one call and searched concurrently.
 
         Args:
             query (str): The investigator's search query.
+            strategy (Optional[str]): Overrides `strategy` for this call.
+            top_k (Optional[int]): Overrides `top_k_retrieval` for this call.
+            expansion_timeout (Optional[float]): Seconds the query expansion may take; past that,
+                the initial search results are returned as a single-step result.
+            initial_search (Optional[Awaitable[List[Dict[str, Any]]]]): An already started `search`
+                of the same query and top_k, used instead of searching again.
 
         Returns:
             Dict[str, Any]: Retrieved documents and metadata.
         """
-        # Step 1: Generate query embedding
-        query_embedding = self._get_embedding(query)
+        strategy = strategy or self.strategy
+        top_k = top_k or self.top_k
+        expanded_queries = []
+        if initial_search is None:
+            initial_search = self.search(query, top_k)
 
-        # Step 2: Perform initial retrieval from Qdrant
-        initial_results = self.qdrant_db.similarity_search(query_embedding, self.top_k)
+        if strategy != "multi-step":
+            # Single-step: embed the query and search once
+            all_documents = await initial_search
+        else:
+            # Step 1: Initial retrieval and query expansion in parallel
+            all_documents, expanded_queries = await asyncio.gather(
+                initial_search,
+                self._expand_within(query, expansion_timeout)
+            )
+            if expanded_queries is None:
+                return self._build_result(all_documents, [], strategy="single-step")
 
-        # Step 3: Multi-step retrieval (if enabled)
-        expanded_queries = []
-        all_documents = initial_results
+            # Step 2: One embeddings call for every expanded query, then concurrent searches,
+            # routed by the original query so the shards it names are kept
+            exp_embeddings = await self._get_embeddings(expanded_queries)
+            with stage_timer("search"):
+                additional_results = await asyncio.gather(*[
+                    self.qdrant_db.similarity_search(exp_embedding, top_k, query=query)
+                    for exp_embedding in exp_embeddings
+                ])
+            for results in additional_results:
+                all_documents.extend(results)
+
+        return self._build_result(all_documents, expanded_queries, strategy=strategy)
+
+    async def retrieve_batch(self, queries: List[str], semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves documents for many queries, sharing upstream calls across the batch:
+        every original and expanded query is embedded together and searched in one Qdrant batch request.
+
+        Args:
+            queries (List[str]): The investigators' search queries.
+            semaphore (Optional[asyncio.Semaphore]): Bounds concurrent query-expansion LLM calls.
+
+        Returns:
+            List[Dict[str, Any]]: Retrieved documents and metadata per query, aligned with `queries`.
+
+        Raises:
+            Exception: If the shared embedding or search call fails, e.g. CircuitOpenError.
+        """
+        if not queries:
+            return []
+
+        async def expand(query: str) -> Optional[List[str]]:
+            try:
+                if semaphore is None:
+                    return await self._expand_within(query, None)
+                async with semaphore:
+                    return await self._expand_within(query, None)
+            except Exception as e:
+                # One failed expansion must not fail the batch: that query falls back to single-step
+                log.warning(f"Query expansion failed ({type(e).__name__}), continuing with single-step results.")
+                return None
 
         if self.strategy == "multi-step":
-            expanded_queries = self._generate_expanded_queries(query)
-            for exp_query in expanded_queries:
-                exp_embedding = self._get_embedding(exp_query)
-                additional_results = self.qdrant_db.similarity_search(exp_embedding, self.top_k)
-                all_documents.extend(additional_results)
+            expansions = await asyncio.gather(*[expand(query) for query in queries])
+        else:
+            expansions = [None for _ in queries]
+
+        search_texts, owners, routing_queries = [], [], []
+        for idx, (query, expanded_queries) in enumerate(zip(queries, expansions)):
+            for text in [query, *(expanded_queries or [])]:
+                search_texts.append(text)
+                owners.append(idx)
+                routing_queries.append(query)
+
+        embeddings = await self._get_embeddings(search_texts)
+        with stage_timer("search"):
+            hits = await self.qdrant_db.search_batch(embeddings, self.top_k, queries=routing_queries)
+
+        documents_per_query = [[] for _ in queries]
+        for owner, documents in zip(owners, hits):
+            documents_per_query[owner].extend(documents)
+
+        # Queries whose expansion failed or was skipped report the strategy that actually ran
+        return [
+            self._build_result(documents, expanded_queries or [], strategy=None if expanded_queries is not None else "single-step")
+            for documents, expanded_queries in zip(documents_per_query, expansions)
+        ]
 
+    def _build_result(self, all_documents: List[Dict[str, Any]], expanded_queries: List[str], strategy: Optional[str] = None) -> Dict[str, Any]:
+        strategy = strategy or self.strategy
+        if strategy == "multi-step":
             # Remove duplicates by document ID
             all_documents = {doc["id"]: doc for doc in all_documents}.values()
 
         return {
             "documents": list(all_documents),
-            "strategy": self.strategy,
-            "expanded_queries": expanded_queries if self.strategy == "multi-step" else None
+            "strategy": strategy,
+            "expanded_queries": expanded_queries if strategy == "multi-step" else None
         }
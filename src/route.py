@@ -1,9 +1,14 @@
-import openai
-from typing import Dict, Any, Tuple
-from logging import log
+from typing import Dict, Any, Tuple, Optional, TYPE_CHECKING
+from logs.logging import log
 from configs import config
 import re
 from src.prompt_engineering import build_guard_prompt
+from src.query_guard import QueryGuard
+from src.metrics import stage_timer, record_llm_call, record_cache, record_guard_decision
+from src.resilience import resilient_caller, CircuitOpenError
+
+if TYPE_CHECKING:
+    import openai
 
 
 class Route:
@@ -11,19 +16,21 @@ class Route:
     Handles query pre-processing and filtering before passing to the investigation pipeline.
     """
 
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=config.open_api_key)
+    def __init__(self, openai_client: Optional["openai.AsyncOpenAI"] = None):
+        if openai_client is None:
+            import openai
+            openai_client = openai.AsyncOpenAI(api_key=config.open_api_key, max_retries=0)
+        self.openai_client = openai_client
         self.model = config.gpt_model
         self.filter_enabled = getattr(config, "filter_enabled", True) 
+        self.guard = QueryGuard()
+        self.caller = resilient_caller
 
-        self.focus_keywords = [
-            "crypto", "hack", "stolen", "wallet", "bitcoin",
-            "blockchain", "forensic", "investigation", "breach", "laundering"
-        ]
-
-    def assess_query(self, query: str) -> Tuple[bool, str]:
+    async def assess_query(self, query: str) -> Tuple[bool, str]:
         """
         Determines if a query should be processed further.
+        Cached verdicts, keyword matches and confident classifier scores are decided locally;
+        only queries inside the classifier's uncertainty band go to the LLM.
 
         Args:
             query (str): User input.
@@ -31,19 +38,26 @@ class Route:
         Returns:
             Tuple[bool, str]: (is_relevant, reason/explanation)
         """
-        if not self.filter_enabled:
-            return True, "Filtering is disabled, query allowed."
+        with stage_timer("route"):
+            if not self.filter_enabled:
+                return True, "Filtering is disabled, query allowed."
 
-        query_lower = query.lower()
+            cached = self.guard.cache.get(query)
+            record_cache("guard", cached is not None)
+            if cached is not None:
+                return cached
 
-        if any(keyword in query_lower for keyword in self.focus_keywords):
-            return True, "Query includes relevant investigation-related terms."
+            is_relevant, tier, reason = self.guard.classify(query)
+            if is_relevant is None:
+                return await self._validate_with_llm(query)
 
-        return self._validate_with_llm(query)
+            record_guard_decision(tier, is_relevant)
+            self.guard.cache.set(query, (is_relevant, reason))
+            return is_relevant, reason
 
-    def _validate_with_llm(self, query: str) -> Tuple[bool, str]:
+    async def _validate_with_llm(self, query: str) -> Tuple[bool, str]:
         """
-        Uses LLM to determine if the query is related to the investigation.
+        Uses LLM to determine if the query is related to the investigation, and caches the verdict.
 
         Args:
             query (str): User's question.
@@ -54,7 +68,7 @@ class Route:
         try:
             prompt = build_guard_prompt(query)
 
-            response = self.openai_client.chat.completions.create(
+            response = await self.caller.call("guard", lambda: self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are an AI security filter for an investigation system."},
@@ -62,18 +76,32 @@ class Route:
                 ],
                 temperature=0.1,
                 max_tokens=300
-            )
+            ))
+            record_llm_call("guard", self.model, response.usage)
 
             content = response.choices[0].message.content
 
-            if "RELEVANT:" in content:
-                return True, self._extract_reason(content)
-            elif "IRRELEVANT:" in content:
-                return False, self._extract_reason(content)
+            # Check the negative markers first: "NON-RELEVANT:" also contains "RELEVANT:"
+            if "NON-RELEVANT:" in content or "IRRELEVANT:" in content:
+                verdict = (False, self._extract_reason(content))
+            elif "RELEVANT:" in content:
+                verdict = (True, self._extract_reason(content))
+            else:
+                verdict = (False, "Query seems unrelated to the investigation.")
+
+            record_guard_decision("llm", verdict[0])
+            self.guard.cache.set(query, verdict)
+            return verdict
 
-            return False, "Query seems unrelated to the investigation."
+        except CircuitOpenError:
+            # The LLM is failing: go with the classifier's leaning rather than waiting on it
+            probability = self.guard.classifier.predict(query)
+            record_guard_decision("classifier", probability >= 0.5)
+            return probability >= 0.5, f"Query guard LLM unavailable, classifier decided (p={probability:.2f})."
 
         except Exception as e:
+            record_llm_call("guard", self.model, outcome="error")
+            record_guard_decision("llm_error", True)
             log.error(f"LLM query validation failed: {e}")
             return True, "Error validating query, allowing it to proceed."
 
@@ -87,8 +115,8 @@ class Route:
         Returns:
             str: A concise explanation.
         """
-        split_marker = "RELEVANT:" if "RELEVANT:" in content else "IRRELEVANT:"
-        explanation = content.split(split_marker)[0].strip() if split_marker in content else content.strip()
+        marker = re.search(r"(?:NON-|IR)?RELEVANT:", content)
+        explanation = content[:marker.start()].strip() if marker else content.strip()
         explanation = re.sub(r'\s+', ' ', explanation)
 
         return explanation[:147] + "..." if len(explanation) > 150 else explanation
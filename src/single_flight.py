@@ -0,0 +1,72 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from configs import config
+from src.metrics import record_coalesced
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key starts the work, and callers
+    arriving while it runs await the same result instead of repeating the upstream call.
+    Nothing is kept once the call finishes; caching finished results is left to the caches.
+
+    Errors reach every waiting caller. A caller that is cancelled stops waiting without affecting
+    the others; the shared call is only cancelled when every caller has given up.
+    The shared call runs in the first caller's context, so its metrics and logs are attributed to that request.
+    """
+
+    def __init__(self, stage: str):
+        """
+        Args:
+            stage (str): Label for the coalesced-calls metric, e.g. "embedding" or "report".
+        """
+        self.stage = stage
+        self.enabled = getattr(config, "single_flight_enabled", True)
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs `factory()` unless an identical call is already in flight, and returns its result.
+
+        Args:
+            key (Hashable): Identifies identical calls; must cover every input that affects the result.
+            factory (Callable[[], Awaitable[T]]): Starts the call.
+
+        Returns:
+            T: The result, shared by all callers of the key; treat it as read-only.
+        """
+        if not self.enabled:
+            return await factory()
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            record_coalesced(self.stage)
+
+        flight.waiters += 1
+        try:
+            # Shielded, so cancelling one caller does not cancel the shared call
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller was cancelled: stop the work, and let new callers start afresh
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
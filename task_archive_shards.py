@@ -0,0 +1,40 @@
+import argparse
+from datetime import datetime, timedelta
+from db.qdrant_db import QdrantDB
+from logs.logging import log
+
+
+def _select(shards, names, older_than_days):
+    if names:
+        return [shard for shard in shards if shard["shard"] in names]
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    return [shard for shard in shards if datetime.fromisoformat(shard["updated"]) < cutoff]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive Qdrant shards to disk, or restore them.")
+    parser.add_argument("shards", nargs="*", help="Shard names, e.g. case_3 or 2024_01. Defaults to shards not updated recently.")
+    parser.add_argument("--older-than-days", type=int, default=180, help="Without names, archive shards not updated for this long.")
+    parser.add_argument("--restore", action="store_true", help="Load the shards back into memory and search them again.")
+    parser.add_argument("--list", action="store_true", help="Only list the shards.")
+    args = parser.parse_args()
+
+    qdrant_db = QdrantDB()
+    if not qdrant_db.sharded:
+        log.error("qdrant_sharding is 'none': there are no shards to archive.")
+        return
+
+    shards = qdrant_db.list_shards()
+    if args.list:
+        for shard in shards:
+            log.info(f"{shard['shard']}: {shard['points']} points, updated {shard['updated']}{', archived' if shard['archived'] else ''}")
+        return
+
+    selected = [shard for shard in _select(shards, set(args.shards), args.older_than_days) if shard["archived"] != (not args.restore)]
+    for shard in selected:
+        qdrant_db.set_archived(shard["shard"], archived=not args.restore)
+    log.info(f"{'Restored' if args.restore else 'Archived'} {len(selected)} shards.")
+
+
+if __name__ == "__main__":
+    main()
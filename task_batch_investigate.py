@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import json
+import sys
+from typing import List, Dict
+from app.batch import investigate_batch
+from app.container import Container
+from logs.logging import log
+
+
+def _read_queries(path: str, field: str, user_id: str) -> List[Dict[str, str]]:
+    """
+    Reads one query per JSONL line from `field`, falling back to a plain-text line.
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            if isinstance(record, dict):
+                items.append({"query": str(record.get(field, "")), "user_id": record.get("user_id", user_id)})
+            else:
+                items.append({"query": str(record), "user_id": user_id})
+    return items
+
+
+async def run(input_path: str, output_path: str, field: str, user_id: str, upload: bool):
+    items = _read_queries(input_path, field, user_id)
+    log.info(f"🚀 Running batch investigation of {len(items)} queries from {input_path}...")
+
+    container = Container()
+    await container.start()
+    try:
+        out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+        try:
+            async for result in investigate_batch(container, items, upload=upload):
+                out.write(json.dumps(result, default=str) + "\n")
+                out.flush()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    finally:
+        await container.close()
+
+    log.info(f"Batch investigation finished, results written to {output_path}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many investigations from a JSONL file.")
+    parser.add_argument("--input", required=True, help="JSONL file with one query per line.")
+    parser.add_argument("--output", default="-", help="JSONL output file, '-' for stdout.")
+    parser.add_argument("--field", default="query", help="JSON field holding the query text.")
+    parser.add_argument("--user-id", default="batch_runner", help="User ID for lines without one.")
+    parser.add_argument("--no-upload", action="store_true", help="Do not upload reports to S3.")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.input, args.output, args.field, args.user_id, not args.no_upload))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import logging
 from service.qdrant_service import VectorDBService
 from logs.logging import log
 
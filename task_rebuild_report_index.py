@@ -0,0 +1,13 @@
+from db.report_storage import create_report_storage
+from logs.logging import log
+
+def main():
+    log.info("Rebuilding the report index...")
+    result = create_report_storage().rebuild_index()
+    if result["success"]:
+        log.info(f"Indexed {result['indexed']} reports.")
+    else:
+        log.error(f"Failed to rebuild the report index: {result['error']}")
+
+if __name__ == "__main__":
+    main()
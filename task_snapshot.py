@@ -0,0 +1,43 @@
+import argparse
+import time
+from configs import config
+from db.qdrant_db import create_client
+from db.snapshot import VectorSnapshot
+from logs.logging import log
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Qdrant vectors to a snapshot, or rebuild Qdrant from one without re-embedding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write every vector and payload to a snapshot directory.")
+    export_parser.add_argument("path", nargs="?", default=getattr(config, "snapshot_dir", "./snapshots/latest"))
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="float16 halves the snapshot size.")
+
+    load_parser = subparsers.add_parser("load", help="Bulk-load a snapshot into Qdrant.")
+    load_parser.add_argument("path", nargs="?", default=getattr(config, "snapshot_dir", "./snapshots/latest"))
+    load_parser.add_argument("--collection", help="Load under this collection name instead of qdrant_collection.")
+    load_parser.add_argument("--replace", action="store_true", help="Drop existing collections of the same name first.")
+
+    for subparser in (export_parser, load_parser):
+        subparser.add_argument("--location", help="Embedded Qdrant directory instead of qdrant_location or qdrant_host.")
+    args = parser.parse_args()
+
+    if getattr(args, "collection", None):
+        config.qdrant_collection = args.collection
+
+    started = time.perf_counter()
+    snapshot = VectorSnapshot(create_client(args.location))
+    try:
+        if args.command == "export":
+            result = snapshot.export(args.path, dtype=args.dtype)
+        else:
+            result = snapshot.load(args.path, replace=args.replace)
+    except (ValueError, RuntimeError) as e:
+        log.error(f"Snapshot {args.command} failed: {e}")
+        return
+    log.info(f"Snapshot {args.command} of {result['points']} points took {time.perf_counter() - started:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# The example config stands in for configs/config.yaml, which holds credentials and is not checked in
+os.environ.setdefault("CONFIG_PATH", str(ROOT / "configs" / "config _example.yaml"))
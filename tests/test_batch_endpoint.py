@@ -0,0 +1,17 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.application import app
+
+
+@pytest.mark.parametrize("body, detail", [
+    ({"queries": "Trace the stolen ETH"}, "queries must be a list."),
+    ({"queries": ["Trace the stolen ETH", 1, None]}, "queries[1]"),
+    ({"queries": [{"query": ["not", "text"]}]}, "queries[0]"),
+    ({"queries": [{"query": "Trace the stolen ETH", "user_id": 7}]}, "queries[0]"),
+])
+def test_malformed_queries_are_rejected(body, detail):
+    # Not entered as a context manager, so the lifespan (and every upstream service) is skipped
+    app.state.container = None
+    response = TestClient(app).post("/crypto_investigate/batch", json=body)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith(detail)
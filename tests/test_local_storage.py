@@ -0,0 +1,24 @@
+from db.local_storage import LocalReportStorage
+
+
+def test_long_user_id_is_indexed(tmp_path):
+    storage = LocalReportStorage(str(tmp_path))
+    user_id = "investigator.with.a.long.name@financial-crimes-unit.example.org"
+
+    result = storage.upload_report({"user_id": user_id, "investigator_query": "Trace the mixer deposits", "report": "..."})
+
+    assert result["success"], result
+    for listing in (storage.get_recent_reports(), storage.get_recent_reports(user_id=user_id)):
+        assert [entry["file_path"] for entry in listing["reports"]] == [result["file_path"]]
+        assert listing["reports"][0]["user_id"] == user_id
+        assert listing["reports"][0]["size"] == result["size"]
+
+
+def test_rebuild_index_rewrites_the_same_entries(tmp_path):
+    storage = LocalReportStorage(str(tmp_path))
+    first = storage.upload_report({"user_id": "u1", "investigator_query": "first", "report": "..."})
+    second = storage.upload_report({"user_id": "u2", "investigator_query": "second", "report": "..."})
+
+    assert storage.rebuild_index() == {"success": True, "indexed": 2}
+    listed = {entry["file_path"] for entry in storage.get_recent_reports()["reports"]}
+    assert listed == {first["file_path"], second["file_path"]}
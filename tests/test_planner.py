@@ -0,0 +1,11 @@
+from src.planner import LatencyPlanner
+
+
+def test_timeout_raises_the_estimate():
+    planner = LatencyPlanner()
+    planner.observe("rerank:llm", 2.0)
+
+    # Cut off at 0.5 s: the stage took longer than that, so its estimate must not drop
+    planner.observe_timeout("rerank:llm", 0.5)
+
+    assert planner.estimate("rerank:llm") > 2.0
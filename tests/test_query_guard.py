@@ -0,0 +1,23 @@
+import pytest
+from src.query_guard import KeywordMatcher, QueryGuard, DEFAULT_GUARD_KEYWORDS
+
+
+@pytest.mark.parametrize("query", [
+    "Funds were sent to 0x52908400098527886e0f7030069857d2e4169ee7",
+    "Trace bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq",
+    "Who controls vitalik.eth?",
+])
+def test_onchain_identifiers_match(query):
+    assert KeywordMatcher(DEFAULT_GUARD_KEYWORDS).match(query)
+
+
+def test_keywords_take_inflections_only():
+    matcher = KeywordMatcher(DEFAULT_GUARD_KEYWORDS)
+    assert matcher.match("The hackers laundered it") == "hackers"
+    assert matcher.match("The hackathon schedule") is None
+
+
+def test_unsure_on_topic_query_goes_to_the_llm():
+    # Scores under the LLM band but above guard_reject_below are not rejected locally
+    is_relevant, tier, _ = QueryGuard().classify("Tell me about the ETH transfers to 0xabc")
+    assert is_relevant is None
@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_app_imports_without_a_config_file(tmp_path):
+    # Neither the config nor the log writer may be touched until the app starts or logs
+    code = "import threading, app.application; assert threading.active_count() == 1"
+    env = {**os.environ, "CONFIG_PATH": str(tmp_path / "missing.yaml")}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
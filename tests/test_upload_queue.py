@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import threading
+import time
+
+import boto3
+import httpx
+import pytest
+import uvicorn
+from botocore.config import Config
+
+from app.upload_queue import ReportUploadQueue
+from benchmarks import fake_s3
+from db.s3_db import S3Handler
+
+REPORT = {"user_id": "investigator_1", "investigator_query": "Trace the stolen ETH", "report": "..."}
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    fake_s3.S3_LATENCY_MS = 0
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_s3.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture
+def storage(s3_endpoint):
+    fake_s3._objects.clear()
+    fake_s3._faults["put_errors"] = 0
+    # One HTTP attempt per put, so every injected fault reaches the queue's own retries
+    client = boto3.client(
+        "s3", endpoint_url=s3_endpoint, region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test",
+        config=Config(retries={"total_max_attempts": 1}, s3={"addressing_style": "path"}),
+    )
+    return S3Handler(s3_client=client)
+
+
+def inject_put_errors(endpoint: str, count: int):
+    httpx.post(f"{endpoint}/_faults", json={"put_errors": count}).raise_for_status()
+
+
+def upload(storage: S3Handler, max_retries: int = 3):
+    async def run():
+        queue = ReportUploadQueue(storage, asyncio.to_thread)
+        queue.max_retries, queue.retry_base_delay = max_retries, 0.01
+        queue.start()
+        pending = await queue.enqueue(REPORT)
+        await queue.close()
+        return pending, queue.get_status(pending["file_path"])
+
+    return asyncio.run(run())
+
+
+def stored_reports(storage: S3Handler):
+    return [key for bucket, key in fake_s3._objects if bucket == storage.bucket_name and key.startswith("reports/")]
+
+
+def test_upload_succeeds(storage):
+    pending, status = upload(storage)
+
+    assert pending["status"] == "pending"
+    assert status["status"] == "uploaded" and status["attempts"] == 1
+    assert stored_reports(storage) == [pending["file_path"]]
+    assert storage.read_report(pending["file_path"])["investigator_query"] == REPORT["investigator_query"]
+
+
+def test_transient_failure_is_retried_under_the_same_key(storage, s3_endpoint):
+    inject_put_errors(s3_endpoint, 1)
+
+    pending, status = upload(storage)
+
+    assert status["status"] == "uploaded" and status["attempts"] == 2
+    assert "error" not in status
+    assert stored_reports(storage) == [pending["file_path"]]
+
+
+def test_exhausted_retries_end_as_failed(storage, s3_endpoint):
+    inject_put_errors(s3_endpoint, 100)
+
+    pending, status = upload(storage, max_retries=2)
+
+    assert status["status"] == "failed" and status["attempts"] == 3
+    assert "SlowDown" in status["error"]
+    assert stored_reports(storage) == []